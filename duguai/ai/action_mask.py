@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+动作位掩码模块。
+可选动作用整数位掩码表示：第i位为1表示可以选择动作i。出牌最多17位，跟牌最多9位。
+掩码被拆成低9位与高8位，两部分分别查预先计算好的表得到动作编号，
+因此求掩码下的最大Q值、随机挑选动作、在近似最大的动作中随机挑选，都不需要为每次决策分配数组。
+@author: 江胤佐
+"""
+from random import randrange
+from typing import List, Tuple, Union
+
+import numpy as np
+
+_LOW_BITS = 9
+_LOW_MASK = (1 << _LOW_BITS) - 1
+
+# 低9位、高8位掩码对应的动作编号
+_LOW_ACTIONS: Tuple[Tuple[int, ...], ...] = tuple(
+    tuple(i for i in range(_LOW_BITS) if m >> i & 1) for m in range(1 << _LOW_BITS))
+_HIGH_ACTIONS: Tuple[Tuple[int, ...], ...] = tuple(
+    tuple(i + _LOW_BITS for i in range(8) if m >> i & 1) for m in range(1 << 8))
+
+_LOW_COUNT: Tuple[int, ...] = tuple(len(a) for a in _LOW_ACTIONS)
+_HIGH_COUNT: Tuple[int, ...] = tuple(len(a) for a in _HIGH_ACTIONS)
+
+
+def actions_to_mask(actions: List[int]) -> int:
+    """
+    把动作列表转换为位掩码
+    @param actions: 动作列表
+    @return: 位掩码
+    """
+    mask = 0
+    for a in actions:
+        mask |= 1 << a
+    return mask
+
+
+def mask_to_actions(mask: int) -> Tuple[int, ...]:
+    """
+    把位掩码转换为从小到大排列的动作元组
+    @param mask: 位掩码
+    """
+    return _LOW_ACTIONS[mask & _LOW_MASK] + _HIGH_ACTIONS[mask >> _LOW_BITS]
+
+
+def mask_count(mask: int) -> int:
+    """
+    位掩码中可选动作的数量
+    @param mask: 位掩码
+    """
+    return _LOW_COUNT[mask & _LOW_MASK] + _HIGH_COUNT[mask >> _LOW_BITS]
+
+
+def mask_sample(mask: int) -> int:
+    """
+    在位掩码允许的动作中等概率随机挑选一个
+    @param mask: 位掩码，不能为0
+    """
+    low = _LOW_ACTIONS[mask & _LOW_MASK]
+    r = randrange(len(low) + _HIGH_COUNT[mask >> _LOW_BITS])
+    return low[r] if r < len(low) else _HIGH_ACTIONS[mask >> _LOW_BITS][r - len(low)]
+
+
+def masked_max(row: Union[np.ndarray, List[float]], mask: int) -> float:
+    """
+    位掩码允许的动作中的最大值
+    @param row: 每个动作的值，例如Q表的一行
+    @param mask: 位掩码，不能为0
+    """
+    best = -np.inf
+    for a in _LOW_ACTIONS[mask & _LOW_MASK]:
+        if row[a] > best:
+            best = row[a]
+    for a in _HIGH_ACTIONS[mask >> _LOW_BITS]:
+        if row[a] > best:
+            best = row[a]
+    return best
+
+
+def masked_min(row: Union[np.ndarray, List[float]], mask: int) -> float:
+    """
+    位掩码允许的动作中的最小值
+    @param row: 每个动作的值
+    @param mask: 位掩码，不能为0
+    """
+    best = np.inf
+    for a in _LOW_ACTIONS[mask & _LOW_MASK]:
+        if row[a] < best:
+            best = row[a]
+    for a in _HIGH_ACTIONS[mask >> _LOW_BITS]:
+        if row[a] < best:
+            best = row[a]
+    return best
+
+
+def _pick_between(row: Union[np.ndarray, List[float]], mask: int, low_value: float, high_value: float) -> int:
+    """在值位于[low_value, high_value]之间的允许动作中等概率随机挑选一个"""
+    low = _LOW_ACTIONS[mask & _LOW_MASK]
+    high = _HIGH_ACTIONS[mask >> _LOW_BITS]
+
+    count = 0
+    for a in low:
+        count += low_value <= row[a] <= high_value
+    for a in high:
+        count += low_value <= row[a] <= high_value
+
+    r = randrange(count) if count > 1 else 0
+    for a in low:
+        if low_value <= row[a] <= high_value:
+            if r == 0:
+                return a
+            r -= 1
+    for a in high:
+        if low_value <= row[a] <= high_value:
+            if r == 0:
+                return a
+            r -= 1
+    raise ValueError('位掩码为空')
+
+
+def masked_argmax(row: Union[np.ndarray, List[float]], mask: int, tolerance: float = 0.) -> int:
+    """
+    在位掩码允许的动作中挑选值最大的动作。与最大值相差不超过tolerance的动作之间等概率随机挑选
+    @param row: 每个动作的值，例如Q表的一行
+    @param mask: 位掩码，不能为0
+    @param tolerance: 近似最大的容差
+    """
+    return _pick_between(row, mask, masked_max(row, mask) - tolerance, np.inf)
+
+
+def masked_argmin(row: Union[np.ndarray, List[int]], mask: int) -> int:
+    """
+    在位掩码允许的动作中挑选值最小的动作，值相同的动作之间等概率随机挑选
+    @param row: 每个动作的值，例如策略表中的优先级
+    @param mask: 位掩码，不能为0
+    """
+    return _pick_between(row, mask, -np.inf, masked_min(row, mask))
@@ -1,14 +1,22 @@
 # -*- coding: utf-8 -*-
 """
-叫地主算法。该模块包含的魔法值均为已经通过SVM训练出来的参数。
-训练过程见 项目目录/notebook/call_landlord.ipynb
+叫地主算法。线性分类器的系数与标准化参数保存在模型文件 call_model.json 中，
+最初的参数由SVM训练得到，训练过程见 项目目录/notebook/call_landlord.ipynb；
+之后可以用 script/train_call_landlord.py 在更多数据上增量训练，生成新的模型文件。
 
 @author: 江胤佐
 """
+import json
+import os
+from functools import lru_cache
+from typing import Dict, Union, List
+
 from sklearn.svm import LinearSVC
 
 from duguai.card.combo import *
 
+CALL_MODEL_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'call_model.json')
+
 
 def has_g(raw_data: np.ndarray) -> int:
     """
@@ -51,27 +59,71 @@ def process(raw_data: np.ndarray) -> np.ndarray:
     return np.array([has_g(raw_data), bomb_count(raw_data), card2_count(raw_data)])
 
 
-def get_svc() -> LinearSVC:
+def process_batch(hands: np.ndarray) -> np.ndarray:
+    """
+    批量预处理原始手牌，结果与逐行调用process相同
+    @param hands: shape为(n, 17)的数组，每一行是按从小到大排列的手牌
+    @return: shape为(n, 3)的特征矩阵
+    """
+    hands = np.asarray(hands)
+    g = (hands[:, -1] == CARD_G1) * 2 + ((hands[:, -1] == CARD_G0) | (hands[:, -2] == CARD_G0))
+    bombs = (hands[:, 3:] == hands[:, :-3]).sum(axis=1)
+    card2 = (hands == CARD_2).sum(axis=1)
+    return np.stack([g, bombs, card2], axis=1)
+
+
+@lru_cache(maxsize=None)
+def _load_call_model(file_name: str) -> Dict[str, np.ndarray]:
+    with open(file_name, 'r', encoding='utf-8') as f:
+        model = json.load(f)
+    return {k: np.array(model[k], dtype=float) for k in ('coef', 'intercept', 'mean', 'scale')}
+
+
+def load_call_model(file_name: str = CALL_MODEL_FILE) -> Dict[str, np.ndarray]:
+    """
+    加载叫地主模型。同一个文件只读取一次
+    @param file_name: 模型文件
+    @return: 包含coef, intercept, mean, scale的字典
+    """
+    return _load_call_model(os.path.abspath(file_name))
+
+
+def save_call_model(file_name: str, coef: Union[np.ndarray, List[float]], intercept: float,
+                    mean: Union[np.ndarray, List[float]], scale: Union[np.ndarray, List[float]]) -> None:
     """
-    获取训练出来的支持向量机分类器
+    保存叫地主模型
+    @param file_name: 模型文件
+    @param coef: 标准化特征的系数
+    @param intercept: 截距
+    @param mean: 特征的均值
+    @param scale: 特征的标准差
+    """
+    with open(file_name, 'w', encoding='utf-8') as f:
+        json.dump({'coef': np.ravel(coef).tolist(), 'intercept': float(np.ravel(intercept)[0]),
+                   'mean': np.ravel(mean).tolist(), 'scale': np.ravel(scale).tolist()}, f, indent=2)
+    _load_call_model.cache_clear()
+
+
+def get_svc(file_name: str = CALL_MODEL_FILE) -> LinearSVC:
+    """
+    获取训练出来的线性分类器
+    @param file_name: 模型文件
     @return: LinearSVC
     """
-    svc = LinearSVC(5.24e-05)
-    svc.n_iter_ = 7
-    svc.coef_ = np.array([[0.19581239, 0.03330529, 0.10988893]])
+    model = load_call_model(file_name)
+    svc = LinearSVC()
+    svc.coef_ = model['coef'].reshape(1, -1)
     svc.classes_ = np.array([0, 1])
-    svc.intercept_ = np.array([-0.06151605])
+    svc.intercept_ = model['intercept'].reshape(1)
     return svc
 
 
-__MEAN = np.array([0.95726285, 0.09313241, 1.24184783])
-__SCALE = np.array([1.02556338, 0.29399838, 0.90237814])
-
-
-def z_score(x_vector):
+def z_score(x_vector, file_name: str = CALL_MODEL_FILE):
     """
     标准化X数组
     @param x_vector: 待预测的数组
+    @param file_name: 模型文件
     @return: 标准化后的数组
     """
-    return (x_vector - __MEAN) / __SCALE
+    model = load_call_model(file_name)
+    return (x_vector - model['mean']) / model['scale']
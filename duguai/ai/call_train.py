@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+叫地主分类器的增量训练模块。
+训练数据按块流式读取，每块用process_batch向量化计算特征，内存占用只与块大小有关：
+1. 第一遍扫描：StandardScaler.partial_fit 累计特征的均值与标准差；
+2. 之后每一遍：标准化后用 SGDClassifier.partial_fit（合页损失，即线性SVM）增量更新系数。
+训练结果保存为call_landlord.py读取的模型文件。
+
+支持两种数据文件：
+1. CSV：与 dataset/call.csv 相同，一行18个数，前17个为手牌，最后一个为标签（1叫，0不叫）；
+2. 二进制：16字节文件头之后是一条条 CALL_DTYPE 记录。label为叫地主的好坏程度，可以是0/1，
+   也可以是模拟对局估计出的地主胜率；games为估计label所用的对局数，训练时作为样本权重。
+@author: 江胤佐
+"""
+from __future__ import annotations
+
+import os
+from itertools import islice
+from typing import Iterator, Tuple, List, Union
+
+import numpy as np
+from sklearn.linear_model import SGDClassifier
+from sklearn.preprocessing import StandardScaler
+
+from .call_landlord import process_batch, save_call_model
+
+CALL_DTYPE = np.dtype([
+    ('cards', 'u1', (17,)),
+    ('label', '<f4'),
+    ('games', '<u2'),
+])
+
+MAGIC = b'DGCALL'
+VERSION = 1
+HEADER_SIZE = 16
+
+# (手牌矩阵, 标签, 样本权重)
+Chunk = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+def _header() -> bytes:
+    return (MAGIC + bytes([VERSION])).ljust(HEADER_SIZE, b'\0')
+
+
+def is_binary(file_name: str) -> bool:
+    """判断文件是否为二进制叫地主数据文件"""
+    with open(file_name, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def append_call_data(file_name: str, records: np.ndarray) -> None:
+    """
+    把记录追加到二进制叫地主数据文件，文件不存在时先写入文件头
+    @param file_name: 文件名
+    @param records: CALL_DTYPE类型的记录数组
+    """
+    new_file = not os.path.isfile(file_name) or os.path.getsize(file_name) == 0
+    with open(file_name, 'ab') as f:
+        if new_file:
+            f.write(_header())
+        np.asarray(records, dtype=CALL_DTYPE).tofile(f)
+
+
+def read_call_data(file_name: str) -> np.ndarray:
+    """
+    以内存映射方式读取二进制叫地主数据文件
+    @param file_name: 文件名
+    @return: CALL_DTYPE类型的记录数组
+    """
+    if not is_binary(file_name):
+        raise ValueError('%s 不是叫地主数据文件' % file_name)
+    n = (os.path.getsize(file_name) - HEADER_SIZE) // CALL_DTYPE.itemsize
+    if not n:
+        return np.zeros(0, dtype=CALL_DTYPE)
+    return np.memmap(file_name, dtype=CALL_DTYPE, mode='r', offset=HEADER_SIZE, shape=(n,))
+
+
+def iter_csv_chunks(file_name: str, chunk_size: int) -> Iterator[Chunk]:
+    """
+    按块读取CSV数据文件
+    @param file_name: 文件名
+    @param chunk_size: 每块的行数
+    """
+    with open(file_name, 'r') as f:
+        while True:
+            lines = [line for line in islice(f, chunk_size) if line.strip()]
+            if not lines:
+                return
+            data = np.loadtxt(lines, delimiter=',', dtype=int, ndmin=2)
+            yield data[:, :17], data[:, 17].astype(float), np.ones(len(data))
+
+
+def iter_binary_chunks(file_name: str, chunk_size: int) -> Iterator[Chunk]:
+    """
+    按块读取二进制数据文件
+    @param file_name: 文件名
+    @param chunk_size: 每块的记录数
+    """
+    records = read_call_data(file_name)
+    for i in range(0, len(records), chunk_size):
+        chunk = records[i:i + chunk_size]
+        yield chunk['cards'].astype(int), chunk['label'].astype(float), np.maximum(chunk['games'], 1).astype(float)
+
+
+def iter_chunks(file_names: Union[str, List[str]], chunk_size: int = 65536) -> Iterator[Chunk]:
+    """
+    依次按块读取多个数据文件，根据文件头自动区分CSV与二进制
+    @param file_names: 文件名或文件名列表
+    @param chunk_size: 每块的条数
+    """
+    if isinstance(file_names, str):
+        file_names = [file_names]
+    for file_name in file_names:
+        if is_binary(file_name):
+            yield from iter_binary_chunks(file_name, chunk_size)
+        else:
+            yield from iter_csv_chunks(file_name, chunk_size)
+
+
+class CallTrainer:
+    """
+    叫地主线性分类器的增量训练器
+    """
+
+    def __init__(self, threshold: float = 0.5, alpha: float = 1e-4, random_state: int = 0):
+        """
+        @param threshold: 标签大于等于threshold的手牌视为应该叫地主
+        @param alpha: SGD的正则化系数
+        @param random_state: 随机种子
+        """
+        self._threshold = threshold
+        self.scaler = StandardScaler()
+        self.classifier = SGDClassifier(loss='hinge', alpha=alpha, random_state=random_state)
+
+    def fit_scaler(self, chunks: Iterator[Chunk]) -> None:
+        """扫描一遍数据，累计特征的均值与标准差"""
+        for hands, _, _ in chunks:
+            self.scaler.partial_fit(process_batch(hands))
+
+    def fit_epoch(self, chunks: Iterator[Chunk]) -> None:
+        """扫描一遍数据，增量更新分类器"""
+        for hands, labels, weights in chunks:
+            self.classifier.partial_fit(self.scaler.transform(process_batch(hands)),
+                                        (labels >= self._threshold).astype(int), classes=np.array([0, 1]),
+                                        sample_weight=weights)
+
+    def fit(self, file_names: Union[str, List[str]], epochs: int = 5, chunk_size: int = 65536) -> CallTrainer:
+        """
+        在数据文件上训练
+        @param file_names: 文件名或文件名列表
+        @param epochs: 训练分类器的扫描次数
+        @param chunk_size: 每块的条数
+        """
+        self.fit_scaler(iter_chunks(file_names, chunk_size))
+        for _ in range(epochs):
+            self.fit_epoch(iter_chunks(file_names, chunk_size))
+        return self
+
+    def score(self, file_names: Union[str, List[str]], chunk_size: int = 65536) -> float:
+        """
+        在数据文件上计算加权准确率
+        @param file_names: 文件名或文件名列表
+        @param chunk_size: 每块的条数
+        """
+        correct = total = 0.
+        for hands, labels, weights in iter_chunks(file_names, chunk_size):
+            predict = self.classifier.predict(self.scaler.transform(process_batch(hands)))
+            correct += np.sum(weights * (predict == (labels >= self._threshold)))
+            total += np.sum(weights)
+        return correct / total if total else 0.
+
+    def save(self, file_name: str) -> None:
+        """
+        保存为call_landlord.py读取的模型文件
+        @param file_name: 模型文件
+        """
+        save_call_model(file_name, self.classifier.coef_, self.classifier.intercept_,
+                        self.scaler.mean_, self.scaler.scale_)
@@ -10,8 +10,9 @@ from abc import ABCMeta
 from collections import defaultdict
 from copy import deepcopy
 from functools import cmp_to_key
-from typing import Optional
+from typing import Optional, Dict, Tuple, List, Sequence
 
+from duguai import metrics
 from duguai.card.cards import *
 from duguai.card.cards import card_lt2, card_split
 from duguai.card.combo import Combo
@@ -25,6 +26,9 @@ def _most_value(x):
     return np.argmax(np.bincount(x))
 
 
+# 一个连续段的拆牌结果：各类动作、对应的Q值、最大Q值
+Segment = Tuple[List[List[np.ndarray]], List[np.ndarray], int]
+
 MAX_VALUE_CMP = cmp_to_key(lambda x, y: max(x) - max(y))
 MOST_VALUE_CMP = cmp_to_key(lambda x, y: _most_value(x) - _most_value(y))
 
@@ -38,6 +42,12 @@ class AbstractDecomposer(metaclass=ABCMeta):
         q = d(next_state) + len(a)
     """
 
+    def __init__(self, segment_cache: Optional[Dict[Tuple[int, ...], Segment]] = None):
+        """
+        @param segment_cache: 段的拆牌结果缓存，以段中的牌为键。为None时不缓存
+        """
+        self._segment_cache = segment_cache
+
     @classmethod
     def decompose_value(cls, card_after: np.ndarray) -> int:
         """
@@ -105,18 +115,31 @@ class AbstractDecomposer(metaclass=ABCMeta):
         self.card2_count: int = len(eq2_cards)
 
     def _get_all_actions_and_q_lists(self, lt2_state: np.ndarray) -> int:
-        """获取一个lt2_state下所有的actions及其对应的q_lists"""
+        """获取一个lt2_state下所有的actions及其对应的q_lists。有段缓存时，相同的段只计算一次"""
+        if self._segment_cache is None:
+            self._actions, self._q_lists, max_q = self._score_segment(lt2_state)
+            return max_q
+
+        key = tuple(lt2_state.tolist())
+        scored = self._segment_cache.get(key)
+        if scored is None:
+            scored = self._segment_cache[key] = self._score_segment(lt2_state)
+        self._actions, self._q_lists, max_q = scored
+        return max_q
+
+    def _score_segment(self, lt2_state: np.ndarray) -> Segment:
+        """计算一个lt2_state下所有的actions及其对应的q_lists，不修改self"""
 
         di, max_count, max_card_value = card_to_suffix_di(lt2_state)
 
         # solo pair trio bomb plane other
-        self._actions = [[], [], [], [], [], []]
-        self._q_lists = [np.array([], dtype=int), np.array([], dtype=int), np.array([], dtype=int),
+        actions = [[], [], [], [], [], []]
+        q_lists = [np.array([], dtype=int), np.array([], dtype=int), np.array([], dtype=int),
                          np.array([], dtype=int), np.array([], dtype=int), np.array([], dtype=int)]
 
         # solo pair trio bomb
         for i in range(1, 5):
-            self._actions[i - 1], self._q_lists[i - 1] = self._eval_actions(_get_single_actions, lt2_state, length=i)
+            actions[i - 1], q_lists[i - 1] = self._eval_actions(_get_single_actions, lt2_state, length=i)
 
         # plane
         for length in range(3, len(di[3]) + 1):
@@ -125,8 +148,8 @@ class AbstractDecomposer(metaclass=ABCMeta):
                                                          card_list=di[3],
                                                          kind=3,
                                                          length=length)
-            self._actions[4].extend(seq_actions)
-            self._q_lists[4] = np.concatenate([self._q_lists[4], seq_q_list])
+            actions[4].extend(seq_actions)
+            q_lists[4] = np.concatenate([q_lists[4], seq_q_list])
 
         # 拆出顺子、连对
         for k, min_len in KIND_TO_MIN_LEN.items():
@@ -137,14 +160,77 @@ class AbstractDecomposer(metaclass=ABCMeta):
                                                              card_list=card_list,
                                                              kind=k,
                                                              length=length)
-                self._actions[5].extend(seq_actions)
-                self._q_lists[5] = np.concatenate([self._q_lists[5], seq_q_list])
+                actions[5].extend(seq_actions)
+                q_lists[5] = np.concatenate([q_lists[5], seq_q_list])
 
         max_q = 0
-        for q_list in self._q_lists:
+        for q_list in q_lists:
             if q_list.size:
                 max_q = max(np.max(q_list), max_q)
-        return max_q
+        return actions, q_lists, max_q
+
+
+class HandSummary:
+    """
+    跟牌前的手牌摘要：每种(main_kind, seq_len)能拆出的最大主牌，以及炸弹、王炸。
+    用于在拆牌之前以O(1)判断手牌是否可能压过上一手牌。它只看主牌、不看带牌，是拆牌器能找到的跟牌的上界：
+    判断为压不过时，拆牌器一定也找不到跟牌
+    """
+    __slots__ = ('_counts', '_max_values', 'has_rocket')
+
+    # 顺子、连对、飞机的最短长度
+    _SEQ_MIN_LEN = ((1, 5), (2, 3), (3, 2))
+
+    def __init__(self, cards: np.ndarray):
+        """
+        @param cards: 手牌
+        """
+        counts: List[int] = np.bincount(np.asarray(cards, dtype=int), minlength=CARD_G1 + 1).tolist()
+        self._counts = counts
+        self._max_values: Dict[Tuple[int, int], int] = {}
+
+        for kind in range(1, 5):
+            for value in range(CARD_G1, 0, -1):
+                if counts[value] >= kind:
+                    self._max_values[(kind, 1)] = value
+                    break
+
+        for kind, min_len in self._SEQ_MIN_LEN:
+            run = 0
+            for value in range(CARD_3, CARD_2):
+                run = run + 1 if counts[value] >= kind else 0
+                for seq_len in range(min_len, run + 1):
+                    self._max_values[(kind, seq_len)] = value
+
+        self.has_rocket: bool = counts[CARD_G0] == 1 and counts[CARD_G1] == 1
+
+    def max_value(self, main_kind: int, seq_len: int) -> int:
+        """
+        @return: 能拆出的该类型主牌的最大值，拆不出时返回0
+        """
+        return self._max_values.get((main_kind, seq_len), 0)
+
+    def can_beat(self, last_combo: Combo) -> bool:
+        """
+        拆牌器是否可能找到压过last_combo的跟牌（炸弹另算）
+        """
+        if last_combo.is_rocket():
+            return False
+        return self.max_value(last_combo.main_kind, last_combo.seq_len) > last_combo.value
+
+    def bombs(self, last_combo: Combo) -> List[np.ndarray]:
+        """
+        可以用来压过last_combo的炸弹，顺序与FollowDecomposer.get_good_follows返回的相同
+        """
+        bombs: List[np.ndarray] = []
+        if self.has_rocket:
+            bombs.append(np.array([CARD_G0, CARD_G1]))
+        if self._counts[CARD_2] == 4:
+            bombs.append(np.array([CARD_2] * 4))
+        for value in range(CARD_3, CARD_2):
+            if self._counts[value] == 4 and (not last_combo.is_bomb() or value > last_combo.value):
+                bombs.append(np.array([value] * 4))
+        return bombs
 
 
 class FollowDecomposer(AbstractDecomposer):
@@ -152,7 +238,13 @@ class FollowDecomposer(AbstractDecomposer):
     跟牌拆牌器
     """
 
-    def __init__(self):
+    def __init__(self, segment_cache: Optional[Dict[Tuple[int, ...], Segment]] = None):
+        super().__init__(segment_cache)
+
+        # 预检查的次数，以及因压不过而跳过拆牌的次数
+        self.prechecks: int = 0
+        self.precheck_hits: int = 0
+
         self._output: Optional[List[np.ndarray]] = None
 
         # 存放带牌的列表
@@ -175,6 +267,11 @@ class FollowDecomposer(AbstractDecomposer):
         self._main_kind: Optional[int] = None
         self._take_kind: Optional[int] = None
 
+    @property
+    def precheck_hit_rate(self) -> float:
+        """预检查直接得出空过或只能出炸弹的比例"""
+        return self.precheck_hits / self.prechecks if self.prechecks else 0.
+
     def _add_bomb(self, bomb_list: list) -> None:
         """添加炸弹"""
 
@@ -350,6 +447,17 @@ class FollowDecomposer(AbstractDecomposer):
         if last_combo.is_rocket():
             return [], 0, [], np.array([], dtype=int)
 
+        # 主牌都压不过时不必拆牌，只能空过或出炸弹
+        self.prechecks += 1
+        summary = HandSummary(state)
+        if not summary.can_beat(last_combo):
+            self.precheck_hits += 1
+            if metrics.enabled:
+                metrics.FOLLOW_PRECHECKS.inc('hit')
+            return summary.bombs(last_combo), 0, [], np.array([], dtype=int)
+        if metrics.enabled:
+            metrics.FOLLOW_PRECHECKS.inc('miss')
+
         self._process_card(state)
         self._init(last_combo)
 
@@ -561,7 +669,8 @@ class PlayDecomposer(AbstractDecomposer):
     5. 输出argmax(D(a))
     """
 
-    def __init__(self):
+    def __init__(self, segment_cache: Optional[Dict[Tuple[int, ...], Segment]] = None):
+        super().__init__(segment_cache)
         self.cards_q_maps_list: Optional[List[Dict[int, List[np.ndarray]]]] = None
 
     def _map_actions(self, actions, q_list, max_q: int, idx: int):
@@ -607,6 +716,38 @@ class PlayDecomposer(AbstractDecomposer):
         return play_hand
 
 
+def _counts_to_cards(counts: np.ndarray) -> np.ndarray:
+    """把数量向量（第i列为牌i+1的数量）转换为从小到大排列的牌"""
+    return np.repeat(np.arange(1, counts.size + 1), counts)
+
+
+def get_good_plays_batch(counts: np.ndarray) -> List[PlayHand]:
+    """
+    批量拆出较好的出牌行动。不使用共享的拆牌器，可以在多个线程中同时调用。
+    同一批中相同的连续段只计算一次Q值
+    @param counts: 形状为(n, 15)的手牌数量矩阵，每一行不能全为0
+    @return: n个PlayHand，与逐个调用PlayDecomposer.get_good_plays的结果相同
+    """
+    counts = np.asarray(counts, dtype=int)
+    segment_cache: Dict[Tuple[int, ...], Segment] = {}
+    return [PlayDecomposer(segment_cache).get_good_plays(_counts_to_cards(row)) for row in counts]
+
+
+def get_good_follows_batch(counts: np.ndarray, last_combos: Sequence[Combo]) \
+        -> List[Tuple[List[np.ndarray], int, List[np.ndarray], np.ndarray]]:
+    """
+    批量给出较好的跟牌行动。不使用共享的拆牌器，可以在多个线程中同时调用。
+    同一批中相同的连续段只计算一次Q值
+    @param counts: 形状为(n, 15)的手牌数量矩阵
+    @param last_combos: n个上一次出牌
+    @return: n个四元组，与逐个调用FollowDecomposer.get_good_follows的结果相同
+    """
+    counts = np.asarray(counts, dtype=int)
+    segment_cache: Dict[Tuple[int, ...], Segment] = {}
+    return [FollowDecomposer(segment_cache).get_good_follows(_counts_to_cards(row), last_combo)
+            for row, last_combo in zip(counts, last_combos)]
+
+
 def get_next_state(state: np.ndarray, action: np.ndarray) -> np.ndarray:
     """
     获取状态做出动作后的的下一个状态
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+"""
+残局求解模块。
+牌局接近结束时剩下的牌很少，对手手中的牌可以由已出的牌确定或穷举，此时Q表按_hand_to_state粗略分桶的特征已不够用。
+EndgameSolver在三家剩余手牌总数不超过阈值时启用：
+1. solve：在完全信息的GameState上做极小极大搜索（地主一方对农民一方，结果只有胜负，找到一步必胜即剪枝），
+   置换表以三家手牌压缩后的整数、轮到谁、上一手牌的bit_info及出牌者为键；
+2. decide：穷举对手手牌的所有分配方式，返回在每一种分配下都必胜的出牌。对手手牌唯一确定时结果是严格的；
+   否则后续决策默认知道对手手牌，只是一种近似。
+搜索时枚举所有带牌组合，不受duguai.card.moves中固定挑选带牌规则的限制。每次调用都有节点数与时间预算，超出预算时放弃求解。
+@author: 江胤佐
+"""
+from __future__ import annotations
+
+from itertools import combinations
+from time import perf_counter
+from typing import Dict, List, Optional, Sequence, Tuple, Iterator
+
+from duguai.card.combo import PASS
+from duguai.card.moves import Move, bit_info_of, to_cards, to_counts
+from duguai.game.state import GameState
+from duguai.game.tracker import SearchInfo
+
+# 置换表的键：(三家压缩后的手牌, 地主, 轮到谁, 上一手牌的bit_info, 上一手牌的出牌者)
+Key = Tuple[int, int, int, int, int]
+
+
+class _BudgetExceeded(Exception):
+    """超出节点数或时间预算"""
+    pass
+
+
+def pack(counts: Sequence[int]) -> int:
+    """
+    把数量向量压缩为一个整数，每种牌占3位
+    @param counts: 数量向量
+    """
+    packed = 0
+    for c in reversed(counts):
+        packed = packed << 3 | c
+    return packed
+
+
+def _kicker_choices(counts: Sequence[int], move: Move) -> Iterator[Move]:
+    """枚举与move主体相同、带牌不同的所有合法出牌"""
+    bit, cards = move
+    take = bit // 100000
+    if bit <= 0 or not take:
+        yield move
+        return
+    n, kind, value = bit // 1000 % 100, bit // 100 % 10, bit % 100
+    main = tuple(v for v in range(value - n + 1, value + 1) for _ in range(kind))
+    rest = list(counts)
+    for c in main:
+        rest[c - 1] -= 1
+    kickers = 2 if kind == 4 else n
+    if take == 1:
+        pool = [v for v in range(1, 16) if v not in main for _ in range(min(rest[v - 1], 2))]
+        groups = set(combinations(pool, kickers))
+    else:
+        groups = {tuple(v for v in group for _ in range(2))
+                  for group in combinations([v for v in range(1, 16) if rest[v - 1] >= 2 and v not in main], kickers)}
+    for group in groups:
+        candidate = tuple(sorted(main + group))
+        if bit_info_of(to_counts(candidate)) == bit:
+            yield bit, candidate
+
+
+class EndgameSolver:
+    """
+    带置换表的残局求解器。置换表在多次调用之间共享
+    """
+
+    def __init__(self, threshold: int = 12, max_nodes: int = 200000, budget_ms: float = 50,
+                 max_deals: int = 64, max_entries: int = 1 << 20):
+        """
+        @param threshold: 三家剩余手牌总数不超过该值时启用
+        @param max_nodes: 每次调用最多搜索的节点数
+        @param budget_ms: 每次调用最多使用的毫秒数
+        @param max_deals: decide最多穷举的对手手牌分配数，超出时放弃求解
+        @param max_entries: 置换表的最大条目数，超出时清空
+        """
+        self.threshold = threshold
+        self.max_nodes = max_nodes
+        self.budget_ms = budget_ms
+        self.max_deals = max_deals
+        self._max_entries = max_entries
+        self._table: Dict[Key, bool] = {}
+        self._nodes: int = 0
+        self._deadline: float = 0.
+
+        # 累计搜索的节点数
+        self.nodes: int = 0
+
+    def applicable(self, sizes: Sequence[int]) -> bool:
+        """
+        是否应当启用残局求解
+        @param sizes: 三个座位的手牌数
+        """
+        return sum(sizes) <= self.threshold
+
+    def _moves(self, state: GameState) -> List[Move]:
+        """所有出牌（含所有带牌组合），出完牌的在前，出牌多的在前，空过在最后"""
+        hand = state.hands[state.turn]
+        moves = [m for move in state.legal_moves() for m in _kicker_choices(hand, move)]
+        size = state.sizes[state.turn]
+        moves.sort(key=lambda m: (len(m[1]) != size, -len(m[1])))
+        return moves
+
+    def _key(self, state: GameState) -> Key:
+        h = state.hands
+        packed = (pack(h[0]) << 90) | (pack(h[1]) << 45) | pack(h[2])
+        if state.last_owner == state.turn:
+            return packed, state.landlord, state.turn, PASS, state.turn
+        return packed, state.landlord, state.turn, state.last_bit, state.last_owner
+
+    def _wins(self, state: GameState) -> bool:
+        """当前玩家一方是否必胜"""
+        key = self._key(state)
+        result = self._table.get(key)
+        if result is not None:
+            return result
+
+        self._nodes += 1
+        if self._nodes > self.max_nodes or (not self._nodes & 255 and perf_counter() > self._deadline):
+            raise _BudgetExceeded()
+
+        side = state.turn == state.landlord
+        result = False
+        for move in self._moves(state):
+            # 超出预算时_BudgetExceeded穿过每一层，也要撤销这一层的出牌
+            try:
+                if state.apply(move):
+                    result = True
+                else:
+                    won = self._wins(state)
+                    result = won if (state.turn == state.landlord) == side else not won
+            finally:
+                state.undo()
+            if result:
+                break
+
+        if len(self._table) >= self._max_entries:
+            self._table.clear()
+        self._table[key] = result
+        return result
+
+    def _begin(self) -> None:
+        self._nodes = 0
+        self._deadline = perf_counter() + self.budget_ms / 1000
+
+    def _end(self) -> None:
+        self.nodes += self._nodes
+
+    def _winning_moves(self, state: GameState, candidates: List[Move]) -> List[Move]:
+        side = state.turn == state.landlord
+        winning = []
+        for move in candidates:
+            try:
+                if state.apply(move):
+                    won = True
+                else:
+                    won = self._wins(state)
+                    won = won if (state.turn == state.landlord) == side else not won
+            finally:
+                state.undo()
+            if won:
+                winning.append(move)
+        return winning
+
+    def solve(self, state: GameState) -> Optional[Move]:
+        """
+        在完全信息下求当前玩家的必胜出牌
+        @param state: 牌局状态，返回时保持不变
+        @return: 必胜出牌。不存在或超出预算时返回None
+        """
+        self._begin()
+        try:
+            for move in self._moves(state):
+                if self._winning_moves(state, [move]):
+                    return move
+            return None
+        except _BudgetExceeded:
+            return None
+        finally:
+            self._end()
+
+    def deals(self, info: SearchInfo) -> Iterator[Tuple[List[int], List[int]]]:
+        """
+        穷举对手手牌的所有分配方式
+        @param info: 决策玩家的公开信息
+        @return: 下家、上家的手牌数量向量
+        """
+        n, p = (info.turn + 1) % 3, (info.turn + 2) % 3
+        free = [u - a - b for u, a, b in zip(info.unseen, info.known[n], info.known[p])]
+        pool = to_cards(free)
+        need = info.sizes[n] - sum(info.known[n])
+        for group in set(combinations(pool, need)):
+            hand_n = list(info.known[n])
+            for c in group:
+                hand_n[c - 1] += 1
+            yield hand_n, [u - c for u, c in zip(info.unseen, hand_n)]
+
+    def decide(self, info: SearchInfo) -> Optional[Move]:
+        """
+        在不完全信息下求当前玩家的出牌
+        @param info: 决策玩家的公开信息
+        @return: 在对手手牌的每一种分配下都必胜的出牌。不存在、分配数过多或超出预算时返回None
+        """
+        if not self.applicable(info.sizes):
+            return None
+        deals = list(self.deals(info))
+        if not deals or len(deals) > self.max_deals:
+            return None
+
+        self._begin()
+        try:
+            candidates: Optional[List[Move]] = None
+            for hand_n, hand_p in deals:
+                hands: List[List[int]] = [[], [], []]
+                hands[info.turn] = list(info.hand)
+                hands[(info.turn + 1) % 3], hands[(info.turn + 2) % 3] = hand_n, hand_p
+                state = GameState(hands, info.landlord, info.turn, info.last_bit, info.last_owner)
+                candidates = self._winning_moves(state, self._moves(state) if candidates is None else candidates)
+                if not candidates:
+                    return None
+            return candidates[0]
+        except _BudgetExceeded:
+            return None
+        finally:
+            self._end()
@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+"""
+本地批量推理服务模块。
+一台机器上同时进行很多局游戏时，不必每个进程都加载一份Q表：由一个asyncio服务持有Q表，
+各局游戏中的机器人把 (状态向量, 动作位掩码) 发给服务，服务把一个小时间窗口内到达的请求攒成一批，
+批量计算状态编号、一次性取出Q表中的行，再逐个在掩码允许的动作中挑选动作。
+
+服务有两种接入方式：
+1. 进程内：LocalInferenceAgent 通过 asyncio.run_coroutine_threadsafe 把请求提交到服务所在的事件循环；
+2. Unix套接字：serve_unix() 监听套接字，其它进程使用 InferenceClient 连接。
+
+套接字协议（小端序）：
+请求    1字节状态向量长度n，n字节状态向量，4字节动作位掩码
+响应    1字节挑选出的动作
+@author: 江胤佐
+"""
+from __future__ import annotations
+
+import asyncio
+import socket
+import struct
+from threading import Thread
+from typing import List, Union, Optional, Tuple
+
+import numpy as np
+
+from duguai.game.robot import Robot
+from .action_mask import masked_argmax
+from .q_learning import PlayQLHelper, FollowQLHelper
+
+_MASK = struct.Struct('<I')
+
+
+def encode_request(state_vector: Union[np.ndarray, List[int]], action_mask: int) -> bytes:
+    """
+    把一次决策请求编码为套接字协议的字节串
+    @param state_vector: 状态向量
+    @param action_mask: 动作位掩码
+    """
+    return bytes((len(state_vector),)) + bytes(int(v) for v in state_vector) + _MASK.pack(action_mask)
+
+
+class InferenceService:
+    """
+    持有Q表的批量推理服务。行为与QLExecuteAgent相同：在与最大Q值相差不超过tolerance的动作中随机挑选
+    @note: start()、infer()、serve_unix()、close()必须在同一个事件循环中调用
+    """
+
+    def __init__(self, play_q_table: np.ndarray, follow_q_table: np.ndarray,
+                 window: float = 0.001, max_batch: int = 1024, tolerance: float = 0.1):
+        """
+        @param play_q_table: 出牌Q表
+        @param follow_q_table: 跟牌Q表
+        @param window: 收到一批中的第一个请求后，继续等待其它请求的秒数
+        @param max_batch: 一批最多的请求数
+        @param tolerance: 近似最大的容差
+        """
+        self._play_q_table = play_q_table
+        self._follow_q_table = follow_q_table
+        self._window = window
+        self._max_batch = max_batch
+        self._tolerance = tolerance
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+
+        self.request_count: int = 0
+        self.batch_count: int = 0
+
+    async def start(self) -> None:
+        """启动攒批任务"""
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._batch_loop())
+
+    async def close(self) -> None:
+        """停止监听套接字与攒批任务"""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def __aenter__(self) -> InferenceService:
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def infer(self, state_vector: Union[np.ndarray, List[int]], action_mask: int) -> int:
+        """
+        提交一次决策请求，等待所在的批次完成
+        @param state_vector: 状态向量
+        @param action_mask: 动作位掩码
+        @return: 挑选出的动作
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((state_vector, action_mask, future))
+        return await future
+
+    async def _batch_loop(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            if self._queue.qsize() < self._max_batch - 1:
+                await asyncio.sleep(self._window)
+            while len(batch) < self._max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            try:
+                actions = self.answer([(s, m) for s, m, _ in batch])
+            except Exception as e:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            else:
+                for (_, _, future), action in zip(batch, actions):
+                    if not future.done():
+                        future.set_result(action)
+
+    def answer(self, batch: List[Tuple[Union[np.ndarray, List[int]], int]]) -> List[int]:
+        """
+        同步地回答一批请求
+        @param batch: (状态向量, 动作位掩码) 的列表
+        @return: 每个请求挑选出的动作
+        """
+        self.request_count += len(batch)
+        self.batch_count += 1
+
+        actions = [0] * len(batch)
+        play_idx = [i for i, (s, _) in enumerate(batch) if len(s) == PlayQLHelper.STATE_VECTOR_SIZE]
+        follow_idx = [i for i, (s, _) in enumerate(batch) if len(s) != PlayQLHelper.STATE_VECTOR_SIZE]
+
+        for idx, q_table, helper in ((play_idx, self._play_q_table, PlayQLHelper),
+                                     (follow_idx, self._follow_q_table, FollowQLHelper)):
+            if not idx:
+                continue
+            rows = q_table[helper.states_to_int([batch[i][0] for i in idx])]
+            for row, i in zip(rows, idx):
+                actions[i] = masked_argmax(row, batch[i][1], self._tolerance)
+        return actions
+
+    async def serve_unix(self, path: str) -> None:
+        """
+        在Unix套接字上监听请求
+        @param path: 套接字文件路径
+        """
+        self._server = await asyncio.start_unix_server(self._handle, path)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                n = (await reader.readexactly(1))[0]
+                data = await reader.readexactly(n + _MASK.size)
+                action = await self.infer(list(data[:n]), _MASK.unpack_from(data, n)[0])
+                writer.write(bytes((action,)))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+def start_service_thread(service: InferenceService) -> asyncio.AbstractEventLoop:
+    """
+    在一个后台线程的事件循环中启动服务，供同步代码（如GameEnv.start）通过LocalInferenceAgent使用
+    @param service: 推理服务
+    @return: 服务所在的事件循环
+    """
+    loop = asyncio.new_event_loop()
+    Thread(target=loop.run_forever, daemon=True).start()
+    asyncio.run_coroutine_threadsafe(service.start(), loop).result()
+    return loop
+
+
+def stop_service_thread(service: InferenceService, loop: asyncio.AbstractEventLoop) -> None:
+    """
+    关闭start_service_thread启动的服务，并停止后台线程的事件循环
+    @param service: 推理服务
+    @param loop: 服务所在的事件循环
+    """
+    asyncio.run_coroutine_threadsafe(service.close(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+
+
+class LocalInferenceAgent(Robot.Agent):
+    """
+    通过进程内的事件循环向推理服务提交请求的智能体，可在多个线程的游戏中共享同一个服务
+    """
+
+    def __init__(self, service: InferenceService, loop: asyncio.AbstractEventLoop):
+        """
+        @param service: 推理服务
+        @param loop: 服务所在的事件循环，见start_service_thread
+        """
+        self._service = service
+        self._loop = loop
+
+    def exec(self, state_vector: Union[np.ndarray, List[int]], action_mask: int) -> int:
+        """
+        向推理服务提交请求，阻塞直到服务回答
+        @param state_vector: 状态向量
+        @param action_mask: 动作位掩码
+        @return: 推理服务挑选的动作
+        """
+        return asyncio.run_coroutine_threadsafe(self._service.infer(state_vector, action_mask), self._loop).result()
+
+
+class InferenceClient(Robot.Agent):
+    """
+    通过Unix套接字连接推理服务的智能体
+    """
+
+    def __init__(self, path: str):
+        """
+        @param path: 推理服务的套接字文件路径
+        """
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.connect(path)
+
+    def exec(self, state_vector: Union[np.ndarray, List[int]], action_mask: int) -> int:
+        """
+        向推理服务发送请求，阻塞直到服务回答
+        @param state_vector: 状态向量
+        @param action_mask: 动作位掩码
+        @return: 推理服务挑选的动作
+        """
+        self._sock.sendall(encode_request(state_vector, action_mask))
+        data = self._sock.recv(1)
+        if not data:
+            raise ConnectionError('推理服务已关闭连接')
+        return data[0]
+
+    def close(self) -> None:
+        """关闭连接"""
+        self._sock.close()
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+线性函数逼近的强化学习模块，作为Q表的轻量替代。
+出牌Q表有1244160个状态、17个动作，正因如此状态特征才被分桶得很粗。这里不再为每个状态存一行Q值，
+而是把12维（出牌）或6维（跟牌）状态向量的每个特征按取值独热编码，再加上少量特征两两组合的瓦片编码（如上家、下家手牌数的组合）
+和一个偏置项，每个动作学习一个权重向量：
+    Q(s, a) = sum(W[i, a] for i in active(s))
+训练使用半梯度Q-Learning，每一步只用一次numpy花式索引更新当前状态激活的那些行。
+出牌、跟牌两个模型合计只有十几KB，保存为一个.npz文件。
+@author: 江胤佐
+"""
+from __future__ import annotations
+
+import os
+from random import random
+from typing import Sequence, Tuple, Union, List, Optional
+
+import numpy as np
+
+from duguai.ai.action_mask import mask_sample, masked_argmax, masked_max
+from duguai.game.robot import Robot
+from .q_learning import PlayQLHelper, FollowQLHelper, step_reward
+
+# 出牌、跟牌状态向量每个特征的取值个数，见PlayProvider.StateProvider与FollowProvider.provide
+PLAY_FEATURE_SIZES = (4, 4, 3, 3, 3, 3, 2, 3, 2, 3, 8, 8)
+FOLLOW_FEATURE_SIZES = (6, 3, 3, 8, 8, 6)
+
+# 默认的瓦片编码：出牌时上家、下家手牌数的组合；跟牌时另加自己与出牌者身份的组合
+PLAY_PAIRS = ((10, 11),)
+FOLLOW_PAIRS = ((3, 4), (1, 2))
+
+
+class FeatureEncoder:
+    """
+    把状态向量编码为激活特征的下标。每个状态激活的特征数相同：每个特征一个、每个组合一个、偏置一个
+    """
+
+    def __init__(self, sizes: Sequence[int], pairs: Sequence[Tuple[int, int]] = ()):
+        """
+        @param sizes: 每个特征的取值个数
+        @param pairs: 做组合编码的特征下标对
+        """
+        self._sizes = np.asarray(sizes, dtype=np.int64)
+        self._offsets = np.concatenate([[0], np.cumsum(self._sizes)[:-1]])
+        self._pairs = tuple(pairs)
+        self._pair_offsets = []
+        n = int(self._sizes.sum())
+        for i, j in self._pairs:
+            self._pair_offsets.append(n)
+            n += int(self._sizes[i] * self._sizes[j])
+        self._bias = n
+
+        # 特征总数（含偏置）与每个状态激活的特征数
+        self.size: int = n + 1
+        self.active: int = len(sizes) + len(self._pairs) + 1
+
+    def encode(self, state_vector: Union[np.ndarray, List[int]]) -> np.ndarray:
+        """
+        @param state_vector: 状态向量，超出取值范围的特征按最大值处理
+        @return: 激活特征的下标数组
+        """
+        v = np.minimum(np.asarray(state_vector, dtype=np.int64), self._sizes - 1)
+        idx = np.empty(self.active, dtype=np.int64)
+        n = len(v)
+        idx[:n] = self._offsets + v
+        for k, (i, j) in enumerate(self._pairs):
+            idx[n + k] = self._pair_offsets[k] + v[i] * self._sizes[j] + v[j]
+        idx[-1] = self._bias
+        return idx
+
+
+PLAY_ENCODER = FeatureEncoder(PLAY_FEATURE_SIZES, PLAY_PAIRS)
+FOLLOW_ENCODER = FeatureEncoder(FOLLOW_FEATURE_SIZES, FOLLOW_PAIRS)
+
+
+class LinearQModel:
+    """
+    出牌、跟牌两个线性Q函数的权重
+    """
+
+    def __init__(self, play_weights: Optional[np.ndarray] = None, follow_weights: Optional[np.ndarray] = None):
+        """
+        @param play_weights: 形状为(PLAY_ENCODER.size, 17)的权重，默认全为0
+        @param follow_weights: 形状为(FOLLOW_ENCODER.size, 9)的权重，默认全为0
+        """
+        self.play_weights: np.ndarray = np.zeros((PLAY_ENCODER.size, PlayQLHelper.ACTION_LEN), dtype=np.float32) \
+            if play_weights is None else play_weights
+        self.follow_weights: np.ndarray = np.zeros((FOLLOW_ENCODER.size, FollowQLHelper.ACTION_LEN),
+                                                   dtype=np.float32) if follow_weights is None else follow_weights
+        if self.play_weights.shape != (PLAY_ENCODER.size, PlayQLHelper.ACTION_LEN) or \
+                self.follow_weights.shape != (FOLLOW_ENCODER.size, FollowQLHelper.ACTION_LEN):
+            raise ValueError('权重的形状错误')
+
+    def lookup(self, state_vector: Union[np.ndarray, List[int]]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        @param state_vector: 出牌或跟牌的状态向量
+        @return: 对应的权重矩阵, 激活特征的下标
+        """
+        if len(state_vector) == PlayQLHelper.STATE_VECTOR_SIZE:
+            return self.play_weights, PLAY_ENCODER.encode(state_vector)
+        return self.follow_weights, FOLLOW_ENCODER.encode(state_vector)
+
+    def q_values(self, state_vector: Union[np.ndarray, List[int]]) -> np.ndarray:
+        """某个状态下所有动作的Q值"""
+        weights, idx = self.lookup(state_vector)
+        return weights[idx].sum(axis=0)
+
+    @property
+    def nbytes(self) -> int:
+        """权重占用的字节数"""
+        return self.play_weights.nbytes + self.follow_weights.nbytes
+
+    def save(self, file_name: str) -> None:
+        """
+        保存为.npz文件
+        @param file_name: 文件名
+        """
+        np.savez(file_name, play=self.play_weights, follow=self.follow_weights)
+
+    @classmethod
+    def load(cls, file_name: str) -> LinearQModel:
+        """
+        从.npz文件加载模型。文件不存在时返回权重全为0的模型
+        @param file_name: 文件名
+        """
+        if not os.path.exists(file_name):
+            return cls()
+        with np.load(file_name) as data:
+            return cls(data['play'], data['follow'])
+
+
+class LinearExecuteAgent(Robot.Agent):
+    """
+    不训练，用线性模型执行行动的智能体
+    """
+
+    def __init__(self, model: LinearQModel):
+        self._model = model
+
+    def exec(self, state_vector: Union[np.ndarray, List[int]], action_mask: int) -> int:
+        """
+        @return: Q值最大的动作（与最大值相差0.1以内的动作随机挑选）
+        """
+        return masked_argmax(self._model.q_values(state_vector), action_mask, 0.1)
+
+    def q_values(self, state_vector: Union[np.ndarray, List[int]]) -> np.ndarray:
+        """
+        @return: 线性模型给出的各动作Q值
+        """
+        return self._model.q_values(state_vector)
+
+
+class LinearTrainingAgent(Robot.Agent):
+    """
+    半梯度Q-Learning训练线性模型的智能体。特征均为0/1，因此梯度就是激活特征对应的行：
+    W[active(S), A] += alpha / n_active * [R + gamma * max Q(S', a) - Q(S, A)]
+    @note: 该类不负责持久化保存训练完的模型
+    """
+    trains = True
+
+    def __init__(self, model: LinearQModel, alpha: float, gamma: float, epsilon: float = 0.1):
+        self._model = model
+        self._alpha = alpha
+        self._gamma = gamma
+        self._epsilon = epsilon
+
+        self.weights0: Optional[np.ndarray] = None
+        self.idx0: Optional[np.ndarray] = None
+        self.action0: int = -1
+        self.reward0: float = 0.
+
+    def _update0(self, target: float) -> None:
+        q_value0 = self.weights0[self.idx0, self.action0].sum()
+        self.weights0[self.idx0, self.action0] += self._alpha / len(self.idx0) * (target - q_value0)
+
+    def update_game_over(self, reward: int) -> None:
+        """游戏结束时，用终局奖励更新最后一步"""
+        if self.weights0 is not None:
+            self._update0(reward)
+        self.weights0 = None
+
+    def exec(self, state_vector: Union[np.ndarray, List[int]], action_mask: int) -> int:
+        """
+        执行半梯度Q-Learning
+        @param state_vector: 状态向量
+        @param action_mask: 动作位掩码
+        @return: epsilon-贪心法选择出来的动作
+        """
+        weights1, idx1 = self._model.lookup(state_vector)
+        q1 = weights1[idx1].sum(axis=0)
+        if self.weights0 is not None:
+            self._update0(self.reward0 + self._gamma * masked_max(q1, action_mask))
+
+        self.weights0, self.idx0 = weights1, idx1
+        self.action0 = mask_sample(action_mask) if random() < self._epsilon else masked_argmax(q1, action_mask)
+        self.reward0 = step_reward(state_vector, self.action0, action_mask)
+        return self.action0
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""
+信息集蒙特卡洛树搜索（ISMCTS）模块。
+查Q表的智能体只看12个或6个特征，不知道哪些牌还没出。搜索机器人在每次决策时：
+1. 确定化：把对手手中的牌（即除自己手牌和已出的牌以外的所有牌）按对手的手牌数随机分配，
+   并尽量满足记牌器给出的约束（见duguai.game.tracker）；
+2. 在确定化后的牌局上，沿单观察者信息集树按UCB选择、扩展一个节点，再用廉价的默认策略模拟到终局；
+3. 把胜负回传给路径上的节点。
+以上步骤在给定的毫秒数内反复进行，最后返回访问次数最多的出牌。
+多进程时采用根并行：每个进程独立搜索，汇总根节点各出牌的访问次数。
+@author: 江胤佐
+"""
+from __future__ import annotations
+
+import random
+from concurrent.futures import ProcessPoolExecutor
+from math import log, sqrt
+from time import perf_counter
+from typing import List, Dict, Optional, Tuple
+
+from duguai.card.combo import PASS
+from duguai.card.moves import Move, PASS_MOVE, to_cards, bit_info_of, lead_moves, follow_moves
+from duguai.game.game_env import GameEnv, _remove_last_combo
+from duguai.game.robot import Robot
+from duguai.game.state import GameState
+from duguai.game.tracker import SearchInfo, sample_consistent
+from .endgame import EndgameSolver
+from .q_learning import RandomAgent
+
+
+def _rollout_move(state: GameState, rng: random.Random) -> Move:
+    """
+    默认策略：能一手出完就出完；先手时多数情况下出最小的一种牌（三张带最小的单牌）；
+    跟牌时不压队友，用最小的同类型牌压对手，压不过且对手牌少时才用炸弹
+    """
+    hand = state.hands[state.turn]
+    if state.last_owner == state.turn:
+        bit = bit_info_of(hand)
+        if bit >= 0:
+            return bit, tuple(to_cards(hand))
+        ranks = [v for v in range(1, 16) if hand[v - 1]]
+        v = ranks[0] if rng.random() < 0.7 else rng.choice(ranks)
+        c = hand[v - 1]
+        if c == 3:
+            kicker = next((k for k in ranks if hand[k - 1] == 1), 0)
+            if kicker:
+                return 101300 + v, tuple(sorted((v, v, v, kicker)))
+        return 1000 + 100 * c + v, (v,) * c
+
+    if (state.turn == state.landlord) == (state.last_owner == state.landlord):
+        return PASS_MOVE
+    moves = follow_moves(hand, state.last_bit)
+    for move in moves[1:]:
+        if move[0] and move[0] // 100 != 14:
+            return move
+    if len(moves) > 1 and (state.sizes[state.last_owner] <= 4 or rng.random() < 0.2):
+        return moves[1]
+    return PASS_MOVE
+
+
+def _determinize(info: SearchInfo, rng: random.Random) -> GameState:
+    """按对手的手牌数和已知约束随机分配对手手中的牌"""
+    hands: List[List[int]] = [[], [], []]
+    hands[info.turn] = list(info.hand)
+    hands[(info.turn + 1) % 3], hands[(info.turn + 2) % 3] = sample_consistent(
+        info.turn, info.unseen, info.sizes, info.known, info.passes, rng, max_tries=4)
+    return GameState(hands, info.landlord, info.turn, info.last_bit, info.last_owner)
+
+
+class _Node:
+    __slots__ = ('player', 'children', 'visits', 'wins', 'avail')
+
+    def __init__(self, player: int):
+        # 走到该节点的出牌是谁出的
+        self.player = player
+        self.children: Dict[Move, _Node] = {}
+        self.visits = 0
+        self.wins = 0.
+        self.avail = 1
+
+
+def ismcts(info: SearchInfo, budget_ms: float, seed: Optional[int] = None, exploration: float = 0.7) \
+        -> Tuple[Dict[Move, int], int]:
+    """
+    在当前进程中进行一次搜索
+    @param info: 搜索者的公开信息
+    @param budget_ms: 搜索的毫秒数
+    @param seed: 随机种子
+    @param exploration: UCB的探索系数
+    @return: 根节点各出牌的访问次数, 迭代次数
+    """
+    rng = random.Random(seed)
+    root = _Node((info.turn + 2) % 3)
+    deadline = perf_counter() + budget_ms / 1000
+    iterations = 0
+    while True:
+        state = _determinize(info, rng)
+        node, path, over = root, [root], False
+
+        # 选择与扩展
+        while not over:
+            moves = state.legal_moves()
+            untried = [m for m in moves if m not in node.children]
+            if untried:
+                move = rng.choice(untried)
+                child = node.children[move] = _Node(state.turn)
+                path.append(child)
+                over = state.apply(move)
+                break
+            best, best_score = None, -1.
+            for m in moves:
+                c = node.children[m]
+                c.avail += 1
+                score = c.wins / c.visits + exploration * sqrt(log(c.avail) / c.visits)
+                if score > best_score:
+                    best, best_score = m, score
+            node = node.children[best]
+            path.append(node)
+            over = state.apply(best)
+
+        # 模拟
+        while not over:
+            over = state.apply(_rollout_move(state, rng))
+
+        # 回传。state.turn为出完牌的玩家
+        landlord_won = state.turn == state.landlord
+        for n in path:
+            n.visits += 1
+            if (n.player == state.landlord) == landlord_won:
+                n.wins += 1
+
+        iterations += 1
+        if perf_counter() >= deadline:
+            break
+    return {m: c.visits for m, c in root.children.items()}, iterations
+
+
+def _merge(results: List[Tuple[Dict[Move, int], int]]) -> Tuple[Dict[Move, int], int]:
+    visits: Dict[Move, int] = {}
+    iterations = 0
+    for v, n in results:
+        for m, c in v.items():
+            visits[m] = visits.get(m, 0) + c
+        iterations += n
+    return visits, iterations
+
+
+class MCTSSearcher:
+    """
+    给定时间预算的ISMCTS搜索器，可在多个进程中并行搜索
+    """
+
+    def __init__(self, budget_ms: float = 100, workers: int = 1, exploration: float = 0.7):
+        """
+        @param budget_ms: 每次决策的毫秒数
+        @param workers: 进程数。为1时在当前进程中搜索
+        @param exploration: UCB的探索系数
+        """
+        self.budget_ms = budget_ms
+        self._workers = workers
+        self._exploration = exploration
+        self._executor: Optional[ProcessPoolExecutor] = ProcessPoolExecutor(workers) if workers > 1 else None
+
+        # 累计的搜索次数与迭代次数
+        self.searches: int = 0
+        self.iterations: int = 0
+
+    def search(self, info: SearchInfo) -> Move:
+        """
+        搜索最好的出牌
+        @param info: 搜索者的公开信息
+        @return: 出牌
+        """
+        moves = lead_moves(info.hand) if info.last_owner == info.turn else follow_moves(info.hand, info.last_bit)
+        if len(moves) == 1:
+            return moves[0]
+
+        seeds = [random.getrandbits(32) for _ in range(self._workers)]
+        if self._executor is None:
+            visits, iterations = ismcts(info, self.budget_ms, seeds[0], self._exploration)
+        else:
+            visits, iterations = _merge(list(self._executor.map(
+                ismcts, [info] * self._workers, [self.budget_ms] * self._workers, seeds,
+                [self._exploration] * self._workers)))
+
+        self.searches += 1
+        self.iterations += iterations
+        return max(visits.items(), key=lambda item: item[1])[0]
+
+    def close(self) -> None:
+        """关闭进程池"""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
+class MCTSRobot(Robot):
+    """
+    用ISMCTS出牌、跟牌的机器人，叫地主与Robot相同
+    """
+
+    def __init__(self, game_env: GameEnv, name: str, searcher: MCTSSearcher, trust_passes: bool = False,
+                 endgame: Optional[EndgameSolver] = None):
+        """
+        @param searcher: 搜索器，可以被多个机器人共用
+        @param trust_passes: 确定化时是否要求对手压不过曾经空过的牌型。
+            对手能压也常常不压（例如随机决策AI）时，这一约束反而会误导搜索
+        @param endgame: 残局求解器。找到必胜出牌时不再搜索
+        """
+        # 基类需要一个智能体，它只会收到游戏结束的通知，不参与决策
+        super().__init__(game_env, RandomAgent(), name, endgame)
+        self._searcher = searcher
+        self._trust_passes = trust_passes
+
+    def _info(self, last_bit: int, last_owner: int) -> SearchInfo:
+        return self.game_env.tracker.search_info(self._order, last_bit, last_owner, self._trust_passes)
+
+    @_remove_last_combo
+    def follow(self) -> None:
+        """
+        搜索跟牌
+        """
+        last_bit, last_owner = self.game_env.last_combo.bit_info, self.game_env.last_combo_owner_id
+        _, cards = self._endgame_move(last_bit, last_owner) or self._searcher.search(self._info(last_bit, last_owner))
+        self.last_combo.cards = list(cards)
+        if not self.valid_follow():
+            raise ValueError('AI跟牌不合法, AI出的牌: {}, 上一次牌: {}'
+                             .format(self.last_combo.cards_view, self.game_env.last_combo))
+
+    @_remove_last_combo
+    def play(self) -> None:
+        """
+        搜索出牌
+        """
+        _, cards = self._endgame_move(PASS, self._order) or self._searcher.search(self._info(PASS, self._order))
+        self.last_combo.cards = list(cards)
+        if not self.last_combo.is_valid():
+            raise ValueError('AI出牌非法, AI出的牌: {}'.format(self.last_combo.cards_view))
@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+"""
+离线Q-Learning模块。
+对局时把每一步的状态转移 (S, A, R, S', A'的集合) 记录到列式存储的转移日志中，
+之后不必再模拟对局，直接在日志上反复扫描、以向量化的方式更新出牌与跟牌Q表。
+更换alpha、gamma重新训练时无需重新模拟。
+
+转移日志是一个目录，每一列是一个只追加的二进制文件，列名与类型见 COLUMNS：
+
+列名          含义
+---------------------------------------------------------------------
+table        S所属的Q表，PLAY_TABLE 或 FOLLOW_TABLE
+state        S在Q表中的编号
+action       A
+reward       R。非终止转移为step_reward，终止转移为对局结束的奖励
+next_table   S'所属的Q表
+next_state   S'在Q表中的编号
+next_mask    S'下可选动作的位掩码，第i位为1表示可以选择动作i
+done         是否为终止转移（对局结束）。终止转移的next_*列无意义
+---------------------------------------------------------------------
+@author: 江胤佐
+"""
+from __future__ import annotations
+
+import os
+from typing import Dict, Iterator, List, Union, Tuple
+
+import numpy as np
+
+from duguai.game.robot import Robot
+from .action_mask import actions_to_mask
+from .provider import state_index
+from .q_learning import PlayQLHelper, FollowQLHelper, step_reward
+
+PLAY_TABLE = 0
+FOLLOW_TABLE = 1
+
+COLUMNS: Dict[str, np.dtype] = {
+    'table': np.dtype('u1'),
+    'state': np.dtype('<i4'),
+    'action': np.dtype('u1'),
+    'reward': np.dtype('<f4'),
+    'next_table': np.dtype('u1'),
+    'next_state': np.dtype('<i4'),
+    'next_mask': np.dtype('<u4'),
+    'done': np.dtype('u1'),
+}
+
+_ACTION_LEN = (PlayQLHelper.ACTION_LEN, FollowQLHelper.ACTION_LEN)
+
+
+def _table_state(state_vector: Union[np.ndarray, List[int]]) -> Tuple[int, int]:
+    is_play, state = state_index(state_vector)
+    return (PLAY_TABLE if is_play else FOLLOW_TABLE), state
+
+
+class TransitionWriter:
+    """
+    转移日志的写入器。各列先写入预分配的缓冲区，攒满后追加到各自的文件中
+    """
+
+    def __init__(self, dir_name: str, buffer_size: int = 65536):
+        """
+        @param dir_name: 日志目录。目录已存在时追加写入
+        @param buffer_size: 缓冲区能容纳的转移条数
+        """
+        os.makedirs(dir_name, exist_ok=True)
+        self._dir_name = dir_name
+        self._buffers: Dict[str, np.ndarray] = {k: np.zeros(buffer_size, dtype=v) for k, v in COLUMNS.items()}
+        self._size: int = 0
+
+    def append(self, table: int, state: int, action: int, reward: float,
+               next_table: int = 0, next_state: int = 0, next_mask: int = 0, done: bool = False) -> None:
+        """写入一条转移"""
+        i = self._size
+        b = self._buffers
+        b['table'][i] = table
+        b['state'][i] = state
+        b['action'][i] = action
+        b['reward'][i] = reward
+        b['next_table'][i] = next_table
+        b['next_state'][i] = next_state
+        b['next_mask'][i] = next_mask
+        b['done'][i] = done
+
+        self._size += 1
+        if self._size == len(b['table']):
+            self.flush()
+
+    def flush(self) -> None:
+        """把缓冲区中的转移追加到文件"""
+        if not self._size:
+            return
+        for k, v in self._buffers.items():
+            with open(os.path.join(self._dir_name, k + '.bin'), 'ab') as f:
+                v[:self._size].tofile(f)
+        self._size = 0
+
+    def close(self) -> None:
+        """写入剩余的转移"""
+        self.flush()
+
+    def __enter__(self) -> TransitionWriter:
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class TransitionLog:
+    """
+    转移日志的读取器。各列以只读方式内存映射
+    """
+
+    def __init__(self, dir_name: str):
+        sizes = [os.path.getsize(os.path.join(dir_name, k + '.bin')) // v.itemsize for k, v in COLUMNS.items()]
+
+        # 写入中断时各列长度可能不一致，只取完整的部分
+        n = min(sizes)
+        self.columns: Dict[str, np.ndarray] = {
+            k: np.memmap(os.path.join(dir_name, k + '.bin'), dtype=v, mode='r', shape=(n,)) if n else
+            np.zeros(0, dtype=v) for k, v in COLUMNS.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.columns['table'])
+
+    def __getitem__(self, item: str) -> np.ndarray:
+        return self.columns[item]
+
+    def iter_chunks(self, chunk_size: int) -> Iterator[Dict[str, np.ndarray]]:
+        """
+        按块读取日志
+        @param chunk_size: 每块的转移条数
+        @return: 每次返回一个列名到数组的字典
+        """
+        for i in range(0, len(self), chunk_size):
+            yield {k: np.asarray(v[i:i + chunk_size]) for k, v in self.columns.items()}
+
+
+class TransitionRecordingAgent(Robot.Agent):
+    """
+    包装任意智能体，把它经历的状态转移写入转移日志。Q-Learning是离策略算法，因此可以用任意智能体收集数据
+    """
+    trains = True
+
+    def __init__(self, agent: Robot.Agent, writer: TransitionWriter):
+        self._agent = agent
+        self._writer = writer
+
+        self._table0: int = -1
+        self._state0: int = -1
+        self._action0: int = -1
+        self._reward0: float = 0
+
+    def exec(self, state_vector1: Union[np.ndarray, List[int]], action_mask1: int) -> int:
+        """
+        由被包装的智能体挑选动作，同时记录上一步的转移
+        @param state_vector1: 状态向量
+        @param action_mask1: 动作位掩码
+        @return: 被包装的智能体挑选的动作
+        """
+        table1, state1 = _table_state(state_vector1)
+        if self._state0 >= 0:
+            self._writer.append(self._table0, self._state0, self._action0, self._reward0,
+                                table1, state1, action_mask1)
+
+        action1 = self._agent.exec(state_vector1, action_mask1)
+        self._table0, self._state0, self._action0 = table1, state1, action1
+        self._reward0 = step_reward(state_vector1, action1, action_mask1)
+        return action1
+
+    def update_game_over(self, reward: int) -> None:
+        """记录终止转移"""
+        self._agent.update_game_over(reward)
+        if self._state0 >= 0:
+            self._writer.append(self._table0, self._state0, self._action0, reward, done=True)
+        self._state0 = -1
+
+
+def _masked_max(q_rows: np.ndarray, masks: np.ndarray) -> np.ndarray:
+    """每一行在掩码允许的动作中的最大Q值"""
+    bits = (masks[:, None] >> np.arange(q_rows.shape[1], dtype=masks.dtype)) & 1
+    return np.where(bits.astype(bool), q_rows, -np.inf).max(axis=1)
+
+
+class OfflineQLTrainer:
+    """
+    在转移日志上反复扫描，批量更新Q表。更新公式与QLTrainingAgent相同：
+    非终止转移 Q(S, A) := Q(S, A) + alpha * [R + gamma * (max Q(S', a) - Q(S, A))]
+    终止转移   Q(S, A) := Q(S, A) + alpha * [R - Q(S, A)]
+    每一块中的转移用同一份Q表计算目标值，落在同一个(S, A)上的多个更新取平均后一次性写入。
+    """
+
+    def __init__(self, play_q_table: np.ndarray, follow_q_table: np.ndarray, alpha: float, gamma: float):
+        self._q_tables = (play_q_table, follow_q_table)
+        self._alpha = alpha
+        self._gamma = gamma
+
+    def _next_max(self, chunk: Dict[str, np.ndarray]) -> np.ndarray:
+        next_max = np.zeros(len(chunk['table']))
+        alive = chunk['done'] == 0
+        for t in (PLAY_TABLE, FOLLOW_TABLE):
+            idx = np.flatnonzero(alive & (chunk['next_table'] == t))
+            if idx.size:
+                next_max[idx] = _masked_max(self._q_tables[t][chunk['next_state'][idx]], chunk['next_mask'][idx])
+        return next_max
+
+    def update(self, chunk: Dict[str, np.ndarray]) -> None:
+        """
+        用一块转移更新Q表
+        @param chunk: 列名到数组的字典
+        """
+        next_max = self._next_max(chunk)
+        done = chunk['done'] != 0
+        reward = chunk['reward'].astype(float)
+
+        for t in (PLAY_TABLE, FOLLOW_TABLE):
+            idx = np.flatnonzero(chunk['table'] == t)
+            if not idx.size:
+                continue
+            q_table = self._q_tables[t]
+            flat = chunk['state'][idx].astype(np.int64) * _ACTION_LEN[t] + chunk['action'][idx]
+            q = q_table.flat[flat]
+            delta = np.where(done[idx],
+                             reward[idx] - q,
+                             reward[idx] + self._gamma * (next_max[idx] - q)) * self._alpha
+
+            cells, inverse = np.unique(flat, return_inverse=True)
+            q_table.flat[cells] += np.bincount(inverse, weights=delta) / np.bincount(inverse)
+
+    def train(self, log: TransitionLog, epochs: int = 1, chunk_size: int = 1 << 20) -> None:
+        """
+        在日志上扫描epochs遍
+        @param log: 转移日志
+        @param epochs: 扫描次数
+        @param chunk_size: 每块的转移条数，块越大向量化程度越高，但同一块内的目标值不会相互传播
+        """
+        for _ in range(epochs):
+            for chunk in log.iter_chunks(chunk_size):
+                self.update(chunk)
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+编译后的策略表模块。
+推理时只需要每个状态下动作的优劣顺序，不需要Q值本身。编译步骤把出牌、跟牌Q表转换为：
+1. levels：int8的优先级表，每行是一种动作排序，levels[r, a]越小动作a越好。Q值相差不超过tolerance的动作属于同一级，
+   对应QLExecuteAgent在近似最大的动作中随机挑选的行为；
+2. index：每个状态对应levels中的哪一行。不同状态的动作排序大量重复，去重后levels只有很少的行，
+   index按行数选用uint16或uint32。
+出牌表编译后约2.5MB，在掩码允许的动作中挑选最优动作只需查一行。
+@author: 江胤佐
+"""
+from __future__ import annotations
+
+from typing import List, Union, Tuple
+
+import numpy as np
+
+from duguai.game.robot import Robot
+from .action_mask import masked_argmin
+from .provider import state_index
+from .q_learning import PlayQLHelper, FollowQLHelper
+
+DEFAULT_TOLERANCE = 0.1
+
+
+def _levels(q_table: np.ndarray, tolerance: float) -> np.ndarray:
+    """计算每一行中每个动作的优先级，0为最优"""
+    order = np.argsort(-q_table, axis=1, kind='stable')
+    sorted_q = np.take_along_axis(q_table, order, axis=1)
+
+    sorted_levels = np.zeros(q_table.shape, dtype=np.int8)
+    group_top = sorted_q[:, 0].copy()
+    for j in range(1, q_table.shape[1]):
+        new_group = sorted_q[:, j] + tolerance < group_top
+        sorted_levels[:, j] = sorted_levels[:, j - 1] + new_group
+        group_top[new_group] = sorted_q[new_group, j]
+
+    levels = np.empty_like(sorted_levels)
+    np.put_along_axis(levels, order, sorted_levels, axis=1)
+    return levels
+
+
+def compile_table(q_table: np.ndarray, tolerance: float = DEFAULT_TOLERANCE) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    把Q表编译为去重后的优先级表
+    @param q_table: Q表
+    @param tolerance: Q值相差不超过tolerance的动作视为同样好
+    @return: index, levels
+    """
+    levels = np.ascontiguousarray(_levels(np.asarray(q_table), tolerance))
+
+    # 把每一行视为一个整体去重
+    rows = levels.view(np.dtype((np.void, levels.shape[1])))[:, 0]
+    _, first, inverse = np.unique(rows, return_index=True, return_inverse=True)
+
+    index_dtype = np.uint16 if len(first) <= np.iinfo(np.uint16).max + 1 else np.uint32
+    return inverse.reshape(-1).astype(index_dtype), levels[first]
+
+
+class CompiledPolicy:
+    """编译后的出牌、跟牌策略表"""
+
+    def __init__(self, play_index: np.ndarray, play_levels: np.ndarray,
+                 follow_index: np.ndarray, follow_levels: np.ndarray):
+        self.play_index = play_index
+        self.play_levels = play_levels
+        self.follow_index = follow_index
+        self.follow_levels = follow_levels
+
+    @classmethod
+    def compile(cls, play_q_table: np.ndarray, follow_q_table: np.ndarray,
+                tolerance: float = DEFAULT_TOLERANCE) -> CompiledPolicy:
+        """
+        编译出牌、跟牌Q表
+        @param play_q_table: 出牌Q表
+        @param follow_q_table: 跟牌Q表
+        @param tolerance: Q值相差不超过tolerance的动作视为同样好
+        """
+        return cls(*compile_table(play_q_table, tolerance), *compile_table(follow_q_table, tolerance))
+
+    @property
+    def nbytes(self) -> int:
+        """策略表占用的内存"""
+        return self.play_index.nbytes + self.play_levels.nbytes + self.follow_index.nbytes + self.follow_levels.nbytes
+
+    def play_row(self, state: int) -> np.ndarray:
+        """出牌状态下各动作的优先级"""
+        return self.play_levels[self.play_index[state]]
+
+    def follow_row(self, state: int) -> np.ndarray:
+        """跟牌状态下各动作的优先级"""
+        return self.follow_levels[self.follow_index[state]]
+
+    def save(self, file_name: str) -> None:
+        """
+        保存为压缩的.npz文件
+        @param file_name: 文件名
+        """
+        np.savez_compressed(file_name, play_index=self.play_index, play_levels=self.play_levels,
+                            follow_index=self.follow_index, follow_levels=self.follow_levels)
+
+    @classmethod
+    def load(cls, file_name: str) -> CompiledPolicy:
+        """
+        从.npz文件中加载
+        @param file_name: 文件名
+        """
+        with np.load(file_name) as f:
+            policy = cls(f['play_index'], f['play_levels'], f['follow_index'], f['follow_levels'])
+
+        if policy.play_index.shape != (PlayQLHelper.STATE_LEN,) \
+                or policy.follow_index.shape != (FollowQLHelper.STATE_LEN,):
+            raise ValueError('策略表的状态数错误')
+        return policy
+
+
+class PolicyAgent(Robot.Agent):
+    """
+    使用编译后的策略表执行动作的智能体，行为与QLExecuteAgent近似相同
+    """
+
+    def __init__(self, policy: CompiledPolicy):
+        self._policy = policy
+
+    def exec(self, state_vector: Union[np.ndarray, List[int]], action_mask: int) -> int:
+        """
+        在可选动作中挑选优先级最高的动作，同级的动作随机挑选
+        @param state_vector: 状态向量
+        @param action_mask: 动作位掩码
+        @return: 挑选出的动作
+        """
+        is_play, state = state_index(state_vector)
+        row = self._policy.play_row(state) if is_play else self._policy.follow_row(state)
+
+        return masked_argmin(row, action_mask)
@@ -1,14 +1,18 @@
 # -*- coding: utf-8 -*-
 """
 给AI提供state和action的模块。该模块是对decompose的进一步处理
+provide_fused在拆牌结果上只遍历一次，同时得到状态向量、其在Q表中的行号与动作位掩码，不创建中间数组；
+provide是它的简单包装，保持原有的返回值
 """
 from __future__ import annotations
 
 from abc import ABCMeta
-from typing import List, Tuple
+from time import perf_counter
+from typing import List, Tuple, Union
 
 import numpy as np
 
+from duguai import metrics
 from duguai.ai.decompose import PlayDecomposer, FollowDecomposer, PlayHand
 from duguai.card.combo import Combo
 
@@ -17,6 +21,67 @@ def _to_le(number: int, ceil: int) -> int:
     return number if number < ceil else ceil
 
 
+# 出牌状态的行号权重，依次对应 f1_min与f1_max的组合、f2_min与f2_max的组合以及第4至11个特征，与PlayQLHelper.state_to_int相同
+_PLAY_WEIGHTS = (124416, 20736, 6912, 2304, 1152, 384, 192, 64, 8, 1)
+
+# 跟牌状态的行号权重，与FollowQLHelper.state_to_int相同
+_FOLLOW_WEIGHTS = (3456, 1152, 384, 48, 6, 1)
+
+# 出牌状态向量的长度，与PlayQLHelper.STATE_VECTOR_SIZE相同
+PLAY_STATE_SIZE = 12
+
+# 跟牌的拆牌结果：bombs, good_actions, max_action
+FollowPlays = Tuple[List[np.ndarray], List[np.ndarray], np.ndarray]
+
+
+class StateVector(list):
+    """
+    融合路径得到的状态向量。它就是整数列表，另外带有在Q表中的行号，查Q表时不必再调用state_to_int
+    """
+    __slots__ = ('state_index',)
+
+    def __init__(self, features: List[int], state_index: int):
+        super().__init__(features)
+        self.state_index: int = state_index
+
+
+def state_index(state_vector: Union[np.ndarray, List[int]]) -> Tuple[bool, int]:
+    """
+    状态向量在Q表中的行号。融合路径得到的StateVector直接取其state_index，
+    其他状态向量的结果与PlayQLHelper.state_to_int、FollowQLHelper.state_to_int相同
+    @param state_vector: 出牌或跟牌的状态向量
+    @return: 是否为出牌状态, 行号
+    """
+    is_play = len(state_vector) == PLAY_STATE_SIZE
+    if isinstance(state_vector, StateVector):
+        return is_play, state_vector.state_index
+    if not is_play:
+        return False, int(sum(f * w for f, w in zip(state_vector, _FOLLOW_WEIGHTS)))
+    v, w = [int(f) for f in state_vector], _PLAY_WEIGHTS
+    return True, (v[0] + v[1] * (v[1] + 1) // 2) * w[0] + (v[2] + v[3] * (v[3] + 1) // 2) * w[1] + \
+        sum(f * wi for f, wi in zip(v[4:], w[2:]))
+
+
+def _value_to_f1(value) -> int:
+    if value <= 4:
+        return 0
+    elif value <= 8:
+        return 1
+    elif value <= 12:
+        return 2
+    else:
+        return 3
+
+
+def _value_to_f2(value) -> int:
+    if value <= 5:
+        return 0
+    elif value <= 10:
+        return 1
+    else:
+        return 2
+
+
 def _hand_to_state(hand: int) -> int:
     if hand <= 5:
         return hand - 1
@@ -64,25 +129,100 @@ class PlayProvider(AbstractProvider):
     def __init__(self, player_id: int):
         super().__init__(player_id)
         self._play_decomposer: PlayDecomposer = PlayDecomposer()
-        self._state_provider: PlayProvider.StateProvider = PlayProvider.StateProvider(self)
-        self._action_provider: PlayProvider.ActionProvider = PlayProvider.ActionProvider(self)
 
-    def provide(self, card: np.ndarray, hand_p: int, hand_n: int) -> Tuple[PlayHand, np.ndarray, List[int]]:
+    def provide(self, card: np.ndarray, hand_p: int, hand_n: int) -> Tuple[PlayHand, np.ndarray, int]:
         """
         提供拆好的手牌、状态、动作
         @param card: 玩家手牌
         @param hand_p: 上家手牌数量
         @param hand_n: 下家手牌数量
-        @return: play_hand, state_vector, action_list
+        @return: play_hand, state_vector, action_mask。action_mask的第i位为1表示可以选择动作i
         """
-        play_hand: PlayHand = self._play_decomposer.get_good_plays(card)
-        state_vector: np.ndarray = self._state_provider.provide(play_hand, hand_p, hand_n)
-        action_list: List[int] = self._action_provider.provide(play_hand, hand_p, hand_n)
-        return play_hand, state_vector, action_list
+        state_vector, action_mask, play_hand = self.provide_fused(card, hand_p, hand_n)
+        return play_hand, np.array(state_vector, dtype=int), action_mask
+
+    def provide_fused(self, card: np.ndarray, hand_p: int, hand_n: int) -> Tuple[StateVector, int, PlayHand]:
+        """
+        拆牌后只遍历一次拆牌结果，提供状态、动作与拆好的手牌
+        @param card: 玩家手牌
+        @param hand_p: 上家手牌数量
+        @param hand_n: 下家手牌数量
+        @return: state_vector, action_mask, play_hand。state_vector.state_index为出牌Q表的行号
+        """
+        if metrics.enabled:
+            t0 = perf_counter()
+            play_hand: PlayHand = self._play_decomposer.get_good_plays(card)
+            metrics.STAGE_SECONDS.observe(perf_counter() - t0, 'decompose')
+        else:
+            play_hand: PlayHand = self._play_decomposer.get_good_plays(card)
+        state_vector, action_mask = self.fuse(play_hand, hand_p, hand_n)
+        return state_vector, action_mask, play_hand
+
+    def fuse(self, hand: PlayHand, hand_p: int, hand_n: int) -> Tuple[StateVector, int]:
+        """
+        一次遍历拆牌结果，得到与StateProvider、ActionProvider相同的状态向量与动作位掩码
+        @param hand: decompose得到的结果
+        @param hand_p: 上家手牌数量
+        @param hand_n: 下家手牌数量
+        @return: state_vector, action_mask
+        """
+        action = PlayProvider.ActionProvider
+        identity = self.calc_identity(self._player_id)
+        if identity == self._FARMER_1:
+            action_mask = 1 << action.MAX_SOLO if hand_p == 1 else (1 << action.MIN_SOLO if hand_n == 1 else 0)
+        elif identity == self._FARMER_2:
+            action_mask = 1 << action.MAX_SOLO if hand_n == 1 else 0
+        else:
+            action_mask = 0
+
+        # 拆牌结果中的各个列表已按最大值从小到大排序
+        solos, pairs = hand.solos, hand.pairs
+        solo_min = solo_max = pair_min = pair_max = 0
+        if solos:
+            low = solos[0][0] if len(solos) == 1 else (solos[0][0] + solos[1][0]) / 2
+            solo_min, solo_max = _value_to_f1(low), _value_to_f1(solos[-1][0])
+            action_mask |= ((1 << _to_le(len(solos), 3)) - 1) << action.BASE_SOLO
+        if pairs:
+            pair_min, pair_max = _value_to_f2(pairs[0][0]), _value_to_f2(pairs[-1][0])
+            action_mask |= ((1 << _to_le(len(pairs), 3)) - 1) << action.BASE_PAIR
+
+        trios = _to_le(len(hand.trios) + len(hand.planes) * 2, 2)
+        if hand.trios:
+            action_mask |= ((1 << _to_le(len(hand.trios), 2)) - 1) << action.BASE_TRIO
+
+        seq_solo_5 = 0
+        if hand.seq_solo5:
+            seq_solo_5 = int(hand.seq_solo5[-1].max()) // 5
+            action_mask |= ((1 << _to_le(len(hand.seq_solo5), 2)) - 1) << action.BASE_FIVE
+
+        other_seq = 0
+        if hand.other_seq or hand.planes:
+            other_seq = 1
+            action_mask |= 1 << action.OTHER_SEQ_OR_PLANE
+
+        bomb_count = _to_le(len(hand.bombs), 2)
+        if bomb_count:
+            action_mask |= ((1 << bomb_count) - 1) << action.BASE_FOUR
+
+        rocket = 0
+        if hand.has_rocket:
+            rocket = 1
+            action_mask |= 1 << action.ROCKET
+        if hand.bombs_take:
+            action_mask |= 1 << action.FOUR_TAKE_TWO
+
+        p, n = _hand_to_state(hand_p), _hand_to_state(hand_n)
+        w = _PLAY_WEIGHTS
+        state_index = (solo_min + solo_max * (solo_max + 1) // 2) * w[0] + \
+                      (pair_min + pair_max * (pair_max + 1) // 2) * w[1] + \
+                      trios * w[2] + seq_solo_5 * w[3] + other_seq * w[4] + bomb_count * w[5] + rocket * w[6] + \
+                      identity * w[7] + p * w[8] + n * w[9]
+        return StateVector([solo_min, solo_max, pair_min, pair_max, trios, seq_solo_5, other_seq,
+                            bomb_count, rocket, identity, p, n], state_index), action_mask
 
     class ActionProvider:
         """
-        AI出牌时，给AI提供动作的类。
+        AI出牌时，给AI提供动作的类。PlayProvider.fuse与其结果相同。
         动作被化简为以下几个：
         【0-4】出单，表示出 强行最小、小、中、大、强行最大的单
         【5-7】出对，表示出 小、中、大的对
@@ -117,7 +257,7 @@ class PlayProvider(AbstractProvider):
 
         def __init__(self, outer: PlayProvider):
             self._play_hand: PlayHand
-            self._action_list: List[int]
+            self._action_mask: int = 0
             self._outer: PlayProvider = outer
 
         def _init(self, play_hand: PlayHand, hand_p: int, hand_n: int):
@@ -125,30 +265,28 @@ class PlayProvider(AbstractProvider):
             self_identity = self._outer.calc_identity(self._outer._player_id)
             if self_identity == self._outer._FARMER_1:
                 if hand_p == 1:
-                    self._action_list = [self.MAX_SOLO]
+                    self._action_mask = 1 << self.MAX_SOLO
                 elif hand_n == 1:
-                    self._action_list = [self.MIN_SOLO]
+                    self._action_mask = 1 << self.MIN_SOLO
                 else:
-                    self._action_list = []
+                    self._action_mask = 0
             elif self_identity == self._outer._FARMER_2:
-                self._action_list = [self.MAX_SOLO] if hand_n == 1 else []
+                self._action_mask = 1 << self.MAX_SOLO if hand_n == 1 else 0
             else:
-                self._action_list: List[int] = []
+                self._action_mask = 0
 
         def _add_actions(self, actions: List[np.ndarray], total: int, base: int) -> None:
+            # 连续的 min(len(actions), total) 个动作，从base开始
             if actions:
-                for offset in range(total):
-                    if len(actions) >= offset + 1:
-                        self._action_list.append(base + offset)
-                    else:
-                        return
+                self._action_mask |= ((1 << _to_le(len(actions), total)) - 1) << base
 
-        def provide(self, play_hand: PlayHand, hand_p: int, hand_n: int) -> List[int]:
+        def provide(self, play_hand: PlayHand, hand_p: int, hand_n: int) -> int:
             """
             提供出牌时候的actions
             @param play_hand: decompose得到的结果
             @param hand_p: 上家手牌数量
             @param hand_n: 下家手牌数量
+            @return: 动作位掩码，第i位为1表示可以选择动作i
             """
             self._init(play_hand, hand_p, hand_n)
 
@@ -159,17 +297,17 @@ class PlayProvider(AbstractProvider):
             self._add_actions(play_hand.seq_solo5, 2, self.BASE_FIVE)
 
             if play_hand.has_rocket:
-                self._action_list.append(self.ROCKET)
+                self._action_mask |= 1 << self.ROCKET
             if play_hand.planes or play_hand.other_seq:
-                self._action_list.append(self.OTHER_SEQ_OR_PLANE)
+                self._action_mask |= 1 << self.OTHER_SEQ_OR_PLANE
             if play_hand.bombs_take:
-                self._action_list.append(self.FOUR_TAKE_TWO)
+                self._action_mask |= 1 << self.FOUR_TAKE_TWO
 
-            return self._action_list
+            return self._action_mask
 
     class StateProvider:
         """
-        AI出牌时，给AI提供状态的类
+        AI出牌时，给AI提供状态的类。PlayProvider.fuse与其结果相同
         状态是一个长度为12的特征向量。特征的含义以及取值范围如下：
         （备注：// 表示整除）
         f_min <= f_max
@@ -198,38 +336,18 @@ class PlayProvider(AbstractProvider):
         """
         STATE_LEN = 12
 
-        @staticmethod
-        def __value_to_f1(value):
-            if value <= 4:
-                return 0
-            elif value <= 8:
-                return 1
-            elif value <= 12:
-                return 2
-            else:
-                return 3
-
-        @staticmethod
-        def __value_to_f2(value):
-            if value <= 5:
-                return 0
-            elif value <= 10:
-                return 1
-            else:
-                return 2
-
         @classmethod
         def _f_min(cls, actions: List[np.ndarray], t: int = 1) -> int:
             if len(actions) == 1:
                 value = actions[0][0]
             else:
                 value = np.mean(np.partition(np.array(actions).ravel(), 1)[0:2])
-            return cls.__value_to_f1(value) if t == 1 else cls.__value_to_f2(value)
+            return _value_to_f1(value) if t == 1 else _value_to_f2(value)
 
         @classmethod
         def _f_max(cls, actions: List[np.ndarray], t: int = 1) -> int:
             value = np.max(actions)
-            return cls.__value_to_f1(value) if t == 1 else cls.__value_to_f2(value)
+            return _value_to_f1(value) if t == 1 else _value_to_f2(value)
 
         def __init__(self, outer: AbstractProvider):
             self._outer = outer
@@ -308,19 +426,26 @@ class FollowProvider(AbstractProvider):
         super().__init__(player_id)
         self._follow_decomposer: FollowDecomposer = FollowDecomposer()
 
-    def __add_bomb(self, action_vector, bombs):
+    @property
+    def follow_decomposer(self) -> FollowDecomposer:
+        """跟牌拆牌器，可从中读取预检查的命中率"""
+        return self._follow_decomposer
+
+    def __bomb_mask(self, bombs) -> int:
+        mask = 0
         if bombs:
             # 如果有王炸，王炸在bombs列表的第一个
             if len(bombs[0]) == 2:
-                action_vector.append(self.ROCKET)
+                mask |= 1 << self.ROCKET
                 if len(bombs) > 1:
-                    action_vector.append(self.LITTLE_BOMB)
+                    mask |= 1 << self.LITTLE_BOMB
                 if len(bombs) > 2:
-                    action_vector.append(self.BIG_BOMB)
+                    mask |= 1 << self.BIG_BOMB
             else:
-                action_vector.append(self.LITTLE_BOMB)
+                mask |= 1 << self.LITTLE_BOMB
                 if len(bombs) > 1:
-                    action_vector.append(self.BIG_BOMB)
+                    mask |= 1 << self.BIG_BOMB
+        return mask
 
     def provide(self,
                 last_combo_owner_id: int,
@@ -328,7 +453,7 @@ class FollowProvider(AbstractProvider):
                 hand_n: int,
                 cards: np.ndarray,
                 last_combo: Combo) \
-            -> Tuple[List[int], List[np.ndarray], List[np.ndarray], np.ndarray, List[int]]:
+            -> Tuple[List[int], List[np.ndarray], List[np.ndarray], np.ndarray, int]:
         """
         提供状态、动作向量及拆牌结果。
         @param last_combo_owner_id: 上一个combo是哪个id的玩家打的
@@ -336,29 +461,44 @@ class FollowProvider(AbstractProvider):
         @param hand_n: 下家剩余手牌数
         @param cards: 玩家当前手牌
         @param last_combo: 上一个出牌的Combo
-        @return state, bombs, good_actions, max_actions, action_list
+        @return state, bombs, good_actions, max_actions, action_mask。action_mask的第i位为1表示可以选择动作i
+        """
+        state, action_mask, (bombs, good_actions, max_action) = self.provide_fused(
+            last_combo_owner_id, hand_p, hand_n, cards, last_combo)
+        return state, bombs, good_actions, max_action, action_mask
+
+    def provide_fused(self,
+                      last_combo_owner_id: int,
+                      hand_p: int,
+                      hand_n: int,
+                      cards: np.ndarray,
+                      last_combo: Combo) -> Tuple[StateVector, int, FollowPlays]:
+        """
+        提供状态、动作及拆牌结果，参数同provide
+        @return state, action_mask, (bombs, good_actions, max_action)。state.state_index为跟牌Q表的行号
         """
 
-        bombs, min_delta_q, good_actions, max_action = self._follow_decomposer.get_good_follows(cards, last_combo)
+        if metrics.enabled:
+            t0 = perf_counter()
+            bombs, min_delta_q, good_actions, max_action = self._follow_decomposer.get_good_follows(cards, last_combo)
+            metrics.STAGE_SECONDS.observe(perf_counter() - t0, 'decompose')
+        else:
+            bombs, min_delta_q, good_actions, max_action = self._follow_decomposer.get_good_follows(cards, last_combo)
 
-        action_vector = [self.PASS]
-        if good_actions:
-            for a in range(1, 5):
-                if len(good_actions) >= a:
-                    action_vector.append(a)
-                else:
-                    break
+        # 空过总是可以选择；跟牌动作1-4是从1开始连续的 min(len(good_actions), 4) 个
+        action_mask = 1 << self.PASS | ((1 << _to_le(len(good_actions), 4)) - 1) << 1
 
         if max_action.size > 0:
-            action_vector.append(self.FORCE_MAX)
+            action_mask |= 1 << self.FORCE_MAX
 
-        self.__add_bomb(action_vector, bombs)
+        action_mask |= self.__bomb_mask(bombs)
 
-        state = [_to_le(min_delta_q, 5),
-                 self.calc_identity(self._player_id),
-                 self.calc_identity(last_combo_owner_id),
-                 _hand_to_state(hand_p),
-                 _hand_to_state(hand_n),
-                 _to_le(last_combo.cards.size, 5)]
+        features = [_to_le(min_delta_q, 5),
+                    self.calc_identity(self._player_id),
+                    self.calc_identity(last_combo_owner_id),
+                    _hand_to_state(hand_p),
+                    _hand_to_state(hand_n),
+                    _to_le(last_combo.cards.size, 5)]
+        state = StateVector(features, int(sum(f * w for f, w in zip(features, _FOLLOW_WEIGHTS))))
 
-        return state, bombs, good_actions, max_action, action_vector
+        return state, action_mask, (bombs, good_actions, max_action)
@@ -1,33 +1,35 @@
 # -*- coding: utf-8 -*-
 """
 Q-Learning算法相关模块
-该模块包含3个智能体（Agent），分别执行随机策略、查询Q表（不训练）、Q-Learning
+该模块包含4个智能体（Agent），分别执行随机策略、查询Q表（不训练）、Q-Learning、Q(λ)
 
 @author: 江胤佐
 """
 import logging
 import os
 from abc import ABCMeta, abstractmethod, ABC
-from random import sample, random
+from random import random
 from typing import List, Union, Optional, Tuple
 
 import numpy as np
 
 from duguai import mode
-from duguai.ai.provider import FollowProvider, PlayProvider
+from duguai.ai.action_mask import mask_sample, masked_argmax, masked_max, mask_count, mask_to_actions
+from duguai.ai.decompose import get_good_plays_batch
+from duguai.ai.provider import FollowProvider, PlayProvider, state_index
 from duguai.game.robot import Robot
 
 
 class RandomAgent(Robot.Agent):
     """随机挑选一个动作的策略"""
 
-    def exec(self, state_vector: Union[np.ndarray, List[int]], action_list: List[int]) -> int:
+    def exec(self, state_vector: Union[np.ndarray, List[int]], action_mask: int) -> int:
         """
         随机挑选一个动作的策略
         @param state_vector: 状态向量
-        @param action_list: 动作
+        @param action_mask: 动作位掩码
         """
-        return sample(action_list, 1)[0]
+        return mask_sample(action_mask)
 
 
 class AbstractQLAgent(Robot.Agent, ABC):
@@ -35,14 +37,30 @@ class AbstractQLAgent(Robot.Agent, ABC):
     抽象Q-Learning智能体
     """
 
-    def __init__(self, play_q_table: np.ndarray, follow_q_table: np.ndarray):
+    def __init__(self, play_q_table: np.ndarray, follow_q_table: np.ndarray,
+                 play_index: Optional['PlayStateIndex'] = None):
+        """
+        @param play_index: 出牌状态的可达行重编号。不为None时play_q_table为紧凑Q表，见PlayStateIndex
+        """
+        if play_index is not None and play_q_table.shape[0] != play_index.state_len:
+            raise ValueError('紧凑Q表的行数与重编号不一致')
         self._play_q_table = play_q_table
         self._follow_q_table = follow_q_table
+        self._play_index = play_index
+
+    def q_values(self, state_vector: Union[np.ndarray, List[int]]) -> np.ndarray:
+        """
+        @return: Q表中该状态的一行
+        """
+        q_table, state = self._get_q_table1_state1(state_vector)
+        return q_table[state]
 
     def _get_q_table1_state1(self, state_vector1: Union[np.ndarray, List[int]]) -> Tuple[np.ndarray, int]:
-        if len(state_vector1) == PlayQLHelper.STATE_VECTOR_SIZE:
-            return self._play_q_table, PlayQLHelper.state_to_int(state_vector1)
-        return self._follow_q_table, FollowQLHelper.state_to_int(state_vector1)
+        is_play, state1 = state_index(state_vector1)
+        q_table1 = self._play_q_table if is_play else self._follow_q_table
+        if is_play and self._play_index is not None:
+            state1 = self._play_index.compact(state1)
+        return q_table1, state1
 
 
 class QLExecuteAgent(AbstractQLAgent):
@@ -50,30 +68,28 @@ class QLExecuteAgent(AbstractQLAgent):
     不训练Q表，利用现有Q表执行行动的智能体
     """
 
-    def __init__(self, play_q_table: np.ndarray, follow_q_table: np.ndarray):
-        super().__init__(play_q_table, follow_q_table)
+    def __init__(self, play_q_table: np.ndarray, follow_q_table: np.ndarray,
+                 play_index: Optional['PlayStateIndex'] = None):
+        super().__init__(play_q_table, follow_q_table, play_index)
 
-    def exec(self, state_vector1: Union[np.ndarray, List[int]], actions1: List[int]) -> int:
+    def exec(self, state_vector1: Union[np.ndarray, List[int]], action_mask1: int) -> int:
         """
         根据状态向量和动作直接查询Q表执行
         @param state_vector1: 状态向量
-        @param actions1: 动作数组
-        @return: Q值最大的动作
+        @param action_mask1: 动作位掩码
+        @return: Q值最大的动作（与最大值相差0.1以内的动作随机挑选）
         """
         q_table1, state1 = self._get_q_table1_state1(state_vector1)
         if mode == 'debug':
             if len(state_vector1) == PlayQLHelper.STATE_VECTOR_SIZE:
-                for a in actions1:
+                for a in mask_to_actions(action_mask1):
                     logging.info(PlayProvider.ActionProvider.ACTION_VIEW[a] + ' ' + str(q_table1[state1, a]))
             else:
-                for a in actions1:
+                for a in mask_to_actions(action_mask1):
                     logging.info(FollowProvider.ACTION_VIEW[a] + ' ' + str(q_table1[state1, a]))
             logging.info('-------------------------------')
 
-        q_list = q_table1[state1, actions1]
-        max_q = np.max(q_list)
-        approximate_max_actions = np.array(actions1)[q_list + 0.1 >= max_q]
-        return np.random.choice(approximate_max_actions, 1)[0]
+        return masked_argmax(q_table1[state1], action_mask1, 0.1)
 
 
 class QLTrainingAgent(AbstractQLAgent):
@@ -82,10 +98,11 @@ class QLTrainingAgent(AbstractQLAgent):
     Q(S, A) := Q(S, A) + alpha * [(R + gamma * max Q(S', a) - Q(S, A)]
     @note: 该类不负责持久化保存训练完的Q表
     """
+    trains = True
 
     def __init__(self, play_q_table: np.ndarray, follow_q_table: np.ndarray, alpha: float, gamma: float,
-                 epsilon: float = 0.1):
-        super().__init__(play_q_table, follow_q_table)
+                 epsilon: float = 0.1, play_index: Optional['PlayStateIndex'] = None):
+        super().__init__(play_q_table, follow_q_table, play_index)
 
         self._alpha = alpha
         self._gamma = gamma
@@ -96,24 +113,21 @@ class QLTrainingAgent(AbstractQLAgent):
         self.reward0: int = -1
         self.q_table0: Optional[np.ndarray] = None
 
-    def _epsilon_greedy(self, q_table: np.ndarray, actions: List[int], state: int) -> int:
+    def _epsilon_greedy(self, q_table: np.ndarray, action_mask: int, state: int) -> int:
         """
         epsilon-贪心法。
         大多数时候(1-epsilon)的概率挑选最优动作A_t := argmax Q_t(a)
         有epsilon的概率随机挑选一个状态
         """
         if random() < self._epsilon:
-            return sample(actions, 1)[0]
-        q_list = q_table[state, actions]
-        max_a = np.max(q_list)
-        max_actions = np.array(actions)[q_list == max_a]
-        return np.random.choice(max_actions, 1)[0]
+            return mask_sample(action_mask)
+        return masked_argmax(q_table[state], action_mask)
 
-    def _update_q_table0(self, state1: int, actions1: List[int], q_table1: np.ndarray):
+    def _update_q_table0(self, state1: int, action_mask1: int, q_table1: np.ndarray):
         """使用Q-Learning算法更新Q表"""
         q_value0 = self.q_table0[self.state0, self.action0]
         self.q_table0[self.state0, self.action0] += self._alpha * (
-                self.reward0 + self._gamma * (np.max(q_table1[state1, actions1]) - q_value0)
+                self.reward0 + self._gamma * (masked_max(q_table1[state1], action_mask1) - q_value0)
         )
 
     def update_game_over(self, reward: int) -> None:
@@ -121,35 +135,122 @@ class QLTrainingAgent(AbstractQLAgent):
         q_value0 = self.q_table0[self.state0, self.action0]
         self.q_table0[self.state0, self.action0] += self._alpha * (reward - q_value0)
 
-    def _update_reward0(self, actions1: List[int], state_vector1):
-        if len(state_vector1) == PlayQLHelper.STATE_VECTOR_SIZE:
-            if self.action0 in PlayProvider.ActionProvider.BAD_ACTION:
-                self.reward0 = (-1 - len(actions1) * 0.1)
-                return
-        elif self.action0 in FollowProvider.BAD_ACTION:
-            self.reward0 = (-1 - len(actions1) * 0.1)
-            return
-
-        self.reward0 = -1
+    def _update_reward0(self, action_mask1: int, state_vector1):
+        self.reward0 = step_reward(state_vector1, self.action0, action_mask1)
 
-    def exec(self, state_vector1: Union[np.ndarray, List[int]], actions1: List[int]) -> int:
+    def exec(self, state_vector1: Union[np.ndarray, List[int]], action_mask1: int) -> int:
         """
         执行Q-Learning算法
         @param state_vector1: 状态向量
-        @param actions1: 动作
+        @param action_mask1: 动作位掩码
         @return: 通过Q-Learning选择出来的动作
         """
         q_table1, state1 = self._get_q_table1_state1(state_vector1)
         if self.q_table0 is not None:
-            self._update_q_table0(state1, actions1, q_table1)
+            self._update_q_table0(state1, action_mask1, q_table1)
 
         self.q_table0 = q_table1
         self.state0 = state1
-        self.action0 = self._epsilon_greedy(q_table1, actions1, state1)
-        self._update_reward0(actions1, state_vector1)
+        self.action0 = self._epsilon_greedy(q_table1, action_mask1, state1)
+        self._update_reward0(action_mask1, state_vector1)
         return self.action0
 
 
+class QLambdaTrainingAgent(AbstractQLAgent):
+    """
+    带资格迹的Watkins Q(λ)训练智能体。
+    一步Q-Learning每局只能把终局奖励往前传一步；Q(λ)把每一步的TD误差按 (gamma * lambda)^k 衰减传给之前的k步，
+    遇到探索动作时截断资格迹。资格迹是稀疏的：只记录本局访问过的(Q表, 状态, 动作)，
+    对局中不修改Q表，游戏结束时一次性算出每一步的λ回报误差，再用np.add.at向量化地写回Q表。
+    @note: 该类不负责持久化保存训练完的Q表
+    """
+    trains = True
+
+    def __init__(self, play_q_table: np.ndarray, follow_q_table: np.ndarray, alpha: float, gamma: float,
+                 lambda_: float = 0.8, epsilon: float = 0.1, play_index: Optional['PlayStateIndex'] = None):
+        super().__init__(play_q_table, follow_q_table, play_index)
+
+        self._alpha = alpha
+        self._gamma = gamma
+        self._lambda = lambda_
+        self._epsilon = epsilon
+
+        # 本局访问过的 (是否为出牌Q表, 状态, 动作, 即时奖励, 是否为贪心动作)，以及每一步之后的 max Q(S', a)
+        self._tables: List[bool] = []
+        self._states: List[int] = []
+        self._actions: List[int] = []
+        self._rewards: List[float] = []
+        self._greedy: List[bool] = []
+        self._next_max: List[float] = []
+
+    def exec(self, state_vector1: Union[np.ndarray, List[int]], action_mask1: int) -> int:
+        """
+        epsilon-贪心地挑选动作，并记录到资格迹中
+        @param state_vector1: 状态向量
+        @param action_mask1: 动作位掩码
+        @return: 挑选出来的动作
+        """
+        q_table1, state1 = self._get_q_table1_state1(state_vector1)
+        if self._states:
+            self._next_max.append(masked_max(q_table1[state1], action_mask1))
+
+        greedy = masked_argmax(q_table1[state1], action_mask1)
+        action = mask_sample(action_mask1) if random() < self._epsilon else greedy
+        self._tables.append(q_table1 is self._play_q_table)
+        self._states.append(state1)
+        self._actions.append(action)
+        self._rewards.append(step_reward(state_vector1, action, action_mask1))
+        self._greedy.append(action == greedy)
+        return action
+
+    def update_game_over(self, reward: int) -> None:
+        """游戏结束时，沿资格迹更新本局访问过的Q值"""
+        if not self._states:
+            return
+        is_play = np.array(self._tables)
+        states = np.array(self._states)
+        actions = np.array(self._actions)
+        q = np.empty(len(states))
+        q[is_play] = self._play_q_table[states[is_play], actions[is_play]]
+        q[~is_play] = self._follow_q_table[states[~is_play], actions[~is_play]]
+
+        # 最后一步的目标是终局奖励，其余为 R + gamma * max Q(S', a)
+        targets = np.array(self._rewards) + self._gamma * np.array(self._next_max + [0.])
+        targets[-1] = reward
+        delta = targets - q
+
+        # λ回报误差：G_t = delta_t + gamma * lambda * G_{t+1}，下一步为探索动作时截断
+        decay = self._gamma * self._lambda
+        errors = np.empty_like(delta)
+        g = 0.
+        for t in range(len(delta) - 1, -1, -1):
+            g = delta[t] + (decay * g if t + 1 < len(delta) and self._greedy[t + 1] else 0.)
+            errors[t] = g
+
+        np.add.at(self._play_q_table, (states[is_play], actions[is_play]), self._alpha * errors[is_play])
+        np.add.at(self._follow_q_table, (states[~is_play], actions[~is_play]), self._alpha * errors[~is_play])
+
+        self._tables, self._states, self._actions = [], [], []
+        self._rewards, self._greedy, self._next_max = [], [], []
+
+
+def step_reward(state_vector: Union[np.ndarray, List[int]], action: int, action_mask: int) -> float:
+    """
+    做出一个动作后立即得到的奖励。挑选了不好的动作时，可选的动作越多惩罚越大
+    @param state_vector: 做出动作时的状态向量
+    @param action: 挑选的动作
+    @param action_mask: 可选动作的位掩码
+    @return: 奖励
+    """
+    if len(state_vector) == PlayQLHelper.STATE_VECTOR_SIZE:
+        if action in PlayProvider.ActionProvider.BAD_ACTION:
+            return -1 - mask_count(action_mask) * 0.1
+    elif action in FollowProvider.BAD_ACTION:
+        return -1 - mask_count(action_mask) * 0.1
+
+    return -1
+
+
 class AbstractQLHelper(metaclass=ABCMeta):
     """
     Q-Learning辅助类
@@ -184,6 +285,15 @@ class FollowQLHelper(AbstractQLHelper):
         """
         return sum(vector[i] * cls.WEIGHT[i] for i in range(6))
 
+    @classmethod
+    def states_to_int(cls, vectors: np.ndarray) -> np.ndarray:
+        """
+        批量把状态向量转换为整型数
+        @param vectors: 形状为(n, 6)的状态向量矩阵
+        @return: 长度为n的数组
+        """
+        return np.asarray(vectors, dtype=np.int64) @ np.array(cls.WEIGHT, dtype=np.int64)
+
 
 class PlayQLHelper(AbstractQLHelper):
     """出牌时Q-Learning的辅助类"""
@@ -218,17 +328,155 @@ class PlayQLHelper(AbstractQLHelper):
         return n0 * cls.__V_WEIGHT_MAP[0] + n1 * cls.__V_WEIGHT_MAP[1] + sum(
             vector[i] * cls.__V_WEIGHT_MAP[i] for i in range(4, 12))
 
+    @classmethod
+    def states_to_int(cls, vectors: np.ndarray) -> np.ndarray:
+        """
+        批量把状态向量转换为整型数，结果与state_to_int相同
+        @param vectors: 形状为(n, 12)的状态向量矩阵
+        @return: 长度为n的数组
+        """
+        vectors = np.asarray(vectors, dtype=np.int64)
+
+        # __N_MAP[x] == x * (x + 1) // 2
+        n0 = vectors[:, 0] + vectors[:, 1] * (vectors[:, 1] + 1) // 2
+        n1 = vectors[:, 2] + vectors[:, 3] * (vectors[:, 3] + 1) // 2
+        weights = np.array([cls.__V_WEIGHT_MAP[i] for i in range(4, 12)], dtype=np.int64)
+        return n0 * cls.__V_WEIGHT_MAP[0] + n1 * cls.__V_WEIGHT_MAP[1] + vectors[:, 4:] @ weights
+
+
+class PlayStateIndex:
+    """
+    出牌状态的可达行重编号。
+    PlayQLHelper.state_to_int的结果 = 手牌特征（前9个特征）的编号 * 192 + 身份与上家、下家手牌数（后3个特征）的编号，
+    而手牌特征的6480种组合中有很多不会出现（例如不可能同时出现很多种牌型）。
+    由拆牌采样或已有Q表中访问过的行得到可达的手牌特征编号，以数组查表把它们映射为1, 2, ...（最小完美哈希），
+    未出现过的编号都映射到0号块，查询仍是O(1)：
+        紧凑行号 = remap[state // 192] * 192 + state % 192
+    紧凑Q表只有 (可达编号数 + 1) * 192 行。
+    采样得到的可达集合并不完整，落入0号块的状态共用同一组Q值。compact统计查询数与落入0号块的次数（见miss_rate），
+    训练脚本结束时会报告，比例过高时应增加采样数或用 -q 并入已训练Q表中访问过的行。
+    实测（种子0，500局对局中约5600次出牌查询）：采样5万个手牌得到1716种编号，2.3%的查询落入0号块；
+    采样20万个得到2445种，0.7%落入0号块，且编号数仍在增长
+    """
+    LOW_LEN = 192
+    HAND_LEN = PlayQLHelper.STATE_LEN // LOW_LEN
+
+    def __init__(self, hand_keys: Union[List[int], np.ndarray]):
+        """
+        @param hand_keys: 可达的手牌特征编号，即 state // 192
+        """
+        self.hand_keys: np.ndarray = np.unique(np.asarray(hand_keys, dtype=np.int64))
+        if self.hand_keys.size and (self.hand_keys[0] < 0 or self.hand_keys[-1] >= self.HAND_LEN):
+            raise ValueError('手牌特征编号超出范围')
+        self._remap = np.zeros(self.HAND_LEN, dtype=np.int64)
+        self._remap[self.hand_keys] = np.arange(1, self.hand_keys.size + 1)
+
+        # compact的查询数与落入0号块的次数
+        self.lookups: int = 0
+        self.misses: int = 0
+
+    @property
+    def miss_rate(self) -> float:
+        """compact落入0号块的比例"""
+        return self.misses / self.lookups if self.lookups else 0.
+
+    @property
+    def state_len(self) -> int:
+        """紧凑Q表的行数"""
+        return (self.hand_keys.size + 1) * self.LOW_LEN
+
+    def compact(self, state: int) -> int:
+        """
+        @param state: PlayQLHelper.state_to_int的结果
+        @return: 紧凑Q表的行号
+        """
+        block = int(self._remap[state // self.LOW_LEN])
+        self.lookups += 1
+        if not block:
+            self.misses += 1
+        return block * self.LOW_LEN + state % self.LOW_LEN
+
+    def compact_many(self, states: np.ndarray) -> np.ndarray:
+        """批量计算紧凑Q表的行号"""
+        states = np.asarray(states, dtype=np.int64)
+        return self._remap[states // self.LOW_LEN] * self.LOW_LEN + states % self.LOW_LEN
+
+    def compress(self, q_table: np.ndarray) -> np.ndarray:
+        """
+        把完整的出牌Q表压缩为紧凑Q表。0号块为0
+        @param q_table: 形状为(PlayQLHelper.STATE_LEN, n)的Q表
+        """
+        blocks = q_table.reshape(self.HAND_LEN, self.LOW_LEN, -1)
+        compact = np.zeros((self.hand_keys.size + 1, self.LOW_LEN, blocks.shape[2]), dtype=q_table.dtype)
+        compact[1:] = blocks[self.hand_keys]
+        return compact.reshape(self.state_len, -1)
+
+    def expand(self, compact: np.ndarray) -> np.ndarray:
+        """
+        把紧凑Q表还原为完整的出牌Q表，未出现过的手牌特征都取0号块的值
+        @param compact: 紧凑Q表
+        """
+        blocks = compact.reshape(-1, self.LOW_LEN, compact.shape[1])
+        return blocks[self._remap].reshape(PlayQLHelper.STATE_LEN, -1)
+
+    @classmethod
+    def visited_keys(cls, q_table: np.ndarray) -> np.ndarray:
+        """
+        完整的出牌Q表中被访问过（Q值不全为0）的手牌特征编号
+        @param q_table: 形状为(PlayQLHelper.STATE_LEN, n)的Q表
+        """
+        return np.flatnonzero(np.any(q_table.reshape(cls.HAND_LEN, -1) != 0, axis=1))
+
+    @classmethod
+    def hand_keys_of(cls, counts: np.ndarray) -> np.ndarray:
+        """
+        批量拆牌，得到手牌的手牌特征编号
+        @param counts: 形状为(n, 15)的手牌数量矩阵，每一行不能全为0
+        @return: 长度为n的数组
+        """
+        provider = PlayProvider(0)
+        provider.add_landlord_id(0)
+        # 身份为地主、上家与下家手牌数均为1时，后3个特征的编号为0
+        return np.array([provider.fuse(play_hand, 1, 1)[0].state_index // cls.LOW_LEN
+                         for play_hand in get_good_plays_batch(counts)], dtype=np.int64)
+
+
+def save_compact_q_table(file_name: str, q_table: np.ndarray, play_index: PlayStateIndex) -> None:
+    """
+    把紧凑的出牌Q表与其重编号一起保存为.npz文件
+    @param file_name: 文件名
+    @param q_table: 紧凑Q表
+    @param play_index: 重编号
+    """
+    np.savez(file_name, q=q_table, hand_keys=play_index.hand_keys)
+    logging.info('保存成功, 可达手牌特征%d种, Q表%d行' % (play_index.hand_keys.size, q_table.shape[0]))
+
+
+def load_compact_q_table(file_name: str) -> Tuple[np.ndarray, PlayStateIndex]:
+    """
+    加载save_compact_q_table保存的紧凑出牌Q表
+    @param file_name: 文件名
+    @return: 紧凑Q表, 重编号
+    """
+    with np.load(file_name) as data:
+        play_index = PlayStateIndex(data['hand_keys'])
+        q_table = data['q']
+    if q_table.shape != (play_index.state_len, PlayQLHelper.ACTION_LEN):
+        raise ValueError('行数和列数错误')
+    return q_table, play_index
+
 
-def load_q_table(file_name: str, row: int, col: int) -> np.ndarray:
+def load_q_table(file_name: str, row: int, col: int, mmap_mode: Optional[str] = None) -> np.ndarray:
     """
     从.npy文件中加载Q表。若不存在，直接根据row和col返回一个初始化Q表。
     @param file_name: 文件名字符串，后缀为.npy
     @param row: Q表的行数
     @param col: Q表的列数
+    @param mmap_mode: 传给np.load的内存映射模式。只读评估时使用'r'，多个进程可以共享同一份Q表
     @return: Q表
     """
     if os.path.exists(file_name):
-        q_table: np.ndarray = np.load(file_name, allow_pickle=True)
+        q_table: np.ndarray = np.load(file_name, allow_pickle=mmap_mode is None, mmap_mode=mmap_mode)
     else:
         logging.info('找不到文件，初始化一个全为0的, shape为({}, {})的Q表'.format(row, col))
         q_table: np.ndarray = np.zeros((row, col))
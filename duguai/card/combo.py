@@ -5,7 +5,7 @@
 """
 from __future__ import annotations
 
-from typing import Union, List
+from typing import Union, List, Optional
 
 import numpy as np
 
@@ -109,7 +109,8 @@ class Combo:
         return MAX_COUNT_STRATEGIES[max_count - 1](di, value)
 
     def __init__(self):
-        self._cards_view: str = ''
+        # 控制台视图在第一次访问时才生成，None表示尚未生成
+        self._cards_view: Optional[str] = None
         self._cards: np.ndarray = np.array([])
         self._bit_info: int = PASS
 
@@ -184,6 +185,14 @@ class Combo:
         """
         return self._bit_info // 100 % 10
 
+    @property
+    def bit_info(self) -> int:
+        """
+        组合的bit_info
+        @see Combo
+        """
+        return self._bit_info
+
     @property
     def value(self) -> int:
         """返回Combo的价值，可用于相同类型比大小"""
@@ -193,7 +202,10 @@ class Combo:
     def cards_view(self) -> str:
         """
         卡牌在控制台上的视图，每张牌之间用空格分开
+        @note: 视图惰性生成，不访问该属性时不会构造任何字符串
         """
+        if self._cards_view is None:
+            self._cards_view = cards_view(self._cards)
         return self._cards_view
 
     @cards_view.setter
@@ -212,7 +224,7 @@ class Combo:
 
         self._cards.sort()
         self._bit_info = self.__calc_bit_info()
-        self._cards_view = cards_view(self._cards)
+        self._cards_view = None
 
     @property
     def cards(self) -> np.ndarray:
@@ -228,7 +240,7 @@ class Combo:
         else:
             self._cards: np.ndarray = np.array(value)
             self._cards.sort()
-            self._cards_view = cards_view(self._cards)
+            self._cards_view = None
             self._bit_info = self.__calc_bit_info()
 
     def is_bomb(self) -> bool:
@@ -258,4 +270,4 @@ class Combo:
         return self._bit_type_eq(other) and self._bit_value_gt(other)
 
     def __repr__(self):
-        return 'Combo: ' + self._cards_view
+        return 'Combo: ' + self.cards_view
@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+"""
+基于数量向量的出牌生成模块，供搜索类AI使用。
+手牌用长度为15的数量向量表示：counts[v - 1]为牌面值为v的牌的张数。
+一个出牌(Move)是二元组 (bit_info, cards)，bit_info与Combo中的定义完全相同，cards是从小到大排列的牌面值元组；
+空过为 PASS_MOVE。
+
+带牌（三带一、三带二、飞机的翅膀、四带二）不会枚举所有组合，而是按固定规则挑选：
+优先挑选手中张数少的牌，张数相同时挑选小的牌。带什么牌不影响大小比较，这样可以大幅减少搜索的分支数。
+@author: 江胤佐
+"""
+from typing import List, Tuple, Sequence, Optional, Iterator, Union
+
+import numpy as np
+
+from . import CARD_A, CARD_2, CARD_G0, CARD_G1
+from .combo import PASS, ROCKET_BIT, INVALID_BIT
+
+Move = Tuple[int, Tuple[int, ...]]
+
+PASS_MOVE: Move = (PASS, ())
+ROCKET_MOVE: Move = (ROCKET_BIT, (CARD_G0, CARD_G1))
+
+# 每种牌面值在一副牌中的张数
+FULL_COUNTS: Tuple[int, ...] = (4,) * 13 + (1, 1)
+
+
+def to_counts(cards: Union[np.ndarray, Sequence[int]]) -> List[int]:
+    """
+    把牌转换为数量向量
+    @param cards: 牌
+    """
+    counts = [0] * 15
+    for c in cards:
+        counts[c - 1] += 1
+    return counts
+
+
+def to_cards(counts: Sequence[int]) -> List[int]:
+    """
+    把数量向量转换为从小到大排列的牌
+    @param counts: 数量向量
+    """
+    return [v for v in range(1, 16) for _ in range(counts[v - 1])]
+
+
+def bit_info_of(counts: Sequence[int]) -> int:
+    """
+    直接由数量向量计算bit_info，结果与Combo相同
+    @param counts: 数量向量
+    @return: bit_info。牌为空时返回PASS
+    """
+    ranks = [v for v in range(1, 16) if counts[v - 1]]
+    if not ranks:
+        return PASS
+    if len(ranks) == 1:
+        return 1000 + 100 * counts[ranks[0] - 1] + ranks[0]
+    if sum(counts) == 2:
+        return ROCKET_BIT if ranks == [CARD_G0, CARD_G1] else INVALID_BIT
+
+    di = {1: [], 2: [], 3: [], 4: []}
+    for v in ranks:
+        di[counts[v - 1]].append(v)
+    max_count = max(k for k in di if di[k])
+    main = di[max_count]
+    value = main[-1]
+    consequent = main[-1] < CARD_2 and main[-1] - main[0] + 1 == len(main)
+
+    if max_count == 1:
+        return len(main) * 1000 + 100 + value if consequent and len(main) >= 5 else INVALID_BIT
+    if max_count == 2:
+        return len(main) * 1000 + 200 + value if consequent and len(main) >= 3 and not di[1] else INVALID_BIT
+    if max_count == 3:
+        if consequent or main == [CARD_2]:
+            if not di[1]:
+                if not di[2]:
+                    return len(main) * 1000 + 300 + value
+                if len(di[2]) == len(main):
+                    return 200000 + len(main) * 1000 + 300 + value
+            if len(di[1]) + len(di[2]) * 2 == len(main):
+                return 100000 + len(main) * 1000 + 300 + value
+        return INVALID_BIT
+    if di[3] or len(main) != 1:
+        return INVALID_BIT
+    if len(di[1]) + len(di[2]) * 2 == 2:
+        return 101400 + value
+    if len(di[2]) == 2 and not di[1]:
+        return 201400 + value
+    return INVALID_BIT
+
+
+def _kickers(counts: Sequence[int], exclude: range, n: int, size: int) -> Optional[Tuple[int, ...]]:
+    """
+    挑选n份带牌，每份size张。带单时同一种牌最多带2张，带对时每种牌只带1对
+    @return: 带牌，无法凑齐时返回None
+    """
+    order = sorted((counts[v - 1], v) for v in range(1, 16) if counts[v - 1] >= size and v not in exclude)
+    if size == 2:
+        return tuple(v for _, v in order[:n] for _ in range(2)) if len(order) >= n else None
+
+    picked = [v for _, v in order[:n]]
+    if len(picked) < n:
+        picked += [v for c, v in order if c >= 2][:n - len(picked)]
+    return tuple(sorted(picked)) if len(picked) == n else None
+
+
+def _chains(counts: Sequence[int], size: int, min_len: int, length: int = 0, above: int = 0) \
+        -> Iterator[Tuple[int, int]]:
+    """
+    枚举由每种至少size张的连续牌组成的序列（不含2和大小王）
+    @param length: 只枚举该长度的序列，为0时枚举所有长度不小于min_len的序列
+    @param above: 只枚举最大牌大于above的序列
+    @return: (最大牌, 长度)
+    """
+    run = 0
+    for end in range(1, CARD_A + 1):
+        run = run + 1 if counts[end - 1] >= size else 0
+        if end <= above:
+            continue
+        if length:
+            if run >= length:
+                yield end, length
+        else:
+            for n in range(min_len, run + 1):
+                yield end, n
+
+
+def _chain_cards(end: int, n: int, size: int) -> Tuple[int, ...]:
+    return tuple(v for v in range(end - n + 1, end + 1) for _ in range(size))
+
+
+def _trio_moves(counts: Sequence[int], n: int, take: int, above: int = 0) -> Iterator[Move]:
+    """三带/飞机。n为三张的个数，take为带牌种类：0不带，1带单，2带对"""
+    if n == 1:
+        ends = [(v, 1) for v in range(above + 1, CARD_2 + 1) if counts[v - 1] >= 3]
+    else:
+        ends = _chains(counts, 3, 2, n, above)
+    for end, n in ends:
+        main = _chain_cards(end, n, 3)
+        if not take:
+            yield n * 1000 + 300 + end, main
+            continue
+        kickers = _kickers(counts, range(end - n + 1, end + 1), n, take)
+        if kickers is not None:
+            yield take * 100000 + n * 1000 + 300 + end, tuple(sorted(main + kickers))
+
+
+def _four_take_moves(counts: Sequence[int], take: int, above: int = 0) -> Iterator[Move]:
+    """四带二。take为1时带两张单牌，为2时带两对"""
+    for v in range(above + 1, CARD_2 + 1):
+        if counts[v - 1] == 4:
+            kickers = _kickers(counts, range(v, v + 1), 2, take)
+            if kickers is not None:
+                yield take * 100000 + 1400 + v, tuple(sorted((v,) * 4 + kickers))
+
+
+def _bombs(counts: Sequence[int], above: int = 0) -> Iterator[Move]:
+    for v in range(above + 1, CARD_2 + 1):
+        if counts[v - 1] == 4:
+            yield 1400 + v, (v,) * 4
+    if counts[CARD_G0 - 1] and counts[CARD_G1 - 1]:
+        yield ROCKET_MOVE
+
+
+def lead_moves(counts: Sequence[int]) -> List[Move]:
+    """
+    先手出牌时所有可能的出牌（带牌按固定规则挑选）
+    @param counts: 手牌的数量向量
+    """
+    moves: List[Move] = []
+    for v in range(1, 16):
+        c = counts[v - 1]
+        for size in range(1, min(c, 3) + 1):
+            moves.append((1000 + 100 * size + v, (v,) * size))
+
+    for take in (1, 2):
+        moves.extend(_trio_moves(counts, 1, take))
+        moves.extend(_four_take_moves(counts, take))
+    moves.extend(_bombs(counts))
+
+    for end, n in _chains(counts, 1, 5):
+        moves.append((n * 1000 + 100 + end, _chain_cards(end, n, 1)))
+    for end, n in _chains(counts, 2, 3):
+        moves.append((n * 1000 + 200 + end, _chain_cards(end, n, 2)))
+    for end, n in _chains(counts, 3, 2):
+        main = _chain_cards(end, n, 3)
+        moves.append((n * 1000 + 300 + end, main))
+        for take in (1, 2):
+            kickers = _kickers(counts, range(end - n + 1, end + 1), n, take)
+            if kickers is not None:
+                moves.append((take * 100000 + n * 1000 + 300 + end, tuple(sorted(main + kickers))))
+    return moves
+
+
+def follow_moves(counts: Sequence[int], last_bit: int) -> List[Move]:
+    """
+    跟牌时所有能压过上家的出牌，第一个总是空过
+    @param counts: 手牌的数量向量
+    @param last_bit: 需要压过的牌的bit_info
+    """
+    moves: List[Move] = [PASS_MOVE]
+    if last_bit == ROCKET_BIT:
+        return moves
+
+    take, n, main, value = last_bit // 100000, last_bit // 1000 % 100, last_bit // 100 % 10, last_bit % 100
+    if main == 4 and not take:
+        # 上家出炸弹，只能用更大的炸弹或王炸
+        moves.extend(_bombs(counts, value))
+        return moves
+
+    if main == 4:
+        moves.extend(_four_take_moves(counts, take, value))
+    elif main == 3:
+        moves.extend(_trio_moves(counts, n, take, value))
+    elif n == 1:
+        moves.extend((1000 + 100 * main + v, (v,) * main) for v in range(value + 1, 16) if counts[v - 1] >= main)
+    else:
+        moves.extend((n * 1000 + 100 * main + end, _chain_cards(end, n, main))
+                     for end, _ in _chains(counts, main, n, n, value))
+    moves.extend(_bombs(counts))
+    return moves
+
+
+def legal_moves(counts: Sequence[int], last_bit: int) -> List[Move]:
+    """
+    当前可以出的牌
+    @param counts: 手牌的数量向量
+    @param last_bit: 需要压过的牌的bit_info，先手出牌时为PASS
+    """
+    return lead_moves(counts) if last_bit == PASS else follow_moves(counts, last_bit)
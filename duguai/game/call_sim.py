@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+用模拟对局标注叫地主数据的模块。
+对每一手17张的牌，让持有它的玩家强制当地主，把其余37张牌随机分给两个农民和地主牌，
+用现有的机器人智能体自我对弈若干局，以地主的胜率作为这手牌的标签。
+手牌分批分发到进程池中，每一批使用独立的随机种子；结果以二进制叫地主数据格式（见duguai.ai.call_train）写出。
+@author: 江胤佐
+"""
+from __future__ import annotations
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Iterator, List
+
+import numpy as np
+
+from duguai.ai.call_train import CALL_DTYPE, append_call_data
+from .deal import DealGenerator
+from .game_env import GameEnv
+from .robot import Robot
+from .tournament import AgentFactory, random_agent, batch_seed, seed_all
+
+# 一副牌中每种牌面值的张数，下标为牌面值 - 1
+_FULL_COUNTS = np.array([4] * 13 + [1, 1])
+
+
+class _LandlordRobot(Robot):
+    """总是叫地主的机器人。坐在0号座位上第一个叫，因此必定成为地主"""
+
+    def call_landlord(self) -> bool:
+        """总是叫地主"""
+        return True
+
+
+def rollout_deals(hand: np.ndarray, rollouts: int, rng: np.random.Generator) -> Iterator[List[np.ndarray]]:
+    """
+    固定玩家0的手牌，随机分配其余的牌
+    @param hand: 玩家0的17张手牌
+    @param rollouts: 发牌的副数
+    @param rng: 随机数生成器
+    @return: 供GameEnv.set_deals使用的迭代器
+    """
+    rest = np.repeat(np.arange(1, 16), _FULL_COUNTS - np.bincount(hand, minlength=16)[1:])
+    others = rest[np.argsort(rng.random((rollouts, rest.size)), axis=1)]
+    others[:, :34] = np.sort(others[:, :34].reshape(rollouts, 2, 17), axis=2).reshape(rollouts, 34)
+    others[:, 34:].sort(axis=1)
+    for row in others:
+        yield [hand, row[:17], row[17:34], row[34:]]
+
+
+def simulate_batch(agent: AgentFactory, seed: int, hands: int, rollouts: int) -> np.ndarray:
+    """
+    在当前进程中标注一批手牌
+    @param agent: 三个座位共用的智能体工厂
+    @param seed: 该批次的随机种子
+    @param hands: 手牌数
+    @param rollouts: 每手牌模拟的局数
+    @return: CALL_DTYPE类型的记录数组
+    """
+    seed_all(seed)
+    rng = np.random.default_rng(seed)
+    game_env = GameEnv(headless=True, shuffle_seats=False)
+    game_env.add_players(_LandlordRobot(game_env, agent(), 'landlord'),
+                         Robot(game_env, agent(), 'farmer1'),
+                         Robot(game_env, agent(), 'farmer2'))
+
+    records = np.zeros(hands, dtype=CALL_DTYPE)
+    records['cards'] = DealGenerator(seed).batch(hands)[:, :17]
+    records['games'] = rollouts
+    for record in records:
+        hand = record['cards'].astype(int)
+        game_env.set_deals(rollout_deals(hand, rollouts, rng))
+        wins = 0
+        for _ in range(rollouts):
+            game_env.start()
+            wins += game_env.victors == {0}
+        record['label'] = wins / rollouts
+    return records
+
+
+def generate_call_data(file_name: str,
+                       hands: int,
+                       rollouts: int = 8,
+                       agent: AgentFactory = random_agent,
+                       batch_size: int = 64,
+                       workers: Optional[int] = None,
+                       seed: int = 0) -> int:
+    """
+    并行标注手牌并追加写入二进制叫地主数据文件。批次结果按提交顺序写入，因此相同的种子总能得到相同的文件内容
+    @param file_name: 输出文件
+    @param hands: 手牌数
+    @param rollouts: 每手牌模拟的局数
+    @param agent: 智能体工厂（需可被pickle）
+    @param batch_size: 每批的手牌数
+    @param workers: 进程数，默认为CPU核数
+    @param seed: 全局随机种子
+    @return: 写入的记录数
+    """
+    sizes = [min(batch_size, hands - i) for i in range(0, hands, batch_size)]
+    written = 0
+    with ProcessPoolExecutor(workers or os.cpu_count() or 1) as executor:
+        for records in executor.map(simulate_batch, [agent] * len(sizes),
+                                    [batch_seed(seed, i) for i in range(len(sizes))],
+                                    sizes, [rollouts] * len(sizes)):
+            append_call_data(file_name, records)
+            written += len(records)
+    return written
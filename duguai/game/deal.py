@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+批量发牌模块。
+GameEnv.shuffle每次发牌都要拼接、洗牌、切分、排序，叫地主无人叫时还会重新发牌。
+DealGenerator一次生成一大批发牌：对随机矩阵按行argsort得到每一行的排列，
+再整体对三家手牌、地主牌分别排序，之后逐副取出，每副只是已有数组的视图。
+@author: 江胤佐
+"""
+from __future__ import annotations
+
+from typing import Optional, List, Iterator
+
+import numpy as np
+
+DECK: np.ndarray = np.asarray([card for card in range(1, 14)] * 4 + [14, 15], dtype=int)
+DECK.flags.writeable = False
+
+
+def deal_batch(rng: np.random.Generator, n: int) -> np.ndarray:
+    """
+    生成n副发牌
+    @param rng: 随机数生成器
+    @param n: 副数
+    @return: shape为(n, 54)的数组。每一行的[0:17]、[17:34]、[34:51]为玩家0、1、2的手牌，[51:54]为地主牌，各段均已排序
+    """
+    perm = np.argsort(rng.random((n, DECK.size)), axis=1)
+    cards = DECK[perm]
+    cards[:, :51] = np.sort(cards[:, :51].reshape(n, 3, 17), axis=2).reshape(n, 51)
+    cards[:, 51:].sort(axis=1)
+    return cards
+
+
+class DealGenerator:
+    """
+    批量发牌的迭代器，可直接传给GameEnv.set_deals。相同的种子与批大小总是得到相同的发牌序列
+    """
+
+    def __init__(self, seed: Optional[int] = None, batch_size: int = 4096):
+        """
+        @param seed: 随机种子，为None时不可复现
+        @param batch_size: 每批生成的副数
+        """
+        self._rng = np.random.default_rng(seed)
+        self._batch_size = batch_size
+        self._batch: np.ndarray = np.zeros((0, DECK.size), dtype=int)
+        self._i: int = 0
+
+    def batch(self, n: Optional[int] = None) -> np.ndarray:
+        """
+        直接生成一批发牌，见deal_batch
+        @param n: 副数，默认为batch_size
+        """
+        return deal_batch(self._rng, self._batch_size if n is None else n)
+
+    def __iter__(self) -> Iterator[List[np.ndarray]]:
+        return self
+
+    def __next__(self) -> List[np.ndarray]:
+        """
+        下一副牌
+        @return: 玩家0、1、2的手牌及地主牌
+        """
+        if self._i == len(self._batch):
+            self._batch = self.batch()
+            self._i = 0
+        row = self._batch[self._i]
+        self._i += 1
+        return [row[:17], row[17:34], row[34:51], row[51:]]
@@ -7,34 +7,53 @@ from __future__ import annotations
 
 import abc
 from functools import wraps
+from inspect import iscoroutinefunction
 from random import shuffle
-from typing import List, Iterator, Union, Set, Tuple
+from typing import List, Iterator, Union, Set, Tuple, Optional
 
 import numpy as np
 
-from duguai import mode
+from duguai import mode, metrics
 from ..card.cards import cards_view
 from ..card.combo import Combo
+from ..card.moves import PASS_MOVE
 from ..utils import is_in
+from .state import GameState
+from .tracker import CardTracker
 
 SPLIT_LINE = '----------------------------------------'
 
 
 def _remove_last_combo(func):
     """
-    从手牌中移除打出的牌的装饰器
+    从手牌中移除打出的牌的装饰器。被装饰的方法可以是协程函数
     """
 
+    def remove(player: GameEnv.AbstractPlayer):
+        hand = list(player.hand)
+        for i in player.last_combo.cards:
+            hand.remove(i)
+        player.hand = np.array(hand)
+
+    if iscoroutinefunction(func):
+        @wraps(func)
+        async def async_decorated(player: GameEnv.AbstractPlayer):
+            """
+            玩家出牌后，删去玩家手牌中出牌的卡牌
+            """
+            result = await func(player)
+            remove(player)
+            return result
+
+        return async_decorated
+
     @wraps(func)
     def decorated(player: GameEnv.AbstractPlayer):
         """
         玩家出牌后，删去玩家手牌中出牌的卡牌
         """
         result = func(player)
-        hand = list(player.hand)
-        for i in player.last_combo.cards:
-            hand.remove(i)
-        player.hand = np.array(hand)
+        remove(player)
         return result
 
     return decorated
@@ -52,6 +71,14 @@ class GameEnv:
     U_LAST_COMBO = 'update_last_combo'
     U_MSG = 'update_msg'
 
+    # ------- 对局记录中的决策类型 -----------
+
+    R_CALL = 0
+    R_LANDLORD = 1
+    R_PLAY = 2
+    R_FOLLOW = 3
+    R_GAME_OVER = 4
+
     class MessageObserver(metaclass=abc.ABCMeta):
         """接收文本消息的观察者"""
 
@@ -76,6 +103,10 @@ class GameEnv:
             self.last_combo: Combo = Combo()
             self._name = name
 
+            # 最近一次出牌/跟牌决策的状态向量与动作，由AI填写，供对局记录使用。人类玩家为None和-1
+            self.last_state: Optional[Union[np.ndarray, List[int]]] = None
+            self.last_action: int = -1
+
             # 统计获胜场次
             self._farmer_victory_count: int = 0
             self._landlord_victory_count: int = 0
@@ -83,6 +114,8 @@ class GameEnv:
         def ready(self):
             """游戏开始前的初始化操作"""
             self.last_combo: Combo = Combo()
+            self.last_state = None
+            self.last_action = -1
 
         def set_order(self, v: int):
             """设置玩家叫地主的顺序"""
@@ -161,10 +194,18 @@ class GameEnv:
                 self.hand
             ) and self.last_combo.is_valid() and self.last_combo > self.game_env.last_combo
 
-    def __init__(self):
+    def __init__(self, headless: bool = False, shuffle_seats: bool = True):
+        """
+        @param headless: 无界面模式。该模式下不注册任何消息观察者，也不会构造任何消息或卡牌视图字符串，
+            适用于训练与基准测试
+        @param shuffle_seats: 每局开始前是否随机打乱座位。为False时按add_players的顺序入座
+        """
 
         self.cards: List[np.ndarray] = []
 
+        self._headless: bool = headless
+        self._shuffle_seats: bool = shuffle_seats
+
         # 玩家数组
         self._players: List[Union[GameEnv.MessageObserver, GameEnv.AbstractPlayer]] = []
 
@@ -173,9 +214,22 @@ class GameEnv:
 
         self.turn: int
         self.landlord: int
+
+        # 确定地主后的牌局状态，轮流出牌的逻辑运行在它上面
+        self.state: Optional[GameState] = None
         self._last_combo_owner: int
         self._last_combo: Combo
 
+        # 发牌来源。为None时每次洗牌都随机发牌
+        self._deals: Optional[Iterator[List[np.ndarray]]] = None
+
+        # 对局记录器（见duguai.game.record.GameRecorder）及当前对局编号
+        self._recorder = None
+        self._game_id: int = -1
+
+        # 记牌器，确定地主后重置，每次出牌、跟牌后更新
+        self.tracker: CardTracker = CardTracker()
+
     def _init(self):
 
         # 卡牌二维数组, 前3个代表玩家0、1、2的初始手牌（各17张）最后一项代表3张地主牌
@@ -196,7 +250,8 @@ class GameEnv:
 
         assert len(self._players) == 3, '开始游戏前先添加玩家'
 
-        shuffle(self._players)
+        if self._shuffle_seats:
+            shuffle(self._players)
         order = 0
         for player in self._players:
             player.set_order(order)
@@ -214,10 +269,20 @@ class GameEnv:
         @param p3: 玩家2
         """
         self._players = [p1, p2, p3]
+        self._msg_observers = []
+        if self._headless:
+            return
         for player in self._players:
             if issubclass(player.__class__, GameEnv.MessageObserver):
                 self._msg_observers.append(player)
 
+    @property
+    def headless(self) -> bool:
+        """
+        是否没有任何消息观察者。为True时不会构造、分发任何消息
+        """
+        return not self._msg_observers
+
     def notify(self, func_name, *args, **kwargs):
         """
         游戏环境通知各个玩家
@@ -244,18 +309,44 @@ class GameEnv:
         """
         开始游戏
         """
+        self._begin_game()
+        self.__call_landlord()
+        self._begin_round_robin()
+        self.__round_robin()
+
+    def _begin_game(self) -> None:
         self._init()
+        if self._recorder is not None:
+            self._game_id = self._recorder.new_game()
+        if self._msg_observers:
+            self.notify(GameEnv.U_MSG, msgs='进入叫地主环节')
 
-        self.__call_landlord()
+    def _begin_round_robin(self) -> None:
+        if self._msg_observers:
+            self.notify(GameEnv.U_MSG, msgs=self._start_msg())
 
-        self.notify(GameEnv.U_MSG, msgs=self._start_msg())
+    def set_deals(self, deals: Optional[Iterator[List[np.ndarray]]]) -> None:
+        """
+        设置发牌来源。设置后，每次洗牌都从deals中取出下一副牌，而不是随机洗牌。
+        @param deals: 迭代器，每一项为玩家0、1、2的手牌（各17张，已排序）及3张地主牌。为None时恢复随机洗牌
+        """
+        self._deals = deals
 
-        self.__round_robin()
+    def set_recorder(self, recorder) -> None:
+        """
+        设置对局记录器。设置后每一局的叫地主、出牌、跟牌都会被记录
+        @param recorder: duguai.game.record.GameRecorder对象。为None时不记录
+        """
+        self._recorder = recorder
 
     def shuffle(self) -> None:
         """
         洗牌
         """
+        if self._deals is not None:
+            self.cards = list(next(self._deals))
+            return
+
         self.cards = np.concatenate(self.cards, axis=0)
         np.random.shuffle(self.cards)
         self.cards = np.split(self.cards, [17, 34, 51])
@@ -305,56 +396,116 @@ class GameEnv:
         return self.abs_user_info(play_order)
 
     def __call_landlord(self):
-
-        self.notify(GameEnv.U_MSG, msgs='进入叫地主环节')
         while self.landlord == -1:
             self.shuffle()
             for player in self._players:
+                if self._on_call(player.call_landlord()):
+                    break
 
-                if player.call_landlord():
-                    self.landlord = self.turn
+    def _on_call(self, called: bool) -> bool:
+        """
+        处理当前玩家叫地主的结果
+        @param called: 当前玩家是否叫地主
+        @return: 是否确定了地主
+        """
+        if self._recorder is not None:
+            self._recorder.record(self._game_id, self.turn, GameEnv.R_CALL, self.cards[self.turn],
+                                  action=1 if called else 0)
+        if metrics.enabled:
+            metrics.LANDLORD_CALLS.inc('1' if called else '0')
+        if called:
+            self.landlord = self.turn
+            if self._recorder is not None:
+                self._recorder.record(self._game_id, self.turn, GameEnv.R_LANDLORD, self.cards[3])
 
-                    for p in self._players:
-                        p.update_landlord(self.landlord)
+            for p in self._players:
+                p.update_landlord(self.landlord)
+
+            self.cards[self.turn] = np.concatenate([self.cards[self.turn], self.cards[3]])
+            self.cards[self.turn].sort()
+            self.tracker.start(self.cards[:3], self.cards[3], self.turn)
+            self.state = GameState.from_cards(self.cards, self.turn)
+            self._last_combo_owner = self.turn
+            return True
+        if self._msg_observers:
+            self.notify(GameEnv.U_MSG, msgs='玩家%d不叫' % self.turn)
+        self.turn = (self.turn + 1) % 3
+        return False
 
-                    self.cards[self.turn] = np.concatenate([self.cards[self.turn], self.cards[3]])
-                    self.cards[self.turn].sort()
-                    self._last_combo_owner = self.turn
-                    break
-                self.notify(GameEnv.U_MSG, msgs='玩家%d不叫' % self.turn)
-                self.turn = (self.turn + 1) % 3
+    @property
+    def victors(self) -> Set[int]:
+        """
+        本局的获胜者。仅在一局游戏结束后有意义
+        @return: 获胜玩家的id集合
+        """
+        if self.landlord == self.turn:
+            return {self.landlord}
+        farmers = {0, 1, 2}
+        farmers.remove(self.landlord)
+        return farmers
 
     def __notify_game_over(self) -> None:
-        if self.landlord == self.turn:
-            for player in self._players:
-                player.update_game_over({self.landlord})
-        else:
-            farmers = {0, 1, 2}
-            farmers.remove(self.landlord)
-            for player in self._players:
-                player.update_game_over(farmers)
+        victors = self.victors
+        for player in self._players:
+            player.update_game_over(victors)
 
     def __round_robin(self):
         while True:
-            if self._last_combo_owner == self.turn:
-                self.notify(GameEnv.U_MSG, msgs=self.rel_user_info(0) + '出牌')
+            is_play = self._before_move()
+            if is_play:
                 self._players[self.turn].play()
+            else:
+                self._players[self.turn].follow()
+            if self._after_move(is_play):
+                return
+
+    def _before_move(self) -> bool:
+        """
+        轮到当前玩家出牌或跟牌前的处理
+        @return: True: 出牌; False: 跟牌
+        """
+        is_play = self.state.is_play
+
+        # 无观察者时跳过所有消息的构造与分发
+        if self._msg_observers:
+            if is_play:
+                self.notify(GameEnv.U_MSG, msgs=self.rel_user_info(0) + '出牌')
             else:
                 self.notify(
                     GameEnv.U_MSG,
                     msgs=self.rel_user_info(0) + '跟牌(先前的牌由 {} 打出 {})'.format(
                         self.abs_user_info(self._last_combo_owner), self._last_combo.cards_view)
                 )
-                self._players[self.turn].follow()
-
-            if self._players[self.turn].last_combo.is_not_empty():
-                self._last_combo_owner = self.turn
-                self._last_combo = self._players[self.turn].last_combo
+        return is_play
 
+    def _after_move(self, is_play: bool) -> bool:
+        """
+        当前玩家出牌或跟牌后的处理
+        @param is_play: 是否为出牌
+        @return: 游戏是否结束
+        """
+        if self._recorder is not None:
+            self._recorder.record_move(self._game_id, self.turn, GameEnv.R_PLAY if is_play else GameEnv.R_FOLLOW,
+                                       self._players[self.turn])
+
+        combo = self._players[self.turn].last_combo
+        self.tracker.update(self.turn, combo.bit_info, combo.cards)
+        over = self.state.apply((combo.bit_info, tuple(combo.cards.tolist())) if combo.is_not_empty() else PASS_MOVE)
+        if combo.is_not_empty():
+            self._last_combo_owner = self.state.last_owner
+            self._last_combo = combo
+
+        if self._msg_observers:
             self.notify(GameEnv.U_LAST_COMBO)
 
-            if self.cards[self.turn].size == 0:
-                self.__notify_game_over()
-                return
-
-            self.turn = (self.turn + 1) % 3
+        if over:
+            if self._recorder is not None:
+                self._recorder.record(self._game_id, self.turn, GameEnv.R_GAME_OVER, [],
+                                      action=int(self.turn == self.landlord))
+            if metrics.enabled:
+                metrics.GAMES.inc()
+            self.__notify_game_over()
+            return True
+
+        self.turn = self.state.turn
+        return False
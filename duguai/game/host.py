@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""
+基于asyncio的多桌游戏主机模块。
+GameEnv.start是阻塞的循环，Human通过input()读取输入，一个进程只能进行一局游戏。
+AsyncGameEnv把叫地主、出牌、跟牌变为可等待的：玩家的这些方法既可以直接返回结果（如机器人，立即完成），
+也可以返回协程（如通过套接字连接的人类玩家，等待对方输入）。
+GameHost在一个事件循环中同时运行成千上万桌游戏，不需要为每一桌创建线程。
+@author: 江胤佐
+"""
+from __future__ import annotations
+
+import asyncio
+from inspect import isawaitable
+from typing import Callable, List, Optional, Union
+
+from duguai.card.cards import cards_view
+from .game_env import GameEnv, _remove_last_combo
+from .human import Human, CALL_PROMPT
+from .robot import Robot
+
+
+async def _resolve(value):
+    """等待可等待的结果，其它结果直接返回"""
+    if isawaitable(value):
+        return await value
+    return value
+
+
+class AsyncGameEnv(GameEnv):
+    """
+    异步游戏运行环境。流程与GameEnv完全相同，只是每一次玩家决策都会被等待，
+    并且每一步之后让出事件循环，使同一进程中的其它桌得以进行
+    """
+
+    async def start(self) -> None:
+        """
+        开始游戏
+        """
+        self._begin_game()
+        while self.landlord == -1:
+            self.shuffle()
+            for player in self._players:
+                if self._on_call(await _resolve(player.call_landlord())):
+                    break
+
+        self._begin_round_robin()
+        while True:
+            is_play = self._before_move()
+            player = self._players[self.turn]
+            await _resolve(player.play() if is_play else player.follow())
+            if self._after_move(is_play):
+                return
+            await asyncio.sleep(0)
+
+
+class RemoteHuman(Human):
+    """
+    通过TCP或Unix套接字连接的人类玩家，每一行输入对应一次操作
+    """
+
+    def __init__(self, game_env: GameEnv, name: str, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        super().__init__(game_env, name)
+        self._reader = reader
+        self._writer = writer
+
+    def _print(self, *values) -> None:
+        self._writer.write((' '.join(str(v) for v in values) + '\n').encode())
+
+    async def _input(self, prompt: str) -> str:
+        """
+        输出提示并等待玩家输入一行
+        @param prompt: 提示
+        @return: 去掉首尾空白的输入
+        @raise EOFError: 玩家断开连接
+        """
+        self._print(prompt)
+        await self._writer.drain()
+        line = await self._reader.readline()
+        if not line:
+            raise EOFError('玩家 %s 断开了连接' % self.name)
+        return line.decode(errors='ignore').strip()
+
+    async def call_landlord(self) -> bool:
+        """
+        玩家叫地主
+        @return: 叫: True; 不叫: False
+        """
+        self._print('玩家{}的手牌:'.format(self._order), cards_view(self.hand))
+        return await self._input(CALL_PROMPT) == '1'
+
+    @_remove_last_combo
+    async def follow(self) -> None:
+        """
+        玩家跟牌
+        """
+        while True:
+            self.last_combo.cards_view = (await self._input(self._move_prompt())).upper()
+            if self.valid_follow():
+                break
+            else:
+                self._print('输入非法!')
+
+    @_remove_last_combo
+    async def play(self) -> None:
+        """
+        玩家出牌
+        """
+        while True:
+            self.last_combo.cards_view = (await self._input(self._move_prompt())).upper()
+            if self._valid_play():
+                break
+            else:
+                self._print('输入非法!')
+
+
+class GameHost:
+    """
+    多桌游戏主机。每个连接上来的人类玩家单独开一桌，与两个机器人对战
+    """
+
+    def __init__(self, agent_factory: Callable[[], Robot.Agent]):
+        """
+        @param agent_factory: 无参函数，为每个机器人创建智能体
+        """
+        self._agent_factory = agent_factory
+        self._servers: List[asyncio.AbstractServer] = []
+
+        # 正在进行的桌数、已完成的局数
+        self.table_count: int = 0
+        self.game_count: int = 0
+
+    def _robot(self, game_env: GameEnv, name: str) -> Robot:
+        return Robot(game_env, self._agent_factory(), name)
+
+    async def run_table(self, game_env: AsyncGameEnv, games: Optional[int] = None) -> None:
+        """
+        在一桌上连续进行多局游戏
+        @param game_env: 已添加玩家的游戏环境
+        @param games: 局数，为None时一直进行，直到人类玩家断开连接
+        """
+        self.table_count += 1
+        try:
+            i = 0
+            while games is None or i < games:
+                await game_env.start()
+                self.game_count += 1
+                i += 1
+        finally:
+            self.table_count -= 1
+
+    async def run_robot_tables(self, tables: int, games: int) -> None:
+        """
+        同时运行多桌只有机器人的游戏，用于压力测试
+        @param tables: 桌数
+        @param games: 每桌的局数
+        """
+        envs = []
+        for _ in range(tables):
+            game_env = AsyncGameEnv(headless=True)
+            game_env.add_players(*(self._robot(game_env, 'robot%d' % i) for i in range(3)))
+            envs.append(game_env)
+        await asyncio.gather(*(self.run_table(game_env, games) for game_env in envs))
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        game_env = AsyncGameEnv()
+        human = RemoteHuman(game_env, 'human', reader, writer)
+        game_env.add_players(human, self._robot(game_env, 'robot1'), self._robot(game_env, 'robot2'))
+        try:
+            await self.run_table(game_env)
+        except (EOFError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve_tcp(self, host: str, port: int) -> None:
+        """
+        在TCP端口上接受人类玩家的连接
+        @param host: 监听地址
+        @param port: 端口
+        """
+        self._servers.append(await asyncio.start_server(self._handle, host, port))
+
+    async def serve_unix(self, path: str) -> None:
+        """
+        在Unix套接字上接受人类玩家的连接
+        @param path: 套接字文件路径
+        """
+        self._servers.append(await asyncio.start_unix_server(self._handle, path))
+
+    async def close(self) -> None:
+        """停止接受新的连接"""
+        for server in self._servers:
+            server.close()
+            await server.wait_closed()
+        self._servers = []
+
+    @property
+    def sockets(self) -> List[Union[tuple, str]]:
+        """正在监听的地址"""
+        return [s.getsockname() for server in self._servers for s in server.sockets]
@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""
+对局记录模块。
+对局记录是只追加的二进制文件：16字节的文件头之后，是一条条定长的numpy结构化记录，每条记录对应一次决策。
+写入时先缓存在预分配的数组中，攒满后整块写入；读取时直接内存映射，扫描上百万局也无需解析文本。
+
+记录字段                 含义
+-----------------------------------------------------------------------
+game_id     对局编号，同一文件内单调递增
+seat        座位号（叫地主顺序）
+decision    决策类型，见 CALL, LANDLORD, PLAY, FOLLOW, GAME_OVER
+action      动作编号。叫地主时1为叫、0为不叫；出牌/跟牌时为智能体挑选的动作；地主为胜者时GAME_OVER记录取1；
+            其余情况（如人类玩家）为-1
+state       Q表中的状态编号，无法得到时为-1
+cards       牌的数量向量，cards[i]表示牌面值为i + 1的牌的张数。叫地主时为手牌，确定地主时为地主牌，出牌时为打出的牌
+bit_info    打出的牌的bit_info，见Combo
+-----------------------------------------------------------------------
+@author: 江胤佐
+"""
+from __future__ import annotations
+
+import logging
+import os
+from typing import Iterator, Optional, Union, List
+
+import numpy as np
+
+from duguai.ai.provider import state_index
+from duguai.card.combo import PASS
+from .game_env import GameEnv
+
+CALL, LANDLORD, PLAY, FOLLOW, GAME_OVER = \
+    GameEnv.R_CALL, GameEnv.R_LANDLORD, GameEnv.R_PLAY, GameEnv.R_FOLLOW, GameEnv.R_GAME_OVER
+
+RECORD_DTYPE = np.dtype([
+    ('game_id', '<u4'),
+    ('seat', 'u1'),
+    ('decision', 'u1'),
+    ('action', 'i1'),
+    ('state', '<i4'),
+    ('cards', 'u1', (15,)),
+    ('bit_info', '<i4'),
+])
+
+MAGIC = b'DGREC'
+VERSION = 1
+HEADER_SIZE = 16
+
+
+def _header() -> bytes:
+    return (MAGIC + bytes([VERSION])).ljust(HEADER_SIZE, b'\0')
+
+
+def card_counts(cards: Union[np.ndarray, List[int]]) -> np.ndarray:
+    """
+    把牌转换为长度为15的数量向量
+    @param cards: 牌
+    """
+    return np.bincount(np.asarray(cards, dtype=int), minlength=16)[1:]
+
+
+class GameRecorder:
+    """
+    对局记录的流式写入器。通过 GameEnv.set_recorder 挂到游戏环境上后，每一次叫地主、出牌、跟牌都会被记录。
+    @note: 数据先写入缓冲区，需要调用close()（或使用with语句）保证全部落盘
+    """
+
+    def __init__(self, file_name: str, buffer_size: int = 8192):
+        """
+        @param file_name: 记录文件名。文件已存在时追加写入，对局编号接着文件中最后一局继续。
+        写入中途崩溃留下的不完整记录会被截掉，否则之后追加的记录都会错位
+        @param buffer_size: 缓冲区能容纳的记录条数
+        """
+        self._next_game_id: int = 0
+        if os.path.isfile(file_name) and os.path.getsize(file_name) > 0:
+            size = os.path.getsize(file_name)
+            if size > HEADER_SIZE and (size - HEADER_SIZE) % RECORD_DTYPE.itemsize:
+                whole = size - (size - HEADER_SIZE) % RECORD_DTYPE.itemsize
+                logging.warning('%s 末尾有不完整的记录，截掉 %d 字节' % (file_name, size - whole))
+                os.truncate(file_name, whole)
+            reader = GameRecordReader(file_name)
+            if len(reader):
+                self._next_game_id = int(reader.records['game_id'][-1]) + 1
+            del reader
+            self._file = open(file_name, 'ab')
+        else:
+            self._file = open(file_name, 'wb')
+            self._file.write(_header())
+
+        self._buffer: np.ndarray = np.zeros(buffer_size, dtype=RECORD_DTYPE)
+        self._size: int = 0
+
+    def new_game(self) -> int:
+        """
+        开始记录新的一局
+        @return: 新的对局编号
+        """
+        game_id = self._next_game_id
+        self._next_game_id += 1
+        return game_id
+
+    def record(self, game_id: int, seat: int, decision: int, cards: Union[np.ndarray, List[int]],
+               bit_info: int = PASS, state: int = -1, action: int = -1) -> None:
+        """
+        写入一条记录
+        @param game_id: 对局编号
+        @param seat: 座位号
+        @param decision: 决策类型
+        @param cards: 牌
+        @param bit_info: 打出的牌的bit_info
+        @param state: 状态编号
+        @param action: 动作编号
+        """
+        row = self._buffer[self._size]
+        row['game_id'] = game_id
+        row['seat'] = seat
+        row['decision'] = decision
+        row['action'] = action
+        row['state'] = state
+        row['cards'] = card_counts(cards)
+        row['bit_info'] = bit_info
+
+        self._size += 1
+        if self._size == self._buffer.size:
+            self.flush()
+
+    def record_move(self, game_id: int, seat: int, decision: int, player: GameEnv.AbstractPlayer) -> None:
+        """
+        记录一次出牌或跟牌。状态向量与动作取自玩家最近一次决策
+        @param game_id: 对局编号
+        @param seat: 座位号
+        @param decision: PLAY 或 FOLLOW
+        @param player: 刚刚出完牌的玩家
+        """
+        state_vector = player.last_state
+        state = -1 if state_vector is None else state_index(state_vector)[1]
+
+        combo = player.last_combo
+        self.record(game_id, seat, decision, combo.cards, combo.bit_info, state, player.last_action)
+
+    def flush(self) -> None:
+        """把缓冲区中的记录写入文件"""
+        if self._size:
+            self._buffer[:self._size].tofile(self._file)
+            self._size = 0
+        self._file.flush()
+
+    def close(self) -> None:
+        """写入剩余记录并关闭文件"""
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+    def __enter__(self) -> GameRecorder:
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class GameRecordReader:
+    """
+    对局记录的读取器。记录文件被内存映射为结构化数组，不会一次性读入内存
+    """
+
+    def __init__(self, file_name: str):
+        with open(file_name, 'rb') as f:
+            header = f.read(HEADER_SIZE)
+        if header[:len(MAGIC)] != MAGIC:
+            raise ValueError('%s 不是对局记录文件' % file_name)
+        if header[len(MAGIC)] != VERSION:
+            raise ValueError('不支持的对局记录版本: %d' % header[len(MAGIC)])
+
+        n = (os.path.getsize(file_name) - HEADER_SIZE) // RECORD_DTYPE.itemsize
+        if n:
+            self.records: np.ndarray = np.memmap(file_name, dtype=RECORD_DTYPE, mode='r', offset=HEADER_SIZE,
+                                                 shape=(n,))
+        else:
+            self.records: np.ndarray = np.zeros(0, dtype=RECORD_DTYPE)
+
+        self._starts: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    @property
+    def game_starts(self) -> np.ndarray:
+        """每一局第一条记录的下标，最后附加记录总数"""
+        if self._starts is None:
+            game_ids = self.records['game_id']
+            self._starts = np.concatenate([[0], np.flatnonzero(game_ids[1:] != game_ids[:-1]) + 1, [len(self)]]) \
+                if len(self) else np.zeros(1, dtype=int)
+        return self._starts
+
+    @property
+    def game_count(self) -> int:
+        """文件中的对局数"""
+        return len(self.game_starts) - 1
+
+    def game(self, game_id: int) -> np.ndarray:
+        """
+        获取某一局的全部记录
+        @param game_id: 对局编号
+        @return: 记录数组的视图
+        """
+        game_ids = self.records['game_id']
+        return self.records[np.searchsorted(game_ids, game_id, 'left'):np.searchsorted(game_ids, game_id, 'right')]
+
+    def iter_games(self) -> Iterator[np.ndarray]:
+        """依次获取每一局的记录"""
+        starts = self.game_starts
+        for i in range(len(starts) - 1):
+            yield self.records[starts[i]:starts[i + 1]]
+
+    def iter_chunks(self, chunk_size: int = 1 << 20) -> Iterator[np.ndarray]:
+        """
+        按块扫描全部记录，适合对整个文件做向量化统计
+        @param chunk_size: 每块的记录条数
+        """
+        for i in range(0, len(self), chunk_size):
+            yield self.records[i:i + chunk_size]
@@ -7,30 +7,54 @@ from __future__ import annotations
 
 from abc import ABCMeta, abstractmethod
 from copy import deepcopy
-from typing import Union, List, Set
+from time import perf_counter
+from typing import Union, List, Set, Optional
 
 import numpy as np
 
+from duguai import metrics, tracer
 from duguai.ai import process
 from duguai.ai.call_landlord import get_svc, z_score
+from duguai.ai.endgame import EndgameSolver
 from duguai.ai.executor import execute_play, execute_follow
-from duguai.ai.provider import PlayProvider, FollowProvider
+from duguai.ai.provider import PlayProvider, FollowProvider, state_index
+from duguai.card.combo import PASS
+from duguai.card.moves import Move
 from .game_env import GameEnv, _remove_last_combo
 
 
+def _record_decision(kind: str, t0: float, t1: float) -> None:
+    """记录一次决策的指标。t0、t1为开始提供状态、开始挑选动作的时刻"""
+    metrics.DECISIONS.inc(kind)
+    metrics.STAGE_SECONDS.observe(t1 - t0, 'provide')
+    metrics.STAGE_SECONDS.observe(perf_counter() - t1, 'exec')
+
+
+def _sampled() -> bool:
+    """这次决策是否需要写入抽样决策追踪"""
+    return tracer.active is not None and tracer.active.due()
+
+
 class Robot(GameEnv.AbstractPlayer):
     """
     AI，由机器学习算法决定操作
     @author 江胤佐
     """
 
-    def __init__(self, game_env: GameEnv, agent: Robot.Agent, name: str):
+    def __init__(self, game_env: GameEnv, agent: Robot.Agent, name: str, endgame: Optional[EndgameSolver] = None):
+        """
+        @param endgame: 残局求解器。剩余手牌总数不超过其阈值且找到必胜出牌时，不再询问智能体。
+        agent.trains为True时不能使用：求解器出牌时跳过了exec，智能体会把上一次决策与很多步之后的状态当作一次转移
+        """
+        if endgame is not None and agent.trains:
+            raise ValueError('训练智能体不能使用残局求解器')
         super().__init__(game_env, name)
         self.svc = get_svc()
         self.play_provider = PlayProvider(self._order)
         self.follow_provider = FollowProvider(self._order)
         self.__landlord_id: int = 0
         self._agent: Robot.Agent = agent
+        self._endgame: Optional[EndgameSolver] = endgame
 
     def update_game_over(self, victors: Set[int]) -> None:
         """训练时，胜利奖励40，失败惩罚-40"""
@@ -64,6 +88,9 @@ class Robot(GameEnv.AbstractPlayer):
     class Agent(metaclass=ABCMeta):
         """动作挑选的智能体"""
 
+        # 是否在exec中根据相邻两次决策更新Q表或记录状态转移。这类智能体不能与残局求解器同时使用
+        trains: bool = False
+
         def update_game_over(self, reward: int) -> None:
             """
             通知智能体游戏结束
@@ -72,28 +99,83 @@ class Robot(GameEnv.AbstractPlayer):
             pass
 
         @abstractmethod
-        def exec(self, state_vector: Union[np.ndarray, List[int]], actions: List[int]) -> int:
+        def exec(self, state_vector: Union[np.ndarray, List[int]], action_mask: int) -> int:
             """
-            根据状态向量和动作列表执行一个动作
+            根据状态向量和可选动作执行一个动作
             @param state_vector: 状态向量
-            @param actions: 动作
-            @return: 从action_list中挑选出来的动作
+            @param action_mask: 可选动作的位掩码，第i位为1表示可以选择动作i。见duguai.ai.action_mask
+            @return: 从action_mask中挑选出来的动作
             """
             pass
 
+        def q_values(self, state_vector: Union[np.ndarray, List[int]]) -> Optional[np.ndarray]:
+            """
+            抽样决策追踪时读取的各动作Q值
+            @param state_vector: 状态向量
+            @return: 各动作的Q值。没有Q值的智能体返回None
+            """
+            return None
+
+    def _q_values(self, state_vector) -> Optional[np.ndarray]:
+        """
+        抽样决策时在exec之前读取各动作Q值的副本。训练智能体的exec会更新Q表，之后再读就不是挑选动作时的Q值了
+        """
+        q_values = self._agent.q_values(state_vector)
+        return None if q_values is None else np.array(q_values)
+
+    @staticmethod
+    def _trace(kind: int, state_vector, action_mask: int, action: int, q_values: Optional[np.ndarray],
+               latency: float) -> None:
+        """写入一条抽样决策追踪记录"""
+        tracer.active.record(kind, state_index(state_vector)[1], action_mask, action, q_values, latency)
+
+    def _endgame_move(self, last_bit: int, last_owner: int) -> Optional[Move]:
+        """
+        用残局求解器求必胜出牌
+        @return: 必胜出牌。未启用、不满足启用条件或没有找到时返回None
+        """
+        tracker = self.game_env.tracker
+        if self._endgame is None or not self._endgame.applicable(tracker.sizes):
+            return None
+        move = self._endgame.decide(tracker.search_info(self._order, last_bit, last_owner))
+        if move is not None:
+            # 求解器的出牌不经过智能体，对局记录中没有状态向量与动作。状态转移在此中断，因此只用于不训练的智能体
+            self.last_state, self.last_action = None, -1
+        return move
+
     @_remove_last_combo
     def follow(self) -> None:
         """
         AI跟牌
         """
-        state, bombs, good_actions, max_actions, action_list = self.follow_provider.provide(
+        move = self._endgame_move(self.game_env.last_combo.bit_info, self.game_env.last_combo_owner_id)
+        if move is not None:
+            self.last_combo.cards = list(move[1])
+            if not self.valid_follow():
+                raise ValueError('残局跟牌不合法, 出的牌: {}, 上一次牌: {}'
+                                 .format(self.last_combo.cards_view, self.game_env.last_combo))
+            return
+
+        sampled = _sampled()
+        timed = metrics.enabled or sampled
+        if timed:
+            t0 = perf_counter()
+        state, action_mask, (bombs, good_actions, max_actions) = self.follow_provider.provide_fused(
             last_combo_owner_id=self.game_env.last_combo_owner_id,
             hand_p=self.game_env.hand_p,
             hand_n=self.game_env.hand_n,
             cards=self.hand,
             last_combo=deepcopy(self.game_env.last_combo))
-
-        action: int = self._agent.exec(state, action_list)
+        if timed:
+            t1 = perf_counter()
+
+        q_values = self._q_values(state) if sampled else None
+        action: int = self._agent.exec(state, action_mask)
+        if metrics.enabled:
+            _record_decision('follow', t0, t1)
+        if sampled:
+            self._trace(tracer.FOLLOW, state, action_mask, action, q_values, t1 - t0)
+        self.last_state, self.last_action = state, action
         self.last_combo.cards = execute_follow(action, bombs, good_actions, max_actions)
         if not self.valid_follow():
             raise ValueError('AI跟牌不合法, AI出的牌: {}, 上一次牌: {}'
@@ -104,11 +186,30 @@ class Robot(GameEnv.AbstractPlayer):
         """
         AI出牌
         """
-        play_hand, state_vector, action_list = self.play_provider.provide(
+        move = self._endgame_move(PASS, self._order)
+        if move is not None:
+            self.last_combo.cards = list(move[1])
+            if not self.last_combo.is_valid():
+                raise ValueError('残局出牌非法, 出的牌: {}'.format(self.last_combo.cards_view))
+            return
+
+        sampled = _sampled()
+        timed = metrics.enabled or sampled
+        if timed:
+            t0 = perf_counter()
+        state_vector, action_mask, play_hand = self.play_provider.provide_fused(
             self.hand,
             hand_p=self.game_env.hand_p,
             hand_n=self.game_env.hand_n)
-        action: int = self._agent.exec(state_vector, action_list)
+        if timed:
+            t1 = perf_counter()
+        q_values = self._q_values(state_vector) if sampled else None
+        action: int = self._agent.exec(state_vector, action_mask)
+        if metrics.enabled:
+            _record_decision('play', t0, t1)
+        if sampled:
+            self._trace(tracer.PLAY, state_vector, action_mask, action, q_values, t1 - t0)
+        self.last_state, self.last_action = state_vector, action
         self.last_combo.cards = execute_play(play_hand, action)
         if not self.last_combo.is_valid():
             raise ValueError('AI出牌非法, AI出的牌: {}'.format(self.last_combo.cards_view))
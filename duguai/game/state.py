@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+可复制、可撤销的轻量牌局状态。
+GameEnv的状态分散在cards数组、各玩家的last_combo对象以及_remove_last_combo修改的私有字段中，搜索时无法试走一步再退回。
+GameState只用三家手牌的数量向量、轮到谁、上一手牌及其出牌者表示牌局：
+1. apply(move) 执行一次出牌或空过，并把恢复所需的信息压入事件栈；
+2. undo() 弹出事件栈，撤销最近一次apply；
+3. clone() 复制当前状态（不复制事件栈），用于确定化或并行模拟。
+GameEnv的轮流出牌逻辑也运行在GameState上，play_out则在没有玩家对象和观察者的情况下直接模拟到终局。
+@author: 江胤佐
+"""
+from __future__ import annotations
+
+from typing import List, Sequence, Tuple, Callable, Optional, Set
+
+from ..card.combo import PASS
+from ..card.moves import Move, to_counts, lead_moves, follow_moves
+
+# 事件：(出牌, 出牌前轮到谁, 出牌前的上一手牌, 出牌前上一手牌的出牌者)
+Event = Tuple[Move, int, int, int]
+
+# 模拟对局的策略：给定牌局，返回当前玩家的出牌
+Policy = Callable[['GameState'], Move]
+
+
+class GameState:
+    """
+    基于数量向量的牌局状态
+    """
+    __slots__ = ('hands', 'sizes', 'turn', 'landlord', 'last_bit', 'last_owner', '_events')
+
+    def __init__(self, hands: List[List[int]], landlord: int, turn: Optional[int] = None,
+                 last_bit: int = PASS, last_owner: Optional[int] = None):
+        """
+        @param hands: 三个座位手牌的数量向量
+        @param landlord: 地主的座位
+        @param turn: 轮到谁，默认为地主
+        @param last_bit: 需要压过的牌的bit_info
+        @param last_owner: last_bit的出牌者，默认为turn，即先手出牌
+        """
+        self.hands = hands
+        self.sizes = [sum(h) for h in hands]
+        self.landlord = landlord
+        self.turn = landlord if turn is None else turn
+        self.last_bit = last_bit
+        self.last_owner = self.turn if last_owner is None else last_owner
+        self._events: List[Event] = []
+
+    @classmethod
+    def from_cards(cls, cards: Sequence[Sequence[int]], landlord: int) -> GameState:
+        """
+        由开局的手牌创建状态，地主先手出牌
+        @param cards: 三个座位的手牌（地主的手牌已包含地主牌）
+        @param landlord: 地主的座位
+        """
+        return cls([to_counts(c) for c in cards[:3]], landlord)
+
+    @property
+    def is_play(self) -> bool:
+        """当前玩家是否先手出牌"""
+        return self.last_owner == self.turn
+
+    @property
+    def is_over(self) -> bool:
+        """是否有玩家已出完牌。此时turn为出完牌的玩家"""
+        return self.sizes[self.turn] == 0
+
+    @property
+    def victors(self) -> Set[int]:
+        """获胜者的座位集合。仅在is_over时有意义"""
+        if self.turn == self.landlord:
+            return {self.landlord}
+        return {0, 1, 2} - {self.landlord}
+
+    @property
+    def depth(self) -> int:
+        """事件栈的深度，即可以撤销的步数"""
+        return len(self._events)
+
+    def legal_moves(self) -> List[Move]:
+        """当前玩家可以出的牌。跟牌时第一个为空过"""
+        if self.last_owner == self.turn:
+            return lead_moves(self.hands[self.turn])
+        return follow_moves(self.hands[self.turn], self.last_bit)
+
+    def apply(self, move: Move) -> bool:
+        """
+        当前玩家出牌或空过。出完牌时不再轮转
+        @param move: 出牌，不检查是否合法
+        @return: 当前玩家是否出完了牌
+        """
+        self._events.append((move, self.turn, self.last_bit, self.last_owner))
+        bit, cards = move
+        if bit != PASS:
+            hand = self.hands[self.turn]
+            for c in cards:
+                hand[c - 1] -= 1
+            self.sizes[self.turn] -= len(cards)
+            self.last_bit, self.last_owner = bit, self.turn
+            if not self.sizes[self.turn]:
+                return True
+        self.turn = (self.turn + 1) % 3
+        return False
+
+    def undo(self) -> Move:
+        """
+        撤销最近一次apply
+        @return: 被撤销的出牌
+        """
+        move, self.turn, self.last_bit, self.last_owner = self._events.pop()
+        cards = move[1]
+        if cards:
+            hand = self.hands[self.turn]
+            for c in cards:
+                hand[c - 1] += 1
+            self.sizes[self.turn] += len(cards)
+        return move
+
+    def clone(self) -> GameState:
+        """复制当前状态，新状态的事件栈为空"""
+        state = GameState.__new__(GameState)
+        state.hands = [h[:] for h in self.hands]
+        state.sizes = self.sizes[:]
+        state.landlord = self.landlord
+        state.turn = self.turn
+        state.last_bit = self.last_bit
+        state.last_owner = self.last_owner
+        state._events = []
+        return state
+
+    def __eq__(self, other: GameState) -> bool:
+        return isinstance(other, GameState) and self.hands == other.hands and self.turn == other.turn and \
+            self.landlord == other.landlord and self.last_bit == other.last_bit and \
+            self.last_owner == other.last_owner
+
+    def __repr__(self) -> str:
+        return 'GameState(hands={}, landlord={}, turn={}, last_bit={}, last_owner={})'.format(
+            self.hands, self.landlord, self.turn, self.last_bit, self.last_owner)
+
+
+def play_out(state: GameState, policy: Policy) -> int:
+    """
+    不经过玩家对象与观察者，按策略把牌局模拟到终局
+    @param state: 牌局状态，会被修改
+    @param policy: 所有座位共用的策略
+    @return: 出完牌的玩家的座位
+    """
+    while not state.apply(policy(state)):
+        pass
+    return state.turn
+
@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+"""
+并行锦标赛模块。
+将对局分批分发到进程池中，每一批使用独立的随机种子；座位（以及先叫地主的顺序）在各局之间轮换。
+统计候选智能体与基准智能体的胜率及置信区间，胜负已在统计上确定时提前停止。
+
+复式模式（类似复式桥牌）：同一副牌打3次，候选智能体依次坐在每个座位上，
+以每副牌上的胜率差作为配对差值，消除了发牌运气带来的方差。
+@author: 江胤佐
+"""
+from __future__ import annotations
+
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor, Future
+from functools import partial
+from math import sqrt
+from typing import Callable, List, Tuple, Dict, Optional, Iterator
+
+import numpy as np
+
+from duguai.ai.q_learning import RandomAgent, QLExecuteAgent, load_q_table, PlayQLHelper, FollowQLHelper
+from .deal import DealGenerator
+from .game_env import GameEnv
+from .robot import Robot
+
+AgentFactory = Callable[[], Robot.Agent]
+
+# 每个进程中缓存的Q表，避免同一进程重复加载
+_Q_TABLE_CACHE: Dict[Tuple[str, str], Tuple[np.ndarray, np.ndarray]] = {}
+
+# 每局结果的列：候选智能体是否获胜，基准智能体的平均获胜情况，候选智能体是否为地主
+WIN, BASE_WIN, LANDLORD = 0, 1, 2
+
+# 复式模式下每副牌的对局次数
+DUPLICATE_ROTATIONS = 3
+
+
+def random_agent() -> Robot.Agent:
+    """随机智能体工厂"""
+    return RandomAgent()
+
+
+def ql_execute_agent(play_q_table_path: str, follow_q_table_path: str) -> Robot.Agent:
+    """
+    查询Q表的智能体工厂。Q表以只读内存映射方式加载，同一台机器上的所有工作进程共享页缓存
+    @param play_q_table_path: 出牌Q表路径
+    @param follow_q_table_path: 跟牌Q表路径
+    """
+    key = (play_q_table_path, follow_q_table_path)
+    if key not in _Q_TABLE_CACHE:
+        _Q_TABLE_CACHE[key] = (
+            load_q_table(play_q_table_path, PlayQLHelper.STATE_LEN, PlayQLHelper.ACTION_LEN, mmap_mode='r'),
+            load_q_table(follow_q_table_path, FollowQLHelper.STATE_LEN, FollowQLHelper.ACTION_LEN, mmap_mode='r')
+        )
+    return QLExecuteAgent(*_Q_TABLE_CACHE[key])
+
+
+def ql_agent_factory(play_q_table_path: str, follow_q_table_path: str) -> AgentFactory:
+    """返回可以被pickle、传给工作进程的Q表智能体工厂"""
+    return partial(ql_execute_agent, play_q_table_path, follow_q_table_path)
+
+
+def batch_seed(seed: int, batch_id: int) -> int:
+    """由全局种子和批次编号得到该批次的随机种子"""
+    return (seed * 1000003 + batch_id) % (2 ** 32)
+
+
+def seed_all(seed: int) -> None:
+    """同时设置random与numpy的全局随机种子（GameEnv与各智能体均使用这两个随机数生成器）"""
+    random.seed(seed)
+    np.random.seed(seed)
+
+
+def board_deals(seed: int) -> Iterator[List[np.ndarray]]:
+    """
+    由种子确定的发牌序列。同一个种子总是得到相同的序列，包括无人叫地主时的重新发牌
+    @param seed: 随机种子
+    @return: 供GameEnv.set_deals使用的迭代器
+    """
+    # 大多数牌局不需要重新发牌，每批只生成少量几副
+    return DealGenerator(seed, batch_size=4)
+
+
+def _create_players(game_env: GameEnv, candidate: AgentFactory, baseline: AgentFactory) -> List[Robot]:
+    return [Robot(game_env, candidate(), 'candidate'),
+            Robot(game_env, baseline(), 'baseline1'),
+            Robot(game_env, baseline(), 'baseline2')]
+
+
+def _play_seated(game_env: GameEnv, players: List[Robot], seat: int, result: np.ndarray) -> None:
+    """候选智能体坐在seat号座位上进行一局，并把结果写入result"""
+    game_env.add_players(*(players[(j - seat) % 3] for j in range(3)))
+    game_env.start()
+
+    victors = game_env.victors
+    result[WIN] = seat in victors
+    result[BASE_WIN] = sum(j in victors for j in range(3) if j != seat) / 2
+    result[LANDLORD] = game_env.landlord == seat
+
+
+def play_batch(candidate: AgentFactory, baseline: AgentFactory, seed: int, first_game: int, games: int) -> np.ndarray:
+    """
+    在当前进程中进行一批对局。候选智能体所在的座位随对局编号轮换。
+    @param candidate: 候选智能体工厂
+    @param baseline: 基准智能体工厂，占据另外两个座位
+    @param seed: 该批次的随机种子
+    @param first_game: 该批次第一局的全局编号，用于确定座位
+    @param games: 对局数
+    @return: shape为(games, 3)的数组，列含义见 WIN, BASE_WIN, LANDLORD
+    """
+    seed_all(seed)
+    game_env = GameEnv(headless=True, shuffle_seats=False)
+    game_env.set_deals(DealGenerator(seed, batch_size=2 * games))
+    players = _create_players(game_env, candidate, baseline)
+
+    result = np.zeros((games, 3))
+    for i in range(games):
+        _play_seated(game_env, players, (first_game + i) % 3, result[i])
+    return result
+
+
+def play_duplicate_batch(candidate: AgentFactory, baseline: AgentFactory, seed: int, first_board: int,
+                         boards: int) -> np.ndarray:
+    """
+    在当前进程中以复式模式进行一批对局。每副牌打 DUPLICATE_ROTATIONS 次，候选智能体依次坐在每个座位上。
+    @param candidate: 候选智能体工厂
+    @param baseline: 基准智能体工厂
+    @param seed: 该批次的随机种子
+    @param first_board: 该批次第一副牌的全局编号（仅为与play_batch保持相同的签名）
+    @param boards: 牌副数
+    @return: shape为(boards * DUPLICATE_ROTATIONS, 3)的数组，同一副牌的结果相邻
+    """
+    game_env = GameEnv(headless=True, shuffle_seats=False)
+    players = _create_players(game_env, candidate, baseline)
+
+    result = np.zeros((boards * DUPLICATE_ROTATIONS, 3))
+    for i in range(boards):
+        board_seed = batch_seed(seed, i)
+        for seat in range(DUPLICATE_ROTATIONS):
+            seed_all(board_seed)
+            game_env.set_deals(board_deals(board_seed))
+            _play_seated(game_env, players, seat, result[i * DUPLICATE_ROTATIONS + seat])
+    return result
+
+
+def wilson_interval(wins: float, n: int, z: float = 1.96) -> Tuple[float, float]:
+    """
+    胜率的Wilson置信区间
+    @param wins: 获胜次数
+    @param n: 对局数
+    @param z: 正态分布分位数
+    """
+    if n == 0:
+        return 0., 1.
+    p = wins / n
+    denominator = 1 + z * z / n
+    center = (p + z * z / (2 * n)) / denominator
+    half = z * sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denominator
+    return max(center - half, 0.), min(center + half, 1.)
+
+
+class TournamentResult:
+    """
+    锦标赛结果。差值为每一局 候选智能体是否获胜 - 基准智能体平均获胜情况，
+    其均值大于0说明候选智能体更强。复式模式下差值按每副牌取平均，作为配对差值。
+    """
+
+    def __init__(self, games: np.ndarray, z: float, rotations: int = 1):
+        """
+        @param games: 每局结果，列含义见 WIN, BASE_WIN, LANDLORD
+        @param z: 正态分布分位数
+        @param rotations: 每副牌的对局次数。普通模式为1，复式模式为 DUPLICATE_ROTATIONS
+        """
+        self.games: np.ndarray = games
+        self.z = z
+        self.rotations = rotations
+
+    @property
+    def n(self) -> int:
+        """对局数"""
+        return len(self.games)
+
+    @property
+    def diff(self) -> np.ndarray:
+        """每副牌的得分差值"""
+        diff = self.games[:, WIN] - self.games[:, BASE_WIN]
+        return diff.reshape(-1, self.rotations).mean(axis=1)
+
+    def diff_interval(self) -> Tuple[float, float, float]:
+        """
+        @return: 得分差值的均值及其置信区间
+        """
+        diff = self.diff
+        if diff.size < 2:
+            return 0., -1., 1.
+        mean = float(np.mean(diff))
+        half = self.z * float(np.std(diff, ddof=1)) / sqrt(diff.size)
+        return mean, mean - half, mean + half
+
+    @property
+    def decided(self) -> bool:
+        """置信区间不含0时，认为胜负已确定"""
+        mean, low, high = self.diff_interval()
+        return low > 0 or high < 0
+
+    def report(self) -> List[str]:
+        """生成结果报告"""
+        lines = ['对局数: %d' % self.n]
+        if self.rotations > 1:
+            lines.append('复式牌副数: %d' % (self.n // self.rotations))
+        landlord = self.games[:, LANDLORD] == 1
+        for name, wins, n in (('候选智能体', self.games[:, WIN].sum(), self.n),
+                              ('候选智能体(地主)', self.games[landlord, WIN].sum(), int(landlord.sum())),
+                              ('候选智能体(农民)', self.games[~landlord, WIN].sum(), int((~landlord).sum())),
+                              ('基准智能体', self.games[:, BASE_WIN].sum(), self.n)):
+            low, high = wilson_interval(wins, n, self.z)
+            lines.append('{} 胜率: {:.2%}  置信区间: [{:.2%}, {:.2%}]'.format(name, wins / n if n else 0, low, high))
+        mean, low, high = self.diff_interval()
+        lines.append('胜率差: {:+.2%}  置信区间: [{:+.2%}, {:+.2%}]  {}'.format(
+            mean, low, high, '已确定' if self.decided else '未确定'))
+        return lines
+
+
+def run_tournament(candidate: AgentFactory,
+                   baseline: AgentFactory,
+                   max_games: int = 10000,
+                   min_games: int = 300,
+                   batch_size: int = 50,
+                   workers: Optional[int] = None,
+                   seed: int = 0,
+                   z: float = 2.576,
+                   duplicate: bool = False) -> TournamentResult:
+    """
+    并行进行锦标赛，一旦胜率差的置信区间不含0则提前停止。
+    批次结果按提交顺序汇总，因此相同的种子总能得到相同的结果。
+    @param candidate: 候选智能体工厂（需可被pickle，例如模块级函数或partial）
+    @param baseline: 基准智能体工厂
+    @param max_games: 最大对局数
+    @param min_games: 允许提前停止前的最少对局数
+    @param batch_size: 每批对局数（复式模式下为牌副数），同时也是检查是否提前停止的粒度
+    @param workers: 进程数，默认为CPU核数
+    @param seed: 全局随机种子
+    @param z: 置信区间使用的正态分布分位数。多次检查会放大犯错概率，因此默认取99%的分位数
+    @param duplicate: 是否使用复式模式
+    @return: 锦标赛结果
+    """
+    rotations = DUPLICATE_ROTATIONS if duplicate else 1
+    play = play_duplicate_batch if duplicate else play_batch
+    max_games //= rotations
+    min_games //= rotations
+
+    n_batches = (max_games + batch_size - 1) // batch_size
+    workers = workers or os.cpu_count() or 1
+    max_pending = 2 * workers
+    results: List[np.ndarray] = []
+    with ProcessPoolExecutor(workers) as executor:
+        pending: List[Future] = []
+        next_batch = 0
+        while next_batch < n_batches or pending:
+            while next_batch < n_batches and len(pending) < max_pending:
+                first_game = next_batch * batch_size
+                games = min(batch_size, max_games - first_game)
+                pending.append(executor.submit(play, candidate, baseline,
+                                               batch_seed(seed, next_batch), first_game, games))
+                next_batch += 1
+
+            results.append(pending.pop(0).result())
+            result = TournamentResult(np.concatenate(results), z, rotations)
+            if result.n >= min_games * rotations and result.decided:
+                for future in pending:
+                    future.cancel()
+                return result
+
+    return TournamentResult(np.concatenate(results) if results else np.zeros((0, 3)), z, rotations)
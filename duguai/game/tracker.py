@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""
+记牌器模块。
+GameEnv只保存当前手牌与上一次出牌，玩家无法高效地知道哪些牌已经出过、哪些牌还没见过。
+CardTracker由GameEnv在确定地主以及每次出牌、跟牌后更新，每次更新只改动打出的那几张牌的计数，保存：
+1. 每个玩家视角下未见过的牌（即两个对手手中所有牌）的数量向量；
+2. 每个玩家的出牌历史；
+3. 已知的约束：地主手中尚未打出的地主牌，以及玩家曾经空过的牌型（例如“对手没压一对9”）。
+空过约束假设玩家能压就压，只在面对对手的出牌时记录；手牌只会减少，因此空过时压不过的牌型之后仍然压不过（不考虑炸弹）。
+sample_hands可按这些信息随机分配对手的手牌，供搜索类、推断类AI使用。
+@author: 江胤佐
+"""
+from __future__ import annotations
+
+import random
+from typing import List, Sequence, Tuple, Optional, NamedTuple
+
+import numpy as np
+
+from ..card.combo import PASS, ROCKET_BIT
+from ..card.moves import Move, FULL_COUNTS, to_counts, to_cards, follow_moves
+
+Counts = List[int]
+
+
+class SearchInfo(NamedTuple):
+    """
+    搜索者在决策时可以得到的公开信息
+    """
+    # 自己手牌的数量向量
+    hand: Tuple[int, ...]
+    # 两个对手手中所有牌的数量向量
+    unseen: Tuple[int, ...]
+    # 三个座位的手牌数
+    sizes: Tuple[int, int, int]
+    # 搜索者的座位
+    turn: int
+    landlord: int
+    # 需要压过的牌的bit_info及出牌者。先手出牌时last_owner == turn
+    last_bit: int
+    last_owner: int
+    # 三个座位手中公开可知的牌，以及面对对手出牌时空过的牌型
+    known: Tuple[Tuple[int, ...], ...] = ((0,) * 15,) * 3
+    passes: Tuple[Tuple[int, ...], ...] = ((), (), ())
+
+
+def can_beat(counts: Sequence[int], last_bit: int) -> bool:
+    """
+    不用炸弹、王炸时能否压过last_bit
+    @param counts: 手牌的数量向量
+    @param last_bit: 需要压过的牌的bit_info
+    """
+    if last_bit == ROCKET_BIT or (last_bit // 100 % 10 == 4 and not last_bit // 100000):
+        return False
+    return any(bit and bit // 100 != 14 for bit, _ in follow_moves(counts, last_bit)[1:])
+
+
+def sample_consistent(own: int,
+                      unseen: Sequence[int],
+                      sizes: Sequence[int],
+                      known: Sequence[Sequence[int]],
+                      passes: Sequence[Sequence[int]],
+                      rng: random.Random,
+                      max_tries: int = 16) -> Tuple[Counts, Counts]:
+    """
+    随机分配两个对手的手牌，使之满足已知的约束
+    @param own: 视角玩家的座位
+    @param unseen: 视角玩家未见过的牌的数量向量
+    @param sizes: 三个座位的手牌数
+    @param known: 三个座位手中已知的牌的数量向量
+    @param passes: 三个座位曾经空过的牌型的bit_info
+    @param rng: 随机数生成器
+    @param max_tries: 拒绝采样的最大次数。都不满足空过约束时返回最后一次采样的结果
+    @return: 下家、上家的手牌数量向量
+    """
+    n, p = (own + 1) % 3, (own + 2) % 3
+    free = list(unseen)
+    for seat in (n, p):
+        for i, c in enumerate(known[seat]):
+            free[i] -= c
+    pool = to_cards(free)
+    need = sizes[n] - sum(known[n])
+
+    hand_n = hand_p = []
+    for _ in range(max_tries):
+        rng.shuffle(pool)
+        hand_n, hand_p = list(known[n]), list(known[p])
+        for c in pool[:need]:
+            hand_n[c - 1] += 1
+        for c in pool[need:]:
+            hand_p[c - 1] += 1
+        if not any(can_beat(hand_n, bit) for bit in passes[n]) and \
+                not any(can_beat(hand_p, bit) for bit in passes[p]):
+            break
+    return hand_n, hand_p
+
+
+class CardTracker:
+    """
+    记牌器。保存每个座位的真实手牌计数，对外只提供各玩家视角下可以知道的信息
+    """
+
+    def __init__(self):
+        self._hands: List[Counts] = [[0] * 15 for _ in range(3)]
+        self._unseen: List[Counts] = [list(FULL_COUNTS) for _ in range(3)]
+        self._played: List[Counts] = [[0] * 15 for _ in range(3)]
+        self._known: List[Counts] = [[0] * 15 for _ in range(3)]
+        self._history: List[List[Move]] = [[], [], []]
+        self._passes: List[List[int]] = [[], [], []]
+        self._sizes: List[int] = [0, 0, 0]
+        self.landlord: int = -1
+        self._last_bit: int = PASS
+        self._last_owner: int = -1
+
+    def start(self, hands: Sequence[np.ndarray], landlord_cards: np.ndarray, landlord: int) -> None:
+        """
+        确定地主后重置记牌器
+        @param hands: 三个座位的手牌（地主的手牌已包含地主牌）
+        @param landlord_cards: 3张地主牌
+        @param landlord: 地主的座位
+        """
+        self.landlord = landlord
+        for i in range(3):
+            self._hands[i] = to_counts(hands[i])
+            self._unseen[i] = [full - c for full, c in zip(FULL_COUNTS, self._hands[i])]
+            self._played[i] = [0] * 15
+            self._known[i] = [0] * 15
+            self._history[i] = []
+            self._passes[i] = []
+            self._sizes[i] = len(hands[i])
+        self._known[landlord] = to_counts(landlord_cards)
+        self._last_bit, self._last_owner = PASS, landlord
+
+    def update(self, player: int, bit_info: int, cards: Sequence[int]) -> None:
+        """
+        记录一次出牌或跟牌
+        @param player: 出牌的座位
+        @param bit_info: 出牌的bit_info，空过为PASS
+        @param cards: 打出的牌，空过时为空
+        """
+        self._history[player].append((bit_info, tuple(int(c) for c in cards)))
+        if bit_info == PASS:
+            if (player == self.landlord) != (self._last_owner == self.landlord):
+                self._passes[player].append(self._last_bit)
+            return
+
+        hand, played, known = self._hands[player], self._played[player], self._known[player]
+        for c in cards:
+            hand[c - 1] -= 1
+            played[c - 1] += 1
+            if known[c - 1] > hand[c - 1]:
+                known[c - 1] = hand[c - 1]
+            for i in range(3):
+                if i != player:
+                    self._unseen[i][c - 1] -= 1
+        self._sizes[player] -= len(cards)
+        self._last_bit, self._last_owner = bit_info, player
+
+    def unseen(self, perspective: int) -> Counts:
+        """
+        某个玩家未见过的牌（两个对手手中所有牌）
+        @param perspective: 视角玩家的座位
+        @return: 数量向量
+        """
+        return list(self._unseen[perspective])
+
+    def played(self, player: int) -> Counts:
+        """某个玩家已打出的牌的数量向量"""
+        return list(self._played[player])
+
+    def known(self, player: int) -> Counts:
+        """某个玩家手中公开可知的牌（尚未打出的地主牌）的数量向量"""
+        return list(self._known[player])
+
+    def history(self, player: int) -> List[Move]:
+        """某个玩家按顺序的出牌历史，空过为PASS_MOVE"""
+        return list(self._history[player])
+
+    def passes(self, player: int) -> List[int]:
+        """某个玩家面对对手出牌时空过的牌型的bit_info"""
+        return list(self._passes[player])
+
+    @property
+    def sizes(self) -> Tuple[int, int, int]:
+        """三个座位的手牌数"""
+        return self._sizes[0], self._sizes[1], self._sizes[2]
+
+    def sample_hands(self, perspective: int, rng: Optional[random.Random] = None, max_tries: int = 16) \
+            -> List[Counts]:
+        """
+        在某个玩家的视角下随机分配两个对手的手牌，见sample_consistent
+        @param perspective: 视角玩家的座位
+        @param rng: 随机数生成器，默认使用random模块
+        @param max_tries: 拒绝采样的最大次数
+        @return: 三个座位的手牌数量向量，视角玩家的为其真实手牌
+        """
+        hand_n, hand_p = sample_consistent(perspective, self._unseen[perspective], self._sizes, self._known,
+                                           self._passes, rng or random.Random(random.getrandbits(32)), max_tries)
+        hands: List[Counts] = [[], [], []]
+        hands[perspective] = list(self._hands[perspective])
+        hands[(perspective + 1) % 3] = hand_n
+        hands[(perspective + 2) % 3] = hand_p
+        return hands
+
+    def search_info(self, seat: int, last_bit: int, last_owner: int, trust_passes: bool = False) -> SearchInfo:
+        """
+        某个玩家决策时可以得到的公开信息
+        @param seat: 决策玩家的座位
+        @param last_bit: 需要压过的牌的bit_info，先手出牌时为PASS
+        @param last_owner: last_bit的出牌者，先手出牌时为seat
+        @param trust_passes: 是否附带空过约束
+        """
+        return SearchInfo(tuple(self._hands[seat]), tuple(self._unseen[seat]), self.sizes, seat, self.landlord,
+                          last_bit, last_owner, tuple(tuple(k) for k in self._known),
+                          tuple(tuple(p) if trust_passes else () for p in self._passes))
@@ -2,10 +2,12 @@
 import logging
 import traceback
 
+from duguai import tracer
+
 
 def log_locals(err: Exception):
     """
-    调试时输出本地变量的值
+    调试时输出本地变量的值，以及抽样决策追踪的记录（见duguai.tracer）
     @param err: 异常
     """
     flag = True
@@ -23,3 +25,4 @@ def log_locals(err: Exception):
                 logging.error('{}: {}'.format(k, v.__dict__))
             else:
                 logging.error('{}: {}'.format(k, v))
+    tracer.log_active()
@@ -1,21 +1,57 @@
 # -*- coding: utf-8 -*-
 """
 斗地主程序的入口文件。
+python main.py [-P <性能分析输出前缀>] [-M] [-n <性能分析对局数>] [-H <指标端口>] [-S <N>] [-I <紧凑出牌Q表>]
+加上-P或-M时进入性能分析模式：三个AI对战n局（默认100局），见duguai.profiler
+加上-H时在 http://127.0.0.1:<指标端口>/metrics 暴露运行指标，见duguai.metrics
+加上-S时每N次决策抽样追踪1次，见duguai.tracer
+加上-I时用script/reachable_states.py生成的紧凑出牌Q表代替数据集中的出牌Q表，见duguai.ai.q_learning.PlayStateIndex
 """
 import logging
 import os
 import sys
+from getopt import getopt, GetoptError
 
 sys.path.append('..')
 
 if __name__ == '__main__':
-    from duguai.ai.q_learning import QLExecuteAgent, load_q_table, PlayQLHelper, FollowQLHelper
+    from duguai.profiler import Profiler
+    from duguai.ai.q_learning import QLExecuteAgent, load_q_table, PlayQLHelper, FollowQLHelper, load_compact_q_table
     from duguai.game.human import Human
     from duguai.game.robot import Robot
     from duguai.logger import log_locals
-    from duguai import mode, test, play_dataset, follow_dataset
+    from duguai import mode, test, play_dataset, follow_dataset, metrics, tracer
     from duguai.game.game_env import GameEnv
 
+    profile_prefix = None
+    profile_memory = False
+    profile_games = 100
+    metrics_port = None
+    trace_every = None
+    compact_file = None
+    try:
+        opts, args = getopt(sys.argv[1:], 'P:Mn:H:S:I:')
+        for opt, arg in opts:
+            if opt == '-P':
+                profile_prefix = arg
+            elif opt == '-M':
+                profile_memory = True
+            elif opt == '-n':
+                profile_games = int(arg)
+            elif opt == '-H':
+                metrics_port = int(arg)
+            elif opt == '-S':
+                trace_every = int(arg)
+            elif opt == '-I':
+                compact_file = arg
+    except (GetoptError, ValueError) as e:
+        print('python main.py [-P <profile_prefix>] [-M] [-n <profile_games>] [-H <metrics_port>] [-S <trace_every>] '
+              '[-I <compact_play_q_table_file>]')
+        sys.exit(2)
+    profiler = Profiler(profile_prefix or 'profile', cpu=profile_prefix is not None, memory=profile_memory)
+
+    if compact_file:
+        play_dataset = compact_file
     if not os.path.isfile(play_dataset) or not os.path.isfile(follow_dataset):
         print('找不到数据集', play_dataset, follow_dataset)
         exit(0)
@@ -23,24 +59,43 @@ if __name__ == '__main__':
     if mode == 'debug':
         logging.basicConfig(level=logging.DEBUG)
 
-    play_q_table = load_q_table(play_dataset, PlayQLHelper.STATE_LEN, PlayQLHelper.ACTION_LEN)
+    play_index = None
+    if compact_file:
+        play_q_table, play_index = load_compact_q_table(compact_file)
+    else:
+        play_q_table = load_q_table(play_dataset, PlayQLHelper.STATE_LEN, PlayQLHelper.ACTION_LEN)
     follow_q_table = load_q_table(follow_dataset, FollowQLHelper.STATE_LEN,
                                   FollowQLHelper.ACTION_LEN)
+    if metrics_port is not None:
+        metrics.start_server(metrics_port)
+        metrics.track_q_table('play', play_q_table)
+        metrics.track_q_table('follow', follow_q_table)
+    if trace_every is not None:
+        tracer.install(trace_every)
 
-    game_env = GameEnv()
+    game_env = GameEnv(headless=profiler.enabled)
     try:
-        if test == 'on':
-            robot0 = Robot(game_env, QLExecuteAgent(play_q_table, follow_q_table), 'ql0')
-            robot1 = Robot(game_env, QLExecuteAgent(play_q_table, follow_q_table), 'ql1')
-            robot2 = Robot(game_env, QLExecuteAgent(play_q_table, follow_q_table), 'ql2')
+        if profiler.enabled:
+            robot0 = Robot(game_env, QLExecuteAgent(play_q_table, follow_q_table, play_index), 'ql0')
+            robot1 = Robot(game_env, QLExecuteAgent(play_q_table, follow_q_table, play_index), 'ql1')
+            robot2 = Robot(game_env, QLExecuteAgent(play_q_table, follow_q_table, play_index), 'ql2')
+            game_env.add_players(robot0, robot1, robot2)
+            with profiler:
+                for i in range(profile_games):
+                    game_env.start()
+            print('性能分析报告:', profiler.prefix + '.txt')
+        elif test == 'on':
+            robot0 = Robot(game_env, QLExecuteAgent(play_q_table, follow_q_table, play_index), 'ql0')
+            robot1 = Robot(game_env, QLExecuteAgent(play_q_table, follow_q_table, play_index), 'ql1')
+            robot2 = Robot(game_env, QLExecuteAgent(play_q_table, follow_q_table, play_index), 'ql2')
             game_env.add_players(robot0, robot1, robot2)
             for i in range(100):
                 game_env.start()
             print('success!')
         else:
             human = Human(game_env, 'human')
-            robot1 = Robot(game_env, QLExecuteAgent(play_q_table, follow_q_table), 'ql1')
-            robot2 = Robot(game_env, QLExecuteAgent(play_q_table, follow_q_table), 'ql2')
+            robot1 = Robot(game_env, QLExecuteAgent(play_q_table, follow_q_table, play_index), 'ql1')
+            robot2 = Robot(game_env, QLExecuteAgent(play_q_table, follow_q_table, play_index), 'ql2')
             game_env.add_players(human, robot1, robot2)
 
             game_env.start()
@@ -56,4 +111,6 @@ if __name__ == '__main__':
         logging.exception(e)
         if mode == 'debug':
             log_locals(e)
+        else:
+            tracer.log_active()
         exit(0)
@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+"""
+运行指标模块。长时间训练或对局时，main.py与script目录下的脚本加上 -H <端口> 后，
+在 http://127.0.0.1:<端口>/metrics 以Prometheus文本格式暴露以下指标（只使用标准库）：
+1. duguai_games_total：结束的对局数；
+2. duguai_decisions_total{kind}：AI的出牌、跟牌决策数，每秒决策数用 rate(duguai_decisions_total[1m]) 计算；
+3. duguai_stage_seconds{stage}：各阶段耗时的直方图。decompose为拆牌，provide为提供状态与动作（含拆牌），exec为智能体挑选动作；
+4. duguai_follow_prechecks_total{result}：跟牌预检查的次数，result="hit"表示跳过了拆牌，用于计算命中率；
+5. duguai_q_table_bytes{table}：Q表占用的内存；
+6. duguai_landlord_calls_total{called}：叫地主、不叫的次数。
+开启了抽样决策追踪时，GET /trace 返回追踪记录，见duguai.tracer。
+未调用start_server时enabled为False，各处只多一次布尔判断。
+@author: 江胤佐
+"""
+from __future__ import annotations
+
+import threading
+from abc import ABCMeta, abstractmethod
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Tuple, Sequence, List, Optional, Callable
+
+from duguai import tracer
+
+# 是否记录指标
+enabled: bool = False
+
+# 耗时直方图默认的桶上界（秒）
+LATENCY_BUCKETS: Tuple[float, ...] = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                                      0.25, 1.)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = ['{}="{}"'.format(k, v) for k, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Metric(metaclass=ABCMeta):
+    """指标的基类。每组标签取值对应一个时间序列"""
+    TYPE = ''
+
+    def __init__(self, name: str, doc: str, labels: Sequence[str] = ()):
+        """
+        @param name: 指标名
+        @param doc: 说明，输出为HELP行
+        @param labels: 标签名
+        """
+        self.name = name
+        self.doc = doc
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    @abstractmethod
+    def samples(self) -> List[str]:
+        """时间序列的文本行"""
+        pass
+
+    def render(self) -> str:
+        """HELP、TYPE行以及所有时间序列"""
+        lines = ['# HELP {} {}'.format(self.name, self.doc), '# TYPE {} {}'.format(self.name, self.TYPE)]
+        lines.extend(self.samples())
+        return '\n'.join(lines) + '\n'
+
+
+class Counter(_Metric):
+    """只增不减的计数器"""
+    TYPE = 'counter'
+
+    def __init__(self, name: str, doc: str, labels: Sequence[str] = ()):
+        super().__init__(name, doc, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        """
+        @param label_values: 各标签的取值
+        @param amount: 增加的数量
+        """
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def get(self, *label_values: str) -> float:
+        """某组标签取值的当前值"""
+        return self._values.get(label_values, 0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return ['{}{} {}'.format(self.name, _format_labels(self.labels, k), _format_value(v)) for k, v in items]
+
+
+class Gauge(_Metric):
+    """可增可减的值。也可以设置为在抓取时调用的函数"""
+    TYPE = 'gauge'
+
+    def __init__(self, name: str, doc: str, labels: Sequence[str] = ()):
+        super().__init__(name, doc, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._functions: Dict[Tuple[str, ...], Callable[[], float]] = {}
+
+    def set(self, value: float, *label_values: str) -> None:
+        """
+        @param value: 新的值
+        @param label_values: 各标签的取值
+        """
+        with self._lock:
+            self._values[label_values] = value
+
+    def set_function(self, func: Callable[[], float], *label_values: str) -> None:
+        """
+        @param func: 抓取时调用，返回当前值
+        @param label_values: 各标签的取值
+        """
+        with self._lock:
+            self._functions[label_values] = func
+
+    def get(self, *label_values: str) -> float:
+        """某组标签取值的当前值"""
+        func = self._functions.get(label_values)
+        return func() if func is not None else self._values.get(label_values, 0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            keys = sorted(set(self._values) | set(self._functions))
+        return ['{}{} {}'.format(self.name, _format_labels(self.labels, k), _format_value(self.get(*k)))
+                for k in keys]
+
+
+class Histogram(_Metric):
+    """直方图。输出各桶的累计计数、总和与总数"""
+    TYPE = 'histogram'
+
+    def __init__(self, name: str, doc: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        """
+        @param buckets: 从小到大排列的桶上界，不含+Inf
+        """
+        super().__init__(name, doc, labels)
+        self.buckets = tuple(buckets)
+        # 每组标签取值：[各桶（含+Inf）的计数], 总和
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        """
+        @param value: 观测值
+        @param label_values: 各标签的取值
+        """
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = ([0] * (len(self.buckets) + 1), [0.])
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1][0] += value
+
+    def count(self, *label_values: str) -> int:
+        """某组标签取值的观测次数"""
+        series = self._series.get(label_values)
+        return sum(series[0]) if series else 0
+
+    def samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            items = sorted((k, (counts[:], total[0])) for k, (counts, total) in self._series.items())
+        for k, (counts, total) in items:
+            cumulative = 0
+            for bound, c in zip(self.buckets + (float('inf'),), counts):
+                cumulative += c
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append('{}_bucket{} {}'.format(self.name, _format_labels(self.labels, k, 'le="%s"' % le),
+                                                     cumulative))
+            lines.append('{}_sum{} {}'.format(self.name, _format_labels(self.labels, k), repr(total)))
+            lines.append('{}_count{} {}'.format(self.name, _format_labels(self.labels, k), cumulative))
+        return lines
+
+
+class Registry:
+    """指标的集合"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _add(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError('指标{}已存在'.format(metric.name))
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, doc: str, labels: Sequence[str] = ()) -> Counter:
+        """注册一个计数器"""
+        return self._add(Counter(name, doc, labels))
+
+    def gauge(self, name: str, doc: str, labels: Sequence[str] = ()) -> Gauge:
+        """注册一个Gauge"""
+        return self._add(Gauge(name, doc, labels))
+
+    def histogram(self, name: str, doc: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        """注册一个直方图"""
+        return self._add(Histogram(name, doc, labels, buckets))
+
+    def render(self) -> str:
+        """Prometheus文本格式的所有指标"""
+        return ''.join(m.render() for m in self._metrics.values())
+
+
+REGISTRY = Registry()
+
+GAMES = REGISTRY.counter('duguai_games_total', '结束的对局数')
+DECISIONS = REGISTRY.counter('duguai_decisions_total', 'AI的决策数', ('kind',))
+STAGE_SECONDS = REGISTRY.histogram('duguai_stage_seconds', '各阶段的耗时（秒）', ('stage',))
+FOLLOW_PRECHECKS = REGISTRY.counter('duguai_follow_prechecks_total', '跟牌预检查的次数', ('result',))
+Q_TABLE_BYTES = REGISTRY.gauge('duguai_q_table_bytes', 'Q表占用的内存（字节）', ('table',))
+LANDLORD_CALLS = REGISTRY.counter('duguai_landlord_calls_total', '叫地主的次数', ('called',))
+
+
+def track_q_table(table: str, q_table) -> None:
+    """
+    在duguai_q_table_bytes中暴露Q表或模型占用的内存，抓取时读取其nbytes
+    @param table: 标签table的取值，如play、follow
+    @param q_table: 有nbytes属性的对象
+    """
+    Q_TABLE_BYTES.set_function(lambda: q_table.nbytes, table)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    registry: Registry = REGISTRY
+
+    def do_GET(self):
+        path = self.path.split('?')[0]
+        if path == '/metrics':
+            body = self.registry.render()
+        elif path == '/trace' and tracer.active is not None:
+            # 抽样决策追踪的记录，见duguai.tracer
+            body = '\n'.join(tracer.active.format()) + '\n'
+        else:
+            self.send_error(404)
+            return
+        body = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(port: int, host: str = '127.0.0.1', registry: Optional[Registry] = None) -> ThreadingHTTPServer:
+    """
+    在后台线程中启动指标服务，并开始记录指标
+    @param port: 端口，为0时由系统分配（见返回值的server_address）
+    @param host: 监听的地址，默认只监听本机
+    @param registry: 暴露的指标集合，默认为REGISTRY
+    @return: HTTP服务，调用shutdown()停止
+    """
+    global enabled
+    handler = type('Handler', (_Handler,), {'registry': registry or REGISTRY})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+    enabled = True
+    return server
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+性能分析模块。main.py与script目录下的脚本加上 -P <输出前缀> 后在Profiler中运行：
+1. cProfile：输出 <前缀>.pstats（可用pstats、snakeviz等工具打开），并在报告中列出按累计时间、自身时间排序的热点函数；
+2. tracemalloc（加上 -M 时开启）：在报告中按模块列出结束时仍未释放的内存最多的代码行。
+   快照在结束时取得，只包含运行期间分配、结束时仍存活的内存；运行中分配后又释放的临时对象不会出现在各行统计中，
+   只体现在内存峰值里。
+报告写入 <前缀>.txt。
+@author: 江胤佐
+"""
+from __future__ import annotations
+
+import cProfile
+import io
+import os
+import pstats
+import tracemalloc
+from typing import Optional, Sequence, List, Tuple
+
+# 内存分配报告默认覆盖的模块
+PROFILE_MODULES: Tuple[str, ...] = ('duguai.ai.decompose', 'duguai.card', 'duguai.game')
+
+
+def module_of(file_name: str) -> str:
+    """
+    由源文件路径得到duguai包中的模块名
+    @param file_name: 源文件路径
+    @return: 模块名，如duguai.card.combo。不在duguai包中时返回空字符串
+    """
+    parts = os.path.normpath(file_name).split(os.sep)
+    if 'duguai' not in parts:
+        return ''
+    parts = parts[len(parts) - 1 - parts[::-1].index('duguai'):]
+    parts[-1] = os.path.splitext(parts[-1])[0]
+    if parts[-1] == '__init__':
+        parts.pop()
+    return '.'.join(parts)
+
+
+class Profiler:
+    """
+    性能分析的上下文管理器。cpu与memory均为False时什么也不做
+    """
+
+    def __init__(self, prefix: str, cpu: bool = True, memory: bool = False, top: int = 30,
+                 modules: Sequence[str] = PROFILE_MODULES, frames: int = 1):
+        """
+        @param prefix: 输出文件的前缀
+        @param cpu: 是否开启cProfile
+        @param memory: 是否开启tracemalloc
+        @param top: 每一项报告列出的条数
+        @param modules: 内存分配报告覆盖的模块（含子模块）
+        @param frames: tracemalloc保存的栈帧数
+        """
+        self.prefix = prefix
+        self._top = top
+        self._modules = tuple(modules)
+        self._frames = frames
+        self._profile: Optional[cProfile.Profile] = cProfile.Profile() if cpu else None
+        self._memory = memory
+        self._snapshot: Optional[tracemalloc.Snapshot] = None
+        self._peak: int = 0
+
+    def __enter__(self) -> Profiler:
+        if self._memory:
+            tracemalloc.start(self._frames)
+        if self._profile is not None:
+            self._profile.enable()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        if self._profile is not None:
+            self._profile.disable()
+        if self._memory:
+            self._snapshot = tracemalloc.take_snapshot()
+            self._peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        if self.enabled:
+            self.save()
+
+    @property
+    def enabled(self) -> bool:
+        """是否开启了任意一种分析"""
+        return self._profile is not None or self._memory
+
+    def cpu_report(self) -> str:
+        """按累计时间、自身时间排序的热点函数"""
+        if self._profile is None:
+            return ''
+        stream = io.StringIO()
+        stats = pstats.Stats(self._profile, stream=stream)
+        for key in ('cumulative', 'tottime'):
+            stream.write('======== CPU热点（按{}排序） ========\n'.format(key))
+            stats.sort_stats(key).print_stats(self._top)
+        return stream.getvalue()
+
+    def memory_stats(self) -> List[Tuple[str, List[tracemalloc.Statistic]]]:
+        """
+        各模块的内存分配统计
+        @return: [(模块名, 按分配大小从大到小排列的各代码行统计)]
+        """
+        if self._snapshot is None:
+            return []
+        by_module = {m: [] for m in self._modules}
+        for stat in self._snapshot.statistics('lineno'):
+            name = module_of(stat.traceback[0].filename)
+            for m in self._modules:
+                if name == m or name.startswith(m + '.'):
+                    by_module[m].append(stat)
+                    break
+        return [(m, by_module[m]) for m in self._modules]
+
+    def memory_report(self) -> str:
+        """按模块列出的内存分配报告"""
+        if self._snapshot is None:
+            return ''
+        lines = ['======== 内存峰值 {:.1f} KiB ========'.format(self._peak / 1024),
+                 '以下只统计结束时仍未释放的内存，运行中已释放的临时分配只计入峰值']
+        for m, stats in self.memory_stats():
+            lines.append('======== 结束时仍未释放的内存（{}，共 {:.1f} KiB） ========'.format(
+                m, sum(s.size for s in stats) / 1024))
+            for s in stats[:self._top]:
+                frame = s.traceback[0]
+                lines.append('{:>10.1f} KiB {:>8d}次  {}:{}'.format(
+                    s.size / 1024, s.count, module_of(frame.filename), frame.lineno))
+        return '\n'.join(lines) + '\n'
+
+    def save(self) -> None:
+        """写出 <前缀>.pstats 与 <前缀>.txt"""
+        if self._profile is not None:
+            self._profile.dump_stats(self.prefix + '.pstats')
+        with open(self.prefix + '.txt', 'w', encoding='utf-8') as f:
+            f.write(self.cpu_report())
+            f.write(self.memory_report())
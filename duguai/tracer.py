@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+抽样决策追踪模块。
+mode为debug时QLExecuteAgent.exec逐个动作拼接字符串写日志，负载下慢得无法使用；不是debug时又什么也不记录。
+DecisionTracer每N次决策抽取1次，写入预先分配好的环形缓冲区（numpy结构化数组，写满后覆盖最旧的记录），
+每条记录包含状态在Q表中的行号、动作位掩码、选择的动作、各动作的Q值以及拆牌并提供状态、动作的耗时。
+缓冲区可以随时导出：
+1. dump 保存为.npy文件，format 转换为文本；
+2. 指标服务（见duguai.metrics）开启时，GET /trace 返回文本；
+3. 发生异常时，duguai.logger.log_locals把缓冲区写入日志。
+main.py与script/q_learning.py加上 -S <N> 后开启。
+@author: 江胤佐
+"""
+from __future__ import annotations
+
+import logging
+from typing import Optional, List
+
+import numpy as np
+
+# Q值最多的动作数，即出牌的动作数
+MAX_ACTIONS = 17
+
+PLAY = 0
+FOLLOW = 1
+
+TRACE_DTYPE = np.dtype([('seq', np.int64),
+                        ('kind', np.int8),
+                        ('state', np.int64),
+                        ('mask', np.int64),
+                        ('action', np.int16),
+                        ('q', np.float32, (MAX_ACTIONS,)),
+                        ('latency', np.float32)])
+
+_KIND_VIEW = ('play', 'follow')
+
+
+class DecisionTracer:
+    """
+    抽样决策的环形缓冲区
+    """
+
+    def __init__(self, every: int = 100, capacity: int = 4096):
+        """
+        @param every: 每every次决策记录1次
+        @param capacity: 缓冲区的记录数
+        """
+        if every < 1 or capacity < 1:
+            raise ValueError('every与capacity必须为正整数')
+        self.every = every
+        self._buffer = np.zeros(capacity, dtype=TRACE_DTYPE)
+        self._buffer['q'] = np.nan
+
+        # 决策总数与已记录的条数
+        self.decisions: int = 0
+        self.recorded: int = 0
+
+    @property
+    def capacity(self) -> int:
+        """缓冲区的记录数"""
+        return self._buffer.size
+
+    def due(self) -> bool:
+        """
+        统计一次决策
+        @return: 这次决策是否需要记录
+        """
+        self.decisions += 1
+        return self.decisions % self.every == 0
+
+    def record(self, kind: int, state: int, mask: int, action: int, q_values: Optional[np.ndarray],
+               latency: float) -> None:
+        """
+        记录一次决策，覆盖最旧的记录
+        @param kind: PLAY 或 FOLLOW
+        @param state: 状态在Q表中的行号
+        @param mask: 动作位掩码
+        @param action: 选择的动作
+        @param q_values: 各动作的Q值，智能体没有Q值时为None
+        @param latency: 拆牌并提供状态、动作的耗时（秒）
+        """
+        entry = self._buffer[self.recorded % self._buffer.size]
+        entry['seq'] = self.decisions
+        entry['kind'] = kind
+        entry['state'] = state
+        entry['mask'] = mask
+        entry['action'] = action
+        entry['latency'] = latency
+        q = entry['q']
+        q[:] = np.nan
+        if q_values is not None:
+            q[:len(q_values)] = q_values
+        self.recorded += 1
+
+    def entries(self) -> np.ndarray:
+        """按时间先后排列的记录（副本）"""
+        n = self._buffer.size
+        if self.recorded <= n:
+            return self._buffer[:self.recorded].copy()
+        start = self.recorded % n
+        return np.concatenate([self._buffer[start:], self._buffer[:start]])
+
+    def format(self) -> List[str]:
+        """每条记录一行文本"""
+        lines = []
+        for e in self.entries():
+            q = ' '.join('{}:{:.2f}'.format(a, v) for a, v in enumerate(e['q']) if e['mask'] >> a & 1)
+            lines.append('#{} {} state={} mask={:#x} action={} latency={:.6f}s q=[{}]'.format(
+                e['seq'], _KIND_VIEW[e['kind']], e['state'], e['mask'], e['action'], e['latency'], q))
+        return lines
+
+    def dump(self, file_name: str) -> None:
+        """
+        保存为.npy文件，可用np.load读取
+        @param file_name: 文件名
+        """
+        np.save(file_name, self.entries())
+
+
+# 正在使用的追踪器，为None时不追踪
+active: Optional[DecisionTracer] = None
+
+
+def install(every: int = 100, capacity: int = 4096) -> DecisionTracer:
+    """
+    开始追踪决策
+    @param every: 每every次决策记录1次
+    @param capacity: 缓冲区的记录数
+    @return: 新的追踪器
+    """
+    global active
+    active = DecisionTracer(every, capacity)
+    return active
+
+
+def uninstall() -> None:
+    """停止追踪决策"""
+    global active
+    active = None
+
+
+def log_active() -> None:
+    """把正在使用的追踪器中的记录写入日志，没有时什么也不做"""
+    if active is None:
+        return
+    logging.error('最近%d条抽样决策（共%d次决策）:', min(active.recorded, active.capacity), active.decisions)
+    for line in active.format():
+        logging.error(line)
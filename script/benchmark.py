@@ -10,52 +10,210 @@ from getopt import getopt, GetoptError
 sys.path.append('..')
 
 
-def benchmark(play_q_table_path, follow_q_table_path):
+def ql_agent(play_q_table_path, follow_q_table_path, compact=False):
     """
-    基准测试
+    由Q表文件创建执行智能体
+    @param compact: play_q_table_path是否为reachable_states.py生成的紧凑出牌Q表
     """
-    play_q_table = load_q_table(play_q_table_path, PlayQLHelper.STATE_LEN, PlayQLHelper.ACTION_LEN)
+    play_index = None
+    if compact:
+        play_q_table, play_index = load_compact_q_table(play_q_table_path)
+    else:
+        play_q_table = load_q_table(play_q_table_path, PlayQLHelper.STATE_LEN, PlayQLHelper.ACTION_LEN)
     follow_q_table = load_q_table(follow_q_table_path, FollowQLHelper.STATE_LEN,
                                   FollowQLHelper.ACTION_LEN)
+    if metrics.enabled:
+        metrics.track_q_table('play', play_q_table)
+        metrics.track_q_table('follow', follow_q_table)
+    return QLExecuteAgent(play_q_table, follow_q_table, play_index)
+
 
-    ql_agent0 = QLExecuteAgent(play_q_table, follow_q_table)
+def benchmark(ql_agent0, record_file=None, games=1000, profiler=None):
+    """
+    基准测试
+    @param ql_agent0: 被测试的智能体
+    @param record_file: 对局记录文件，为None时不记录
+    @param games: 对局数
+    @param profiler: 性能分析器（见duguai.profiler），为None时不分析
+    """
     random_agent1 = RandomAgent()
 
-    game_env = GameEnv()
+    game_env = GameEnv(headless=True)
+    game_env.set_deals(DealGenerator())
 
     robot0 = Robot(game_env, ql_agent0, 'ql')
     robot1 = Robot(game_env, random_agent1, 'rand1')
     robot2 = Robot(game_env, random_agent1, 'rand2')
     game_env.add_players(robot0, robot1, robot2)
 
-    print('对战1000局')
-    for i in range(1000):
-        game_env.start()
+    recorder = GameRecorder(record_file) if record_file else None
+    game_env.set_recorder(recorder)
+
+    print('对战%d局' % games)
+    try:
+        with profiler or Profiler('', cpu=False):
+            for i in range(games):
+                game_env.start()
+    finally:
+        if recorder:
+            recorder.close()
 
     for r in (robot0, robot1, robot2):
         v1, v2 = r.victory_count
         print('{} 地主获胜场次: {}; 农民获胜场次: {}; 总计: {}'.format(r.name, v1, v2, v1 + v2))
 
 
+def win_rate(agent, games, seed):
+    """
+    对两个随机决策AI打games局，发牌由seed确定
+    @return: agent的胜率
+    """
+    game_env = GameEnv(headless=True)
+    game_env.set_deals(DealGenerator(seed))
+    robot0 = Robot(game_env, agent, 'ql')
+    game_env.add_players(robot0, Robot(game_env, RandomAgent(), 'rand1'), Robot(game_env, RandomAgent(), 'rand2'))
+    for i in range(games):
+        game_env.start()
+    return sum(robot0.victory_count) / games
+
+
+def games_to_target(training_agents, execute_agent, target, chunk=1000, eval_games=500, max_games=100000, seed=0):
+    """
+    从零开始自我对弈训练，每训练chunk局评估一次，直到对随机决策AI的胜率达到target
+    @param training_agents: 三个座位的训练智能体
+    @param execute_agent: 与训练智能体共用同一份Q表的执行智能体
+    @param target: 目标胜率
+    @param chunk: 两次评估之间的训练局数
+    @param eval_games: 每次评估的对局数
+    @param max_games: 最多训练的局数
+    @param seed: 随机种子。每次评估都使用同一组发牌
+    @return: 达到目标胜率时的训练局数，未达到时返回None
+    """
+    game_env = GameEnv(headless=True)
+    game_env.set_deals(DealGenerator(seed))
+    game_env.add_players(*(Robot(game_env, a, 'r%d' % i) for i, a in enumerate(training_agents)))
+
+    trained = 0
+    while trained < max_games:
+        for i in range(chunk):
+            game_env.start()
+        trained += chunk
+        rate = win_rate(execute_agent, eval_games, seed + 1)
+        print('训练 {} 局: 胜率 {:.3f}'.format(trained, rate))
+        if rate >= target:
+            return trained
+    return None
+
+
+def compare_games_to_target(target, lambda_, chunk, eval_games, max_games, seed):
+    """比较一步Q-Learning与Q(λ)达到目标胜率所需的训练局数（参数与q_learning.py相同：alpha=0.5, gamma=0.8）"""
+    results = {}
+    for name in ('Q-Learning', 'Q(λ)'):
+        play_q_table = np.zeros((PlayQLHelper.STATE_LEN, PlayQLHelper.ACTION_LEN))
+        follow_q_table = np.zeros((FollowQLHelper.STATE_LEN, FollowQLHelper.ACTION_LEN))
+        if name == 'Q-Learning':
+            agents = [QLTrainingAgent(play_q_table, follow_q_table, 0.5, 0.8) for _ in range(3)]
+        else:
+            agents = [QLambdaTrainingAgent(play_q_table, follow_q_table, 0.5, 0.8, lambda_) for _ in range(3)]
+        print(name)
+        seed_all(seed)
+        results[name] = games_to_target(agents, QLExecuteAgent(play_q_table, follow_q_table), target, chunk,
+                                        eval_games, max_games, seed)
+    for name, games in results.items():
+        print('{} 达到胜率 {} 所需训练局数: {}'.format(name, target, games if games else '超过%d' % max_games))
+
+
 if __name__ == '__main__':
     from duguai.game.robot import Robot
+    from duguai.game.deal import DealGenerator
     from duguai.game.game_env import GameEnv
-    from duguai.ai.q_learning import RandomAgent, load_q_table, PlayQLHelper, FollowQLHelper, QLExecuteAgent
+    from duguai.game.record import GameRecorder
+    import numpy as np
+    from duguai.ai.q_learning import RandomAgent, load_q_table, PlayQLHelper, FollowQLHelper, QLExecuteAgent, \
+        QLTrainingAgent, QLambdaTrainingAgent, load_compact_q_table
+    from duguai.game.tournament import seed_all
+    from duguai.ai.linear import LinearQModel, LinearExecuteAgent
+    from duguai.profiler import Profiler
+    from duguai import metrics
 
     t = ''
+    _record_file = None
+    _games = 1000
+    _profile_prefix = None
+    _profile_memory = False
+    _linear_model_file = None
+    _target = None
+    _lambda = 0.8
+    _chunk = 1000
+    _eval_games = 500
+    _max_games = 100000
+    _seed = 0
+    _metrics_port = None
+    _compact_file = None
     try:
-        opts, args = getopt(sys.argv[1:], 't:')
+        opts, args = getopt(sys.argv[1:], 't:r:n:P:ML:T:l:c:e:m:s:H:I:')
         for opt, arg in opts:
             if opt == '-t':
                 t = arg
-    except GetoptError as e:
-        print('python benchmark.py -t <train_times>')
+            elif opt == '-r':
+                _record_file = arg
+            elif opt == '-n':
+                _games = int(arg)
+            elif opt == '-P':
+                _profile_prefix = arg
+            elif opt == '-M':
+                _profile_memory = True
+            elif opt == '-L':
+                _linear_model_file = arg
+            elif opt == '-T':
+                _target = float(arg)
+            elif opt == '-l':
+                _lambda = float(arg)
+            elif opt == '-c':
+                _chunk = int(arg)
+            elif opt == '-e':
+                _eval_games = int(arg)
+            elif opt == '-m':
+                _max_games = int(arg)
+            elif opt == '-s':
+                _seed = int(arg)
+            elif opt == '-H':
+                _metrics_port = int(arg)
+            elif opt == '-I':
+                _compact_file = arg
+    except (GetoptError, ValueError) as e:
+        print('python benchmark.py -t <train_times> [-r <record_file>] [-n <games>] [-P <profile_prefix>] [-M] '
+              '[-L <linear_model_file>] [-H <metrics_port>] [-I <compact_play_q_table_file>]')
+        print('python benchmark.py -T <target_win_rate> [-l <lambda>] [-c <chunk>] [-e <eval_games>] '
+              '[-m <max_games>] [-s <seed>]')
         sys.exit(2)
 
-    _play_q_table_path = '../dataset/play_q_table' + t + '.npy'
+    # 指定-H时在本机端口上暴露运行指标，见duguai.metrics
+    if _metrics_port is not None:
+        metrics.start_server(_metrics_port)
+
+    if _target is not None:
+        compare_games_to_target(_target, _lambda, _chunk, _eval_games, _max_games, _seed)
+        sys.exit(0)
+
+    _profiler = Profiler(_profile_prefix or 'profile', cpu=_profile_prefix is not None, memory=_profile_memory)
+    if _linear_model_file:
+        if os.path.isfile(_linear_model_file):
+            print('线性函数逼近AI vs 随机决策AI')
+            _linear_model = LinearQModel.load(_linear_model_file)
+            if metrics.enabled:
+                metrics.track_q_table('linear', _linear_model)
+            benchmark(LinearExecuteAgent(_linear_model), _record_file, _games, _profiler)
+        else:
+            print('模型文件不存在')
+        sys.exit(0)
+
+    # 指定-I时用紧凑出牌Q表代替 play_q_table<t>.npy
+    _play_q_table_path = _compact_file or '../dataset/play_q_table' + t + '.npy'
     _follow_q_table_path = '../dataset/follow_q_table' + t + '.npy'
     if os.path.isfile(_play_q_table_path) and os.path.isfile(_follow_q_table_path):
         print('训练了' + (t if t else '0') + '次的强化学习AI vs 随机决策AI')
-        benchmark(_play_q_table_path, _follow_q_table_path)
+        benchmark(ql_agent(_play_q_table_path, _follow_q_table_path, _compact_file is not None), _record_file, _games,
+                  _profiler)
     else:
         print('数据文件不存在')
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+把训练好的Q表编译为推理用的策略表
+@author: 江胤佐
+"""
+import os
+import sys
+from getopt import getopt, GetoptError
+
+sys.path.append('..')
+
+if __name__ == '__main__':
+    from duguai.ai.policy import CompiledPolicy, DEFAULT_TOLERANCE
+    from duguai.ai.q_learning import load_q_table, PlayQLHelper, FollowQLHelper, load_compact_q_table
+
+    t = ''
+    tolerance = DEFAULT_TOLERANCE
+    compact_file = None
+    try:
+        opts, args = getopt(sys.argv[1:], 't:e:I:')
+        for opt, arg in opts:
+            if opt == '-t':
+                t = arg
+            elif opt == '-e':
+                tolerance = float(arg)
+            elif opt == '-I':
+                compact_file = arg
+    except (GetoptError, ValueError) as e:
+        print('python compile_policy.py -t <train_times> [-e <tolerance>] [-I <compact_play_q_table_file>]')
+        sys.exit(2)
+
+    # 指定-I时把紧凑出牌Q表还原为完整Q表后编译
+    play_q_table_path = compact_file or '../dataset/play_q_table' + t + '.npy'
+    follow_q_table_path = '../dataset/follow_q_table' + t + '.npy'
+    if not os.path.isfile(play_q_table_path) or not os.path.isfile(follow_q_table_path):
+        print('数据文件不存在')
+        sys.exit(1)
+
+    if compact_file:
+        compact, play_index = load_compact_q_table(compact_file)
+        play_q_table = play_index.expand(compact)
+    else:
+        play_q_table = load_q_table(play_q_table_path, PlayQLHelper.STATE_LEN, PlayQLHelper.ACTION_LEN, mmap_mode='r')
+    policy = CompiledPolicy.compile(
+        play_q_table,
+        load_q_table(follow_q_table_path, FollowQLHelper.STATE_LEN, FollowQLHelper.ACTION_LEN, mmap_mode='r'),
+        tolerance)
+    policy_path = '../dataset/policy' + t + '.npz'
+    policy.save(policy_path)
+    print('策略表已保存到 {}，内存占用 {:.2f} MB，文件大小 {:.2f} MB'.format(
+        policy_path, policy.nbytes / 2 ** 20, os.path.getsize(policy_path) / 2 ** 20))
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+多桌游戏主机：在一个进程中同时为多名人类玩家开桌，人类玩家通过TCP或Unix套接字连接（如 nc localhost 9999）
+@author: 江胤佐
+"""
+import asyncio
+import os
+import sys
+from getopt import getopt, GetoptError
+from time import time
+
+sys.path.append('..')
+
+USAGE = 'python game_host.py -t <train_times> [-H <host>] [-p <port>] [-u <socket_path>] [-b <robot_tables>]'
+
+
+async def _serve(game_host, host: str, port: int, path: str):
+    if path:
+        await game_host.serve_unix(path)
+    else:
+        await game_host.serve_tcp(host, port)
+    print('游戏主机已在 {} 上启动'.format(game_host.sockets))
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await game_host.close()
+
+
+if __name__ == '__main__':
+    from duguai.game.host import GameHost
+    from duguai.game.tournament import ql_agent_factory
+
+    t = ''
+    host = '127.0.0.1'
+    port = 9999
+    path = ''
+    robot_tables = 0
+    try:
+        opts, args = getopt(sys.argv[1:], 't:H:p:u:b:')
+        for opt, arg in opts:
+            if opt == '-t':
+                t = arg
+            elif opt == '-H':
+                host = arg
+            elif opt == '-p':
+                port = int(arg)
+            elif opt == '-u':
+                path = arg
+            elif opt == '-b':
+                robot_tables = int(arg)
+    except (GetoptError, ValueError) as e:
+        print(USAGE)
+        sys.exit(2)
+
+    play_q_table_path = '../dataset/play_q_table' + t + '.npy'
+    follow_q_table_path = '../dataset/follow_q_table' + t + '.npy'
+    if not os.path.isfile(play_q_table_path) or not os.path.isfile(follow_q_table_path):
+        print('数据文件不存在')
+        sys.exit(1)
+
+    game_host = GameHost(ql_agent_factory(play_q_table_path, follow_q_table_path))
+    if robot_tables:
+        # 压力测试：同时运行多桌只有机器人的游戏，每桌一局
+        start_time = time()
+        asyncio.run(game_host.run_robot_tables(robot_tables, 1))
+        print('{} 桌共 {} 局，耗时 {:.2f} 秒'.format(robot_tables, game_host.game_count, time() - start_time))
+        sys.exit(0)
+
+    if path and os.path.exists(path):
+        os.remove(path)
+    try:
+        asyncio.run(_serve(game_host, host, port, path))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+启动本地批量推理服务，在Unix套接字上为多个游戏进程提供AI决策
+@author: 江胤佐
+"""
+import asyncio
+import os
+import sys
+from getopt import getopt, GetoptError
+
+sys.path.append('..')
+
+USAGE = 'python inference_server.py -t <train_times> [-u <socket_path>] [-w <window_ms>] [-b <max_batch>]'
+
+
+async def _serve(service, path: str):
+    async with service:
+        await service.serve_unix(path)
+        print('推理服务已在 {} 上启动'.format(path))
+        try:
+            await asyncio.Event().wait()
+        finally:
+            print('共回答 {} 个请求，{} 批'.format(service.request_count, service.batch_count))
+
+
+if __name__ == '__main__':
+    from duguai.ai.inference import InferenceService
+    from duguai.ai.q_learning import load_q_table, PlayQLHelper, FollowQLHelper
+
+    t = ''
+    path = '/tmp/duguai_inference.sock'
+    window = 1.
+    max_batch = 1024
+    try:
+        opts, args = getopt(sys.argv[1:], 't:u:w:b:')
+        for opt, arg in opts:
+            if opt == '-t':
+                t = arg
+            elif opt == '-u':
+                path = arg
+            elif opt == '-w':
+                window = float(arg)
+            elif opt == '-b':
+                max_batch = int(arg)
+    except (GetoptError, ValueError) as e:
+        print(USAGE)
+        sys.exit(2)
+
+    play_q_table_path = '../dataset/play_q_table' + t + '.npy'
+    follow_q_table_path = '../dataset/follow_q_table' + t + '.npy'
+    if not os.path.isfile(play_q_table_path) or not os.path.isfile(follow_q_table_path):
+        print('数据文件不存在')
+        sys.exit(1)
+
+    if os.path.exists(path):
+        os.remove(path)
+
+    inference_service = InferenceService(
+        load_q_table(play_q_table_path, PlayQLHelper.STATE_LEN, PlayQLHelper.ACTION_LEN, mmap_mode='r'),
+        load_q_table(follow_q_table_path, FollowQLHelper.STATE_LEN, FollowQLHelper.ACTION_LEN, mmap_mode='r'),
+        window=window / 1000, max_batch=max_batch)
+    try:
+        asyncio.run(_serve(inference_service, path))
+    except KeyboardInterrupt:
+        pass
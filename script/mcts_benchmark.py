@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+ISMCTS机器人基准测试脚本：测量模拟吞吐量，以及不同时间预算下对基准AI的胜率
+@author: 江胤佐
+"""
+import os
+import sys
+from getopt import getopt, GetoptError
+from time import time
+
+sys.path.append('..')
+
+USAGE = 'python mcts_benchmark.py [-b <budget_ms,...>] [-n <games>] [-w <workers>] [-t <baseline_train_times>] ' \
+        '[-s <seed>]'
+
+
+def benchmark(budgets, games, workers, baseline, seed):
+    """
+    依次用每个时间预算打games局，MCTS机器人轮流坐在每个座位上
+    @param budgets: 每次决策的毫秒数列表
+    @param games: 每个预算的对局数
+    @param workers: 搜索进程数
+    @param baseline: 基准AI的智能体工厂
+    @param seed: 随机种子
+    """
+    for budget in budgets:
+        seed_all(seed)
+        searcher = MCTSSearcher(budget, workers)
+        game_env = GameEnv(headless=True)
+        game_env.set_deals(DealGenerator(seed))
+        robot = MCTSRobot(game_env, 'mcts', searcher)
+        game_env.add_players(robot, Robot(game_env, baseline(), 'base1'), Robot(game_env, baseline(), 'base2'))
+
+        begin = time()
+        try:
+            for _ in range(games):
+                game_env.start()
+        finally:
+            searcher.close()
+        elapsed = time() - begin
+
+        wins = sum(robot.victory_count)
+        low, high = wilson_interval(wins, games)
+        print('预算{}ms: 胜率 {:.3f} [{:.3f}, {:.3f}]; 每次决策迭代 {:.0f} 次; 模拟 {:.0f} 局/秒; 用时 {:.1f}s'
+              .format(budget, wins / games, low, high, searcher.iterations / max(searcher.searches, 1),
+                      searcher.iterations / elapsed, elapsed))
+
+
+if __name__ == '__main__':
+    from duguai.ai.mcts import MCTSSearcher, MCTSRobot
+    from duguai.game.deal import DealGenerator
+    from duguai.game.game_env import GameEnv
+    from duguai.game.robot import Robot
+    from duguai.game.tournament import wilson_interval, seed_all, random_agent, ql_agent_factory
+
+    _budgets = [10, 50, 100]
+    _games = 100
+    _workers = 1
+    t = None
+    _seed = 0
+    try:
+        opts, args = getopt(sys.argv[1:], 'b:n:w:t:s:')
+        for opt, arg in opts:
+            if opt == '-b':
+                _budgets = [float(b) for b in arg.split(',')]
+            elif opt == '-n':
+                _games = int(arg)
+            elif opt == '-w':
+                _workers = int(arg)
+            elif opt == '-t':
+                t = arg
+            elif opt == '-s':
+                _seed = int(arg)
+    except (GetoptError, ValueError) as e:
+        print(USAGE)
+        sys.exit(2)
+
+    if t is None:
+        _baseline = random_agent
+        print('ISMCTS AI vs 随机决策AI')
+    else:
+        _paths = '../dataset/play_q_table' + t + '.npy', '../dataset/follow_q_table' + t + '.npy'
+        if not all(os.path.isfile(p) for p in _paths):
+            print('数据文件不存在')
+            sys.exit(1)
+        _baseline = ql_agent_factory(*_paths)
+        print('ISMCTS AI vs 训练了' + t + '次的强化学习AI')
+    benchmark(_budgets, _games, _workers, _baseline, _seed)
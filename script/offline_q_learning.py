@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""
+离线Q-Learning脚本：在q_learning.py -x 记录的转移日志上训练Q表，无需重新模拟对局
+@author: 江胤佐
+"""
+import logging
+import sys
+
+sys.path.append('..')
+
+USAGE = 'python offline_q_learning.py -i <transition_dir> [-a <alpha>] [-g <gamma>] [-e <epochs>] [-c <chunk_size>]'
+
+if __name__ == '__main__':
+    from getopt import getopt, GetoptError
+    from time import time
+
+    from duguai import mode
+    from duguai.ai.offline import TransitionLog, OfflineQLTrainer
+    from duguai.ai.q_learning import load_q_table, save_q_table, PlayQLHelper, FollowQLHelper
+
+    if mode == 'debug':
+        logging.basicConfig(level=logging.DEBUG)
+
+    transition_dir = None
+    alpha, gamma = 0.5, 0.8
+    epochs = 1
+    chunk_size = 1 << 20
+    try:
+        opts, args = getopt(sys.argv[1:], 'i:a:g:e:c:')
+        for opt, arg in opts:
+            if opt == '-i':
+                transition_dir = arg
+            elif opt == '-a':
+                alpha = float(arg)
+            elif opt == '-g':
+                gamma = float(arg)
+            elif opt == '-e':
+                epochs = int(arg)
+            elif opt == '-c':
+                chunk_size = int(arg)
+        if transition_dir is None:
+            raise GetoptError('-i is required')
+    except (GetoptError, ValueError) as e:
+        print(USAGE)
+        sys.exit(2)
+
+    play_q_table = load_q_table('play_q_table.npy', PlayQLHelper.STATE_LEN, PlayQLHelper.ACTION_LEN)
+    follow_q_table = load_q_table('follow_q_table.npy', FollowQLHelper.STATE_LEN, FollowQLHelper.ACTION_LEN)
+
+    log = TransitionLog(transition_dir)
+    trainer = OfflineQLTrainer(play_q_table, follow_q_table, alpha, gamma)
+
+    start_time = time()
+    trainer.train(log, epochs, chunk_size)
+    logging.info('训练时间: %f 秒; 转移数: %d; 扫描次数: %d' % ((time() - start_time), len(log), epochs))
+
+    save_q_table('play_q_table.npy', play_q_table)
+    save_q_table('follow_q_table.npy', follow_q_table)
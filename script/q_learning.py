@@ -8,25 +8,60 @@ if __name__ == '__main__':
     from getopt import getopt, GetoptError
     from time import time
 
-    from duguai import mode
-    from duguai.ai.q_learning import load_q_table, save_q_table, PlayQLHelper, FollowQLHelper, QLTrainingAgent
+    from duguai import mode, metrics, tracer
+    from duguai.ai.offline import TransitionWriter, TransitionRecordingAgent
+    from duguai.ai.linear import LinearQModel, LinearTrainingAgent
+    from duguai.ai.q_learning import load_q_table, save_q_table, PlayQLHelper, FollowQLHelper, QLTrainingAgent, \
+        QLambdaTrainingAgent, load_compact_q_table, save_compact_q_table
+    from duguai.game.deal import DealGenerator
     from duguai.game.game_env import GameEnv
+    from duguai.game.record import GameRecorder
     from duguai.game.robot import Robot
     from duguai.logger import log_locals
+    from duguai.profiler import Profiler
 
     if mode == 'debug':
         logging.basicConfig(level=logging.DEBUG)
 
     train_times: int = 10
+    record_file = None
+    transition_dir = None
+    profile_prefix = None
+    profile_memory = False
+    linear_model_file = None
+    lambda_ = None
+    metrics_port = None
+    trace_every = None
+    compact_file = None
     try:
-        opts, args = getopt(sys.argv[1:], 't:')
+        opts, args = getopt(sys.argv[1:], 't:r:x:P:ML:l:H:S:I:')
         for opt, arg in opts:
             if opt == '-t':
                 train_times = int(arg)
                 if train_times < 0 or train_times >= 100000000:
                     raise ValueError('train_times must be an integer between 1 and 99999999')
+            elif opt == '-r':
+                record_file = arg
+            elif opt == '-x':
+                transition_dir = arg
+            elif opt == '-P':
+                profile_prefix = arg
+            elif opt == '-M':
+                profile_memory = True
+            elif opt == '-L':
+                linear_model_file = arg
+            elif opt == '-l':
+                lambda_ = float(arg)
+            elif opt == '-H':
+                metrics_port = int(arg)
+            elif opt == '-S':
+                trace_every = int(arg)
+            elif opt == '-I':
+                compact_file = arg
     except GetoptError as e:
-        print('python q_learning.py -t <train_times>')
+        print('python q_learning.py -t <train_times> [-r <record_file>] [-x <transition_dir>] '
+              '[-P <profile_prefix>] [-M] [-L <linear_model_file>] [-l <lambda>] [-H <metrics_port>] '
+              '[-S <trace_every>] [-I <compact_play_q_table_file>]')
         sys.exit(2)
     except ValueError as e:
         print(e)
@@ -35,29 +70,91 @@ if __name__ == '__main__':
         logging.exception(e)
         sys.exit(2)
 
-    play_q_table = load_q_table('play_q_table.npy', PlayQLHelper.STATE_LEN, PlayQLHelper.ACTION_LEN)
-    follow_q_table = load_q_table('follow_q_table.npy', FollowQLHelper.STATE_LEN, FollowQLHelper.ACTION_LEN)
+    game_env = GameEnv(headless=True)
+    game_env.set_deals(DealGenerator())
 
-    game_env = GameEnv()
+    # 指定-L时训练线性函数逼近模型，不加载Q表
+    linear_model = play_q_table = follow_q_table = play_index = None
+    if linear_model_file:
+        linear_model = LinearQModel.load(linear_model_file)
+        agent0 = LinearTrainingAgent(linear_model, 0.1, 0.9)
+        agent1 = LinearTrainingAgent(linear_model, 0.1, 0.9)
+        agent2 = LinearTrainingAgent(linear_model, 0.1, 0.9)
+    else:
+        # 指定-I时训练reachable_states.py生成的紧凑出牌Q表
+        if compact_file:
+            play_q_table, play_index = load_compact_q_table(compact_file)
+        else:
+            play_q_table = load_q_table('play_q_table.npy', PlayQLHelper.STATE_LEN, PlayQLHelper.ACTION_LEN)
+        follow_q_table = load_q_table('follow_q_table.npy', FollowQLHelper.STATE_LEN, FollowQLHelper.ACTION_LEN)
+        if lambda_ is None:
+            agent0 = QLTrainingAgent(play_q_table, follow_q_table, 0.5, 0.8, play_index=play_index)
+            agent1 = QLTrainingAgent(play_q_table, follow_q_table, 0.5, 0.8, play_index=play_index)
+            agent2 = QLTrainingAgent(play_q_table, follow_q_table, 0.5, 0.8, play_index=play_index)
+        else:
+            # 指定-l时用Q(λ)训练
+            agent0 = QLambdaTrainingAgent(play_q_table, follow_q_table, 0.5, 0.8, lambda_, play_index=play_index)
+            agent1 = QLambdaTrainingAgent(play_q_table, follow_q_table, 0.5, 0.8, lambda_, play_index=play_index)
+            agent2 = QLambdaTrainingAgent(play_q_table, follow_q_table, 0.5, 0.8, lambda_, play_index=play_index)
 
-    agent0 = QLTrainingAgent(play_q_table, follow_q_table, 0.5, 0.8)
-    agent1 = QLTrainingAgent(play_q_table, follow_q_table, 0.5, 0.8)
-    agent2 = QLTrainingAgent(play_q_table, follow_q_table, 0.5, 0.8)
+    # 指定-H时在本机端口上暴露运行指标，见duguai.metrics
+    if metrics_port is not None:
+        metrics.start_server(metrics_port)
+        if linear_model is not None:
+            metrics.track_q_table('linear', linear_model)
+        else:
+            metrics.track_q_table('play', play_q_table)
+            metrics.track_q_table('follow', follow_q_table)
+
+    # 指定-S时每N次决策抽样追踪1次，见duguai.tracer
+    if trace_every is not None:
+        tracer.install(trace_every)
+
+    # 同时记录状态转移，供offline_q_learning.py离线训练
+    transition_writer = TransitionWriter(transition_dir) if transition_dir else None
+    if transition_writer:
+        agent0 = TransitionRecordingAgent(agent0, transition_writer)
+        agent1 = TransitionRecordingAgent(agent1, transition_writer)
+        agent2 = TransitionRecordingAgent(agent2, transition_writer)
 
     robot0 = Robot(game_env, agent0, 'r0')
     robot1 = Robot(game_env, agent1, 'r1')
     robot2 = Robot(game_env, agent2, 'r2')
     game_env.add_players(robot0, robot1, robot2)
 
+    recorder = GameRecorder(record_file) if record_file else None
+    game_env.set_recorder(recorder)
+
+    # 性能分析时对train_times局训练做cProfile/tracemalloc分析，见duguai.profiler
+    profiler = Profiler(profile_prefix or 'profile', cpu=profile_prefix is not None, memory=profile_memory)
+
     start_time = time()
     try:
-        for i in range(train_times):
-            game_env.start()
+        with profiler:
+            for i in range(train_times):
+                game_env.start()
     except Exception as e:
         logging.exception(e)
         if mode == 'debug':
             log_locals(e)
+        else:
+            tracer.log_active()
     finally:
+        if recorder:
+            recorder.close()
+        if transition_writer:
+            transition_writer.close()
         logging.info('训练时间: %f 秒; 训练次数: %d' % ((time() - start_time), train_times))
-        save_q_table('play_q_table.npy', play_q_table)
-        save_q_table('follow_q_table.npy', follow_q_table)
+        if linear_model is not None:
+            linear_model.save(linear_model_file)
+            logging.info('保存成功, 模型大小: %d 字节' % linear_model.nbytes)
+        else:
+            if play_index is not None:
+                save_compact_q_table(compact_file, play_q_table, play_index)
+                # 未采样到的手牌特征共用0号块，比例过高时应重新采样
+                report = logging.warning if play_index.miss_rate > 0.01 else logging.info
+                report('出牌状态落入0号块: %d / %d (%.2f%%)' % (
+                    play_index.misses, play_index.lookups, play_index.miss_rate * 100))
+            else:
+                save_q_table('play_q_table.npy', play_q_table)
+            save_q_table('follow_q_table.npy', follow_q_table)
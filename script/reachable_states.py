@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+采样可达的出牌状态，生成紧凑出牌Q表（见duguai.ai.q_learning.PlayStateIndex）。
+随机发牌后随机抽取某一家手牌的一部分，批量拆牌得到手牌特征编号；指定-q时再并入已有Q表中访问过的行，并把其Q值压缩进紧凑Q表
+@author: 江胤佐
+"""
+import logging
+import sys
+from getopt import getopt, GetoptError
+
+sys.path.append('..')
+
+if __name__ == '__main__':
+    from time import time
+
+    import numpy as np
+
+    from duguai.ai.q_learning import PlayStateIndex, PlayQLHelper, load_q_table, save_compact_q_table
+    from duguai.game.deal import deal_batch
+
+    logging.basicConfig(level=logging.INFO)
+
+    samples = 200000
+    seed = None
+    output_file = '../dataset/play_q_table_compact.npz'
+    play_q_table_file = None
+    try:
+        opts, args = getopt(sys.argv[1:], 'n:s:o:q:')
+        for opt, arg in opts:
+            if opt == '-n':
+                samples = int(arg)
+            elif opt == '-s':
+                seed = int(arg)
+            elif opt == '-o':
+                output_file = arg
+            elif opt == '-q':
+                play_q_table_file = arg
+    except (GetoptError, ValueError) as e:
+        print('python reachable_states.py [-n <samples>] [-s <seed>] [-o <output_file>] [-q <play_q_table_file>]')
+        sys.exit(2)
+
+    rng = np.random.default_rng(seed)
+    batch_size = 4096
+    keys = set()
+    start_time = time()
+    for done in range(0, samples, batch_size):
+        n = min(batch_size, samples - done)
+        deals = deal_batch(rng, n)
+
+        # 地主有20张牌，农民有17张牌。随机挑选一家，保留随机的1~全部张牌
+        player = rng.integers(0, 3, n)
+        hands = np.zeros((n, 20), dtype=int)
+        for i in range(3):
+            rows = player == i
+            hands[rows, :17] = deals[rows, i * 17:(i + 1) * 17]
+        hands[player == 0, 17:] = deals[player == 0, 51:]
+        hand_sizes = np.where(player == 0, 20, 17)
+        order = np.argsort(rng.random((n, 20)) + (np.arange(20) >= hand_sizes[:, None]), axis=1)
+        kept = np.arange(20) < rng.integers(1, hand_sizes + 1)[:, None]
+        cards = np.where(kept, np.take_along_axis(hands, order, axis=1), 0)
+
+        counts = np.zeros((n, 16), dtype=int)
+        np.add.at(counts, (np.repeat(np.arange(n), 20), cards.ravel()), 1)
+        keys.update(PlayStateIndex.hand_keys_of(counts[:, 1:]).tolist())
+        logging.info('已采样%d个手牌, 可达手牌特征%d种' % (done + n, len(keys)))
+    logging.info('采样时间: %f 秒' % (time() - start_time))
+
+    play_q_table = None
+    if play_q_table_file:
+        play_q_table = load_q_table(play_q_table_file, PlayQLHelper.STATE_LEN, PlayQLHelper.ACTION_LEN,
+                                    mmap_mode='r')
+        visited = PlayStateIndex.visited_keys(play_q_table)
+        logging.info('Q表中访问过的手牌特征%d种, 其中%d种未被采样到' % (visited.size, len(set(visited.tolist()) - keys)))
+        keys.update(visited.tolist())
+
+    play_index = PlayStateIndex(sorted(keys))
+    if play_q_table is not None:
+        compact = play_index.compress(play_q_table)
+    else:
+        compact = np.zeros((play_index.state_len, PlayQLHelper.ACTION_LEN))
+    save_compact_q_table(output_file, compact, play_index)
+    logging.info('紧凑Q表%d行 (%d 字节), 完整Q表%d行 (%d 字节)' % (
+        play_index.state_len, compact.nbytes, PlayQLHelper.STATE_LEN,
+        PlayQLHelper.STATE_LEN * PlayQLHelper.ACTION_LEN * compact.itemsize))
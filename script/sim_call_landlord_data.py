@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+用模拟对局自动标注叫地主数据集：每手牌强制当地主模拟若干局，以地主胜率作为标签，输出二进制数据文件
+@author: 江胤佐
+"""
+import os
+import sys
+from getopt import getopt, GetoptError
+from time import time
+
+sys.path.append('..')
+
+USAGE = 'python sim_call_landlord_data.py -n <hands> [-r <rollouts>] [-t <train_times>] [-w <workers>] ' \
+        '[-s <seed>] [-o <output_file>]'
+
+if __name__ == '__main__':
+    from duguai.game.call_sim import generate_call_data
+    from duguai.game.tournament import ql_agent_factory, random_agent
+
+    hands = 1000
+    rollouts = 8
+    t = None
+    workers = None
+    seed = 0
+    output_file = '../dataset/call_sim.bin'
+    try:
+        opts, args = getopt(sys.argv[1:], 'n:r:t:w:s:o:')
+        for opt, arg in opts:
+            if opt == '-n':
+                hands = int(arg)
+            elif opt == '-r':
+                rollouts = int(arg)
+            elif opt == '-t':
+                t = arg
+            elif opt == '-w':
+                workers = int(arg)
+            elif opt == '-s':
+                seed = int(arg)
+            elif opt == '-o':
+                output_file = arg
+    except (GetoptError, ValueError) as e:
+        print(USAGE)
+        sys.exit(2)
+
+    if t is None:
+        agent = random_agent
+    else:
+        play_q_table_path = '../dataset/play_q_table' + t + '.npy'
+        follow_q_table_path = '../dataset/follow_q_table' + t + '.npy'
+        if not os.path.isfile(play_q_table_path) or not os.path.isfile(follow_q_table_path):
+            print('数据文件不存在')
+            sys.exit(1)
+        agent = ql_agent_factory(play_q_table_path, follow_q_table_path)
+
+    start_time = time()
+    n = generate_call_data(output_file, hands, rollouts, agent, workers=workers, seed=seed)
+    print('已向 {} 写入 {} 手牌（每手模拟 {} 局），耗时 {:.2f} 秒'.format(output_file, n, rollouts, time() - start_time))
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+并行锦标赛脚本：训练过的强化学习AI vs 基准AI，胜负确定后提前停止
+@author: 江胤佐
+"""
+import os
+import sys
+from getopt import getopt, GetoptError
+from time import time
+
+sys.path.append('..')
+
+USAGE = 'python tournament.py -t <train_times> [-o <baseline_train_times>] [-n <max_games>] [-w <workers>] ' \
+        '[-s <seed>] [-d]'
+
+
+def _q_table_paths(train_times: str):
+    return '../dataset/play_q_table' + train_times + '.npy', '../dataset/follow_q_table' + train_times + '.npy'
+
+
+if __name__ == '__main__':
+    from duguai.game.tournament import run_tournament, ql_agent_factory, random_agent
+
+    t = ''
+    baseline_t = None
+    max_games = 10000
+    workers = None
+    seed = 0
+    duplicate = False
+    try:
+        opts, args = getopt(sys.argv[1:], 't:o:n:w:s:d')
+        for opt, arg in opts:
+            if opt == '-t':
+                t = arg
+            elif opt == '-o':
+                baseline_t = arg
+            elif opt == '-n':
+                max_games = int(arg)
+            elif opt == '-w':
+                workers = int(arg)
+            elif opt == '-s':
+                seed = int(arg)
+            elif opt == '-d':
+                duplicate = True
+    except (GetoptError, ValueError) as e:
+        print(USAGE)
+        sys.exit(2)
+
+    candidate_paths = _q_table_paths(t)
+    if not all(os.path.isfile(p) for p in candidate_paths):
+        print('数据文件不存在')
+        sys.exit(1)
+
+    if baseline_t is None:
+        baseline = random_agent
+        print('训练了' + (t if t else '0') + '次的强化学习AI vs 随机决策AI')
+    else:
+        baseline_paths = _q_table_paths(baseline_t)
+        if not all(os.path.isfile(p) for p in baseline_paths):
+            print('数据文件不存在')
+            sys.exit(1)
+        baseline = ql_agent_factory(*baseline_paths)
+        print('训练了' + (t if t else '0') + '次的强化学习AI vs 训练了' + baseline_t + '次的强化学习AI')
+
+    start_time = time()
+    result = run_tournament(ql_agent_factory(*candidate_paths), baseline,
+                            max_games=max_games, workers=workers, seed=seed, duplicate=duplicate)
+    for line in result.report():
+        print(line)
+    print('耗时: %.2f 秒' % (time() - start_time))
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""
+增量训练叫地主分类器，生成call_landlord.py读取的模型文件。
+默认写入 ../dataset/call_model.json，不覆盖随包发布的 duguai/ai/call_model.json；确认效果后再用 -o 指定该文件替换
+@author: 江胤佐
+"""
+import sys
+from getopt import getopt, GetoptError
+from time import time
+
+sys.path.append('..')
+
+USAGE = 'python train_call_landlord.py [-i <data_file1,data_file2,...>] [-o <model_file>] [-e <epochs>] ' \
+        '[-c <chunk_size>] [-t <threshold>]'
+
+if __name__ == '__main__':
+    from duguai.ai.call_train import CallTrainer
+
+    data_files = ['../dataset/call.csv']
+    model_file = '../dataset/call_model.json'
+    epochs = 5
+    chunk_size = 65536
+    threshold = 0.5
+    try:
+        opts, args = getopt(sys.argv[1:], 'i:o:e:c:t:')
+        for opt, arg in opts:
+            if opt == '-i':
+                data_files = arg.split(',')
+            elif opt == '-o':
+                model_file = arg
+            elif opt == '-e':
+                epochs = int(arg)
+            elif opt == '-c':
+                chunk_size = int(arg)
+            elif opt == '-t':
+                threshold = float(arg)
+    except (GetoptError, ValueError) as e:
+        print(USAGE)
+        sys.exit(2)
+
+    start_time = time()
+    trainer = CallTrainer(threshold).fit(data_files, epochs, chunk_size)
+    print('训练集准确率: {:.4f}，耗时 {:.2f} 秒'.format(trainer.score(data_files, chunk_size), time() - start_time))
+    trainer.save(model_file)
+    print('模型已保存到', model_file)
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+from duguai.ai.action_mask import actions_to_mask, mask_to_actions, mask_count, mask_sample, masked_max, \
+    masked_argmax, masked_argmin
+
+
+def test_mask_to_actions():
+    for actions in ([0], [0, 2, 16], [3, 8, 9, 10], list(range(17))):
+        mask = actions_to_mask(actions)
+        assert mask_to_actions(mask) == tuple(actions)
+        assert mask_count(mask) == len(actions)
+    assert mask_count(0) == 0
+
+
+def test_mask_sample():
+    mask = actions_to_mask([1, 9, 15])
+    assert {mask_sample(mask) for _ in range(200)} == {1, 9, 15}
+
+
+def test_masked_argmax():
+    row = np.array([5., 1., 2., 0., 0., 0., 0., 0., 0., 1.95, 0., 0., 0., 0., 0., 0., 3.])
+    mask = actions_to_mask([1, 2, 9])
+    assert masked_max(row, mask) == 2.
+    assert masked_argmax(row, mask) == 2
+    assert {masked_argmax(row, mask, 0.1) for _ in range(200)} == {2, 9}
+    assert masked_argmax(row, mask | 1 << 16) == 16
+
+
+def test_masked_argmin():
+    row = np.array([2, 0, 1, 1, 0], dtype=np.int8)
+    assert {masked_argmin(row, 0b01101) for _ in range(100)} == {2, 3}
+    assert masked_argmin(row, 0b10001) == 4
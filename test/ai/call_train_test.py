@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+from duguai.ai.call_landlord import process, process_batch, get_svc, z_score, load_call_model
+from duguai.ai.call_train import CallTrainer, CALL_DTYPE, append_call_data, read_call_data, iter_chunks
+from duguai.game.deal import DealGenerator
+
+
+def _hands(n: int) -> np.ndarray:
+    return DealGenerator(0).batch(n)[:, :17]
+
+
+def test_process_batch():
+    hands = np.vstack([_hands(200), [[3, 3, 3, 3, 4, 4, 4, 4, 5, 6, 7, 8, 9, 13, 13, 14, 15]]])
+    assert (process_batch(hands) == np.array([process(h) for h in hands])).all()
+
+
+def test_default_model():
+    assert np.allclose(get_svc().coef_, [[0.19581239, 0.03330529, 0.10988893]])
+    assert np.allclose(z_score([[0.95726285, 0.09313241, 1.24184783]]), 0)
+
+
+def test_train(tmp_path):
+    hands = _hands(3000)
+    labels = (process_batch(hands)[:, 2] >= 2).astype(int)
+
+    csv_file = str(tmp_path / 'call.csv')
+    np.savetxt(csv_file, np.hstack([hands, labels[:, None]]), fmt='%d', delimiter=',')
+    bin_file = str(tmp_path / 'call.bin')
+    records = np.zeros(len(hands), dtype=CALL_DTYPE)
+    records['cards'], records['label'], records['games'] = hands, labels * 0.8, 10
+    append_call_data(bin_file, records[:1000])
+    append_call_data(bin_file, records[1000:])
+    assert len(read_call_data(bin_file)) == 3000
+
+    chunks = list(iter_chunks([csv_file, bin_file], 1024))
+    assert [len(c[0]) for c in chunks] == [1024, 1024, 952, 1024, 1024, 952]
+    assert (chunks[3][0] == hands[:1024]).all() and (chunks[3][2] == 10).all()
+
+    model_file = str(tmp_path / 'call_model.json')
+    trainer = CallTrainer().fit([csv_file, bin_file], epochs=3, chunk_size=1024)
+    assert trainer.score(csv_file) > 0.95
+    trainer.save(model_file)
+
+    assert np.allclose(load_call_model(model_file)['mean'], process_batch(hands).mean(axis=0))
+    svc = get_svc(model_file)
+    predict = svc.predict(z_score(process_batch(hands), model_file))
+    assert np.mean(predict == labels) > 0.95
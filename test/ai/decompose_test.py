@@ -1,7 +1,8 @@
 # -*- coding: utf-8 -*-
 import numpy as np
 
-from duguai.ai.decompose import FollowDecomposer, PlayDecomposer
+from duguai.ai.decompose import FollowDecomposer, PlayDecomposer, HandSummary, get_good_plays_batch, \
+    get_good_follows_batch
 from duguai.card import CARD_2, CARD_G0, CARD_G1
 from duguai.card.combo import Combo
 
@@ -123,3 +124,52 @@ def test_seq():
     combo.cards = [4, 5, 6, 7, 8]
     print(decomposer.get_good_follows(np.array([5, 5, 6, 7, 8, 9]), combo))
     print(decomposer.get_good_follows(np.array([CARD_G1, CARD_G0]), combo))
+
+
+def test_hand_summary():
+    summary = HandSummary(np.array([1, 1, 2, 2, 3, 3, 5, 6, 7, 8, 9, 11, 11, 11, 11, CARD_G0, CARD_G1]))
+    assert summary.max_value(1, 1) == CARD_G1
+    assert summary.max_value(2, 3) == 3
+    assert summary.max_value(1, 5) == 9
+    assert summary.max_value(1, 6) == 0
+    assert summary.max_value(4, 1) == 11
+    assert summary.has_rocket
+
+    decomposer = FollowDecomposer()
+    combo = Combo()
+    combo.cards_view = '6 6 7 7 8 8'
+    assert not summary.can_beat(combo)
+
+    # 压不过时跳过拆牌，只返回炸弹
+    hand = np.array([1, 2, 2, 4, 4, 4, 4])
+    bombs, min_delta_q, good_actions, max_action = decomposer.get_good_follows(hand, combo)
+    assert [b.tolist() for b in bombs] == [[4, 4, 4, 4]] and not good_actions and max_action.size == 0
+    assert decomposer.precheck_hits == 1
+
+    combo.cards_view = '3 3'
+    bombs, min_delta_q, good_actions, max_action = decomposer.get_good_follows(hand, combo)
+    assert [a.tolist() for a in good_actions] == [[2, 2]]
+    assert decomposer.prechecks == 2 and decomposer.precheck_hit_rate == 0.5
+
+
+def test_batch():
+    hands = [np.array([1, 1, 2, 3, 4, 5, 9, 9, 9, 12, CARD_2]),
+             np.array([1, 1, 2, 3, 4, 5, 7, 7, CARD_G0, CARD_G1]),
+             np.array([1, 1, 2, 3, 4, 5, 9, 9, 9, 12, CARD_2])]
+    counts = np.array([np.bincount(h, minlength=16)[1:] for h in hands])
+
+    play_hands = get_good_plays_batch(counts)
+    assert len(play_hands) == 3
+    for hand, play_hand in zip(hands, play_hands):
+        expected = PlayDecomposer().get_good_plays(hand)
+        assert [a.tolist() for a in play_hand.solos] == [a.tolist() for a in expected.solos]
+        assert [a.tolist() for a in play_hand.seq_solo5] == [a.tolist() for a in expected.seq_solo5]
+        assert play_hand.has_rocket == expected.has_rocket
+
+    combo = Combo()
+    combo.cards_view = '4'
+    follows = get_good_follows_batch(counts, [combo] * 3)
+    for hand, follow in zip(hands, follows):
+        bombs, min_delta_q, good_actions, max_action = FollowDecomposer().get_good_follows(hand, combo)
+        assert [a.tolist() for a in follow[2]] == [a.tolist() for a in good_actions]
+        assert follow[1] == min_delta_q and follow[3].tolist() == max_action.tolist()
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+
+from duguai.ai.endgame import EndgameSolver, pack, _kicker_choices
+from duguai.ai.q_learning import RandomAgent, QLTrainingAgent, PlayQLHelper, FollowQLHelper
+from duguai.card import CARD_2, CARD_G0, CARD_G1
+from duguai.card.combo import PASS
+from duguai.card.moves import to_counts
+from duguai.game.game_env import GameEnv
+from duguai.game.robot import Robot
+from duguai.game.state import GameState
+from duguai.game.tracker import SearchInfo
+
+
+def test_pack():
+    assert pack([1] + [0] * 14) == 1
+    assert pack([0, 4] + [0] * 13) == 4 << 3
+    assert pack(to_counts([1, 2])) != pack(to_counts([1, 3]))
+
+
+def test_kicker_choices():
+    counts = to_counts([5, 5, 5, 1, 2, 2])
+    moves = set(_kicker_choices(counts, (101305, (1, 5, 5, 5))))
+    assert moves == {(101305, (1, 5, 5, 5)), (101305, (2, 5, 5, 5))}
+
+
+def test_solve():
+    # 地主先出3会被农民压住并出完；先出没人压得住的2才必胜
+    hands = [to_counts([1, CARD_2]), to_counts([2, 3]), to_counts([4])]
+    state = GameState(hands, 0)
+    assert EndgameSolver().solve(state) == (1113, (CARD_2,))
+    assert state == GameState([to_counts([1, CARD_2]), to_counts([2, 3]), to_counts([4])], 0)
+
+    # 农民手中有王炸，地主无论如何都会输
+    assert EndgameSolver().solve(GameState([to_counts([1, 3]), to_counts([CARD_G0, CARD_G1]), [0] * 15],
+                                           0, turn=0)) is None
+
+
+def test_shared_table():
+    # 置换表在多次调用之间共享，相同的手牌换了地主后不能沿用之前的结果
+    hands = [to_counts([4, 5, 10]), to_counts([1, 3, 5]), to_counts([6, 13, 13])]
+    solver = EndgameSolver()
+    for landlord in (1, 2, 0, 1):
+        state = GameState(hands, landlord, turn=0)
+        assert solver.solve(state) == EndgameSolver().solve(state)
+    assert EndgameSolver().solve(GameState(hands, 1, turn=0)) == (1104, (4,))
+    assert solver.solve(GameState(hands, 2, turn=0)) is None
+
+
+def test_budget():
+    hands = [to_counts([1, 2, 3, 4, 6, 8]), to_counts([2, 3, 4, 5, 7]), to_counts([9, 9, 10, 11])]
+    assert EndgameSolver(max_nodes=1).solve(GameState(hands, 0)) is None
+
+    # 超出预算中止搜索后，牌局状态保持不变
+    for max_nodes in (1, 3, 20):
+        state = GameState(hands, 0)
+        assert EndgameSolver(max_nodes=max_nodes).solve(state) is None
+        assert state == GameState(hands, 0)
+
+
+def test_decide():
+    # 对手手牌无法确定，但出对子必胜
+    info = SearchInfo(tuple(to_counts([1, 1])), tuple(to_counts([3, 4])), (2, 1, 1), 0, 0, PASS, 0)
+    assert EndgameSolver().decide(info) == (1201, (1, 1))
+
+
+def test_robot(make_game):
+    agent = RandomAgent()
+    game_env = make_game(lambda env: Robot(env, agent, 'r0', EndgameSolver(threshold=10)), agent, agent)
+    for _ in range(5):
+        game_env.start()
+        assert game_env.state.is_over
+
+
+def test_training_agent():
+    # 求解器出牌时跳过exec，训练智能体的状态转移会中断，因此不能同时使用
+    game_env = GameEnv(headless=True)
+    agent = QLTrainingAgent(np.zeros((1, PlayQLHelper.ACTION_LEN)), np.zeros((1, FollowQLHelper.ACTION_LEN)), 0.5, 0.8)
+    with pytest.raises(ValueError):
+        Robot(game_env, agent, '0', EndgameSolver())
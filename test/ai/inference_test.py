@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+import asyncio
+
+import numpy as np
+
+from duguai.ai.action_mask import actions_to_mask
+from duguai.ai.inference import InferenceService, InferenceClient, LocalInferenceAgent, \
+    start_service_thread, stop_service_thread
+from duguai.ai.q_learning import PlayQLHelper, FollowQLHelper, RandomAgent
+
+PLAY_VECTOR = [0, 0, 0, 0, 0, 0, 0, 0, 0, 1, 7, 7]
+FOLLOW_VECTOR = [1, 0, 2, 3, 4, 1]
+
+
+def _service(**kwargs) -> InferenceService:
+    play_q_table = np.zeros((PlayQLHelper.STATE_LEN, PlayQLHelper.ACTION_LEN))
+    follow_q_table = np.zeros((FollowQLHelper.STATE_LEN, FollowQLHelper.ACTION_LEN))
+    play_q_table[PlayQLHelper.state_to_int(PLAY_VECTOR), [1, 5, 8]] = [-3, -1, -2]
+    follow_q_table[FollowQLHelper.state_to_int(FOLLOW_VECTOR), [0, 3]] = [1, 2]
+    return InferenceService(play_q_table, follow_q_table, **kwargs)
+
+
+def test_states_to_int():
+    vectors = np.array([[3, 3, 2, 2, 2, 2, 1, 2, 1, 2, 5, 5], PLAY_VECTOR, [1, 2, 0, 1, 0, 1, 0, 1, 0, 0, 3, 6]])
+    assert list(PlayQLHelper.states_to_int(vectors)) == [PlayQLHelper.state_to_int(v) for v in vectors]
+    assert FollowQLHelper.states_to_int([FOLLOW_VECTOR])[0] == FollowQLHelper.state_to_int(FOLLOW_VECTOR)
+
+
+def test_batch():
+    async def run():
+        async with _service(window=0.01) as service:
+            requests = [(PLAY_VECTOR, actions_to_mask([1, 5, 8])), (FOLLOW_VECTOR, 0b1001)] * 20
+            actions = await asyncio.gather(*(service.infer(s, m) for s, m in requests))
+            return service, actions
+
+    service, actions = asyncio.run(run())
+    assert actions == [5, 3] * 20
+    assert service.request_count == 40 and service.batch_count == 1
+
+
+def test_local_agent(make_game):
+    service = _service()
+    loop = start_service_thread(service)
+    agent = LocalInferenceAgent(service, loop)
+    assert agent.exec(PLAY_VECTOR, actions_to_mask([1, 8])) == 8
+
+    make_game(agent, RandomAgent(), agent, seed=None, games=1)
+    assert service.request_count > 1
+    stop_service_thread(service, loop)
+
+
+def test_unix_socket(tmp_path):
+    path = str(tmp_path / 'inference.sock')
+    service = _service()
+    loop = start_service_thread(service)
+    asyncio.run_coroutine_threadsafe(service.serve_unix(path), loop).result()
+
+    client = InferenceClient(path)
+    assert client.exec(PLAY_VECTOR, actions_to_mask([1, 5, 8])) == 5
+    assert client.exec(np.array(FOLLOW_VECTOR), 0b1001) == 3
+    client.close()
+
+    stop_service_thread(service, loop)
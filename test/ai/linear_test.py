@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+from duguai.ai.linear import FeatureEncoder, LinearQModel, LinearExecuteAgent, LinearTrainingAgent, PLAY_ENCODER, \
+    FOLLOW_ENCODER
+from duguai.ai.action_mask import actions_to_mask
+
+
+def test_encoder():
+    encoder = FeatureEncoder((2, 3), ((0, 1),))
+    assert encoder.size == 2 + 3 + 6 + 1
+    assert list(encoder.encode([1, 2])) == [1, 4, 5 + 5, 11]
+    assert list(encoder.encode([0, 9])) == [0, 4, 5 + 2, 11]
+    assert len(PLAY_ENCODER.encode([0] * 12)) == PLAY_ENCODER.active
+    assert FOLLOW_ENCODER.encode([5, 2, 2, 7, 7, 5]).max() == FOLLOW_ENCODER.size - 1
+
+
+def test_model(tmp_path):
+    model = LinearQModel()
+    model.play_weights[PLAY_ENCODER.encode([0] * 12), 3] = 1
+    assert model.q_values([0] * 12)[3] == PLAY_ENCODER.active
+    assert model.nbytes < 32 * 1024
+
+    file_name = str(tmp_path / 'linear.npz')
+    model.save(file_name)
+    loaded = LinearQModel.load(file_name)
+    assert (loaded.play_weights == model.play_weights).all()
+    assert LinearExecuteAgent(loaded).exec([0] * 12, actions_to_mask([1, 3])) == 3
+    assert (LinearQModel.load(str(tmp_path / 'missing.npz')).follow_weights == 0).all()
+
+
+def test_training(make_game):
+    model = LinearQModel()
+    make_game(*(LinearTrainingAgent(model, 0.1, 0.9) for _ in range(3)), games=3)
+    assert np.abs(model.play_weights).sum() > 0
+    assert np.abs(model.follow_weights).sum() > 0
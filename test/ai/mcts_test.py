@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from duguai.ai.mcts import MCTSSearcher, MCTSRobot, SearchInfo, ismcts
+from duguai.ai.q_learning import RandomAgent
+from duguai.card import CARD_2, CARD_G1
+from duguai.card.combo import PASS
+from duguai.card.moves import to_counts
+
+
+def test_ismcts_winning_move():
+    # 出单张会被对手的2或大王压住并出完，应当直接出对子
+    info = SearchInfo(tuple(to_counts([1, 1])), tuple(to_counts([CARD_2, CARD_G1])), (2, 1, 1), 0, 0, PASS, 0)
+    visits, iterations = ismcts(info, 20, seed=0)
+    assert iterations > 0
+    assert max(visits.items(), key=lambda item: item[1])[0][1] == (1, 1)
+
+
+def test_mcts_robot(make_game):
+    searcher = MCTSSearcher(budget_ms=2)
+    agent = RandomAgent()
+    game_env = make_game(lambda env: MCTSRobot(env, 'mcts', searcher), agent, agent)
+    for _ in range(3):
+        game_env.start()
+        assert len(game_env.victors) in (1, 2)
+    assert searcher.searches > 0
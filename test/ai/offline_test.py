@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+from duguai.ai.offline import TransitionWriter, TransitionLog, TransitionRecordingAgent, OfflineQLTrainer, \
+    actions_to_mask, PLAY_TABLE, FOLLOW_TABLE, _table_state
+from duguai.ai.provider import StateVector
+from duguai.ai.q_learning import RandomAgent, PlayQLHelper, FollowQLHelper
+
+
+def test_actions_to_mask():
+    assert actions_to_mask([0, 2, 16]) == 0b10000000000000101
+
+
+def test_table_state():
+    play_state = [3, 3, 2, 2, 2, 2, 1, 2, 1, 1, 5, 5]
+    follow_state = [1, 0, 0, 0, 0, 0]
+    assert _table_state(play_state) == (PLAY_TABLE, PlayQLHelper.state_to_int(play_state))
+    assert _table_state(follow_state) == (FOLLOW_TABLE, FollowQLHelper.state_to_int(follow_state))
+    # 融合路径的状态向量直接使用其行号
+    assert _table_state(StateVector(play_state, 7)) == (PLAY_TABLE, 7)
+    assert _table_state(StateVector(follow_state, 3)) == (FOLLOW_TABLE, 3)
+
+
+def test_offline(tmp_path, make_game):
+    dir_name = str(tmp_path / 'transitions')
+    with TransitionWriter(dir_name, buffer_size=32) as writer:
+        make_game(*(TransitionRecordingAgent(RandomAgent(), writer) for _ in range(3)), seed=None, games=3)
+
+    log = TransitionLog(dir_name)
+    assert len(log) > 0
+    assert log['done'].sum() == 9
+
+    play_q_table = np.zeros((PlayQLHelper.STATE_LEN, PlayQLHelper.ACTION_LEN))
+    follow_q_table = np.zeros((FollowQLHelper.STATE_LEN, FollowQLHelper.ACTION_LEN))
+    OfflineQLTrainer(play_q_table, follow_q_table, 0.5, 0.8).train(log, epochs=2, chunk_size=64)
+    assert play_q_table.any() and follow_q_table.any()
+
+
+def test_update():
+    play_q_table = np.zeros((PlayQLHelper.STATE_LEN, PlayQLHelper.ACTION_LEN))
+    follow_q_table = np.zeros((FollowQLHelper.STATE_LEN, FollowQLHelper.ACTION_LEN))
+    follow_q_table[7, 3] = 10
+    follow_q_table[7, 4] = 100
+    chunk = {
+        'table': np.array([PLAY_TABLE, PLAY_TABLE, FOLLOW_TABLE]),
+        'state': np.array([5, 5, 2]),
+        'action': np.array([1, 1, 0]),
+        'reward': np.array([-1., -1., 40.]),
+        'next_table': np.array([FOLLOW_TABLE, FOLLOW_TABLE, 0]),
+        'next_state': np.array([7, 7, 0]),
+        'next_mask': np.array([0b1001, 0b1001, 0], dtype=np.uint32),
+        'done': np.array([0, 0, 1]),
+    }
+    OfflineQLTrainer(play_q_table, follow_q_table, 0.5, 0.8).update(chunk)
+    assert play_q_table[5, 1] == 0.5 * (-1 + 0.8 * 10)
+    assert follow_q_table[2, 0] == 20
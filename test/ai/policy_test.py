@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+from duguai.ai.action_mask import actions_to_mask
+from duguai.ai.policy import compile_table, CompiledPolicy, PolicyAgent
+from duguai.ai.q_learning import PlayQLHelper, FollowQLHelper
+
+
+def test_compile_table():
+    q_table = np.array([[1., 5., 5.05, 3.],
+                        [0., 0., 0., 0.],
+                        [2., 10., 10.1, 6.],
+                        [0., 0., 0., 0.]])
+    index, levels = compile_table(q_table)
+    assert levels.dtype == np.int8
+    assert len(levels) == 2
+    assert index[1] == index[3] and index[0] == index[2]
+    assert list(levels[index[0]]) == [2, 0, 0, 1]
+    assert not levels[index[1]].any()
+
+
+def test_policy_agent(tmp_path):
+    play_q_table = np.zeros((PlayQLHelper.STATE_LEN, PlayQLHelper.ACTION_LEN))
+    follow_q_table = np.zeros((FollowQLHelper.STATE_LEN, FollowQLHelper.ACTION_LEN))
+    state_vector = [0, 0, 0, 0, 0, 0, 0, 0, 0, 1, 7, 7]
+    play_q_table[PlayQLHelper.state_to_int(state_vector), [1, 5, 8]] = [-3, -1, -2]
+
+    file_name = str(tmp_path / 'policy.npz')
+    CompiledPolicy.compile(play_q_table, follow_q_table).save(file_name)
+    agent = PolicyAgent(CompiledPolicy.load(file_name))
+    assert agent.exec(state_vector, actions_to_mask([1, 5, 8])) == 5
+    assert agent.exec(state_vector, actions_to_mask([1, 8])) == 8
+    assert agent.exec([0, 0, 0, 0, 0, 0], 0b11) in (0, 1)
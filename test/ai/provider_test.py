@@ -1,11 +1,12 @@
 # -*- coding: utf-8 -*-
-from random import sample
-
 import numpy as np
 
-from ai.executor import execute_play
-from duguai.ai.provider import FollowProvider, PlayProvider
+from duguai.ai.action_mask import mask_sample
+from duguai.ai.executor import execute_play
+from duguai.ai.provider import FollowProvider, PlayProvider, StateVector, state_index
+from duguai.ai.q_learning import PlayQLHelper, FollowQLHelper
 from duguai.card.combo import Combo
+from duguai.game.deal import DealGenerator
 
 
 def test_follow():
@@ -52,10 +53,10 @@ def test_sorted_follow():
 def test_sorted_play():
     play_provider = PlayProvider(1)
     play_provider.add_landlord_id(2)
-    play_hand, state_vector, action_list = play_provider.provide(
+    play_hand, state_vector, action_mask = play_provider.provide(
         np.array([1, 1, 1, 3, 3, 4, 4, 8, 8, 9, 9, 9, 10, 11, 13, 13, 14]), 15, 17)
 
-    action = sample(action_list, 1)[0]
+    action = mask_sample(action_mask)
     print(PlayProvider.ActionProvider.ACTION_VIEW[action], execute_play(play_hand, action))
 
 
@@ -77,3 +78,39 @@ def test_bomb():
 
     res = play_provider.provide(np.array([3, 3, 4]), 10, 10)
     print(res)
+
+
+def test_fused():
+    deals = DealGenerator(3)
+    for seat in range(3):
+        play_provider = PlayProvider(seat)
+        play_provider.add_landlord_id(1)
+        state_provider = PlayProvider.StateProvider(play_provider)
+        action_provider = PlayProvider.ActionProvider(play_provider)
+        for i in range(30):
+            hand = np.sort(next(deals)[seat][:(i % 17) + 1])
+            hand_p, hand_n = i % 20 + 1, (i * 7) % 20 + 1
+            state_vector, action_mask, play_hand = play_provider.provide_fused(hand, hand_p, hand_n)
+            expected = state_provider.provide(play_hand, hand_p, hand_n)
+            assert list(state_vector) == expected.tolist()
+            assert state_vector.state_index == PlayQLHelper.state_to_int(expected)
+            assert action_mask == action_provider.provide(play_hand, hand_p, hand_n)
+
+    follow_provider = FollowProvider(0)
+    follow_provider.add_landlord_id(2)
+    combo = Combo()
+    combo.cards = [5, 5]
+    state, action_mask, (bombs, good_actions, max_action) = follow_provider.provide_fused(
+        1, 3, 12, np.array([3, 4, 4, 7, 7, 9, 9, 9, 9]), combo)
+    assert state.state_index == FollowQLHelper.state_to_int(state)
+    assert action_mask & 1 and len(bombs) == 1
+
+
+def test_state_index():
+    play_state = [3, 3, 2, 2, 2, 1, 1, 2, 1, 1, 5, 5]
+    follow_state = [1, 0, 1, 3, 4, 5]
+    assert state_index(play_state) == (True, PlayQLHelper.state_to_int(play_state))
+    assert state_index(np.array(follow_state)) == (False, FollowQLHelper.state_to_int(follow_state))
+    # 融合路径的状态向量直接使用其行号
+    assert state_index(StateVector(play_state, 7)) == (True, 7)
+    assert state_index(StateVector(follow_state, 3)) == (False, 3)
@@ -1,5 +1,11 @@
 # -*- coding: utf-8 -*-
-from duguai.ai.q_learning import PlayQLHelper, load_q_table, FollowQLHelper
+import numpy as np
+import pytest
+
+from duguai.ai.action_mask import actions_to_mask
+from duguai.ai.q_learning import PlayQLHelper, load_q_table, FollowQLHelper, QLambdaTrainingAgent, \
+    step_reward, PlayStateIndex, QLExecuteAgent, save_compact_q_table, load_compact_q_table
+from duguai.game.deal import DealGenerator
 
 
 def test_state_vector_to_int():
@@ -9,3 +15,75 @@ def test_state_vector_to_int():
 def test_load_dataset():
     q_table = load_q_table('../../src/script/follow_q_table.npy', FollowQLHelper.STATE_LEN, FollowQLHelper.ACTION_LEN)
     assert q_table.shape == (FollowQLHelper.STATE_LEN, FollowQLHelper.ACTION_LEN)
+
+
+def test_q_lambda():
+    play_q_table = np.zeros((PlayQLHelper.STATE_LEN, PlayQLHelper.ACTION_LEN))
+    follow_q_table = np.zeros((FollowQLHelper.STATE_LEN, FollowQLHelper.ACTION_LEN))
+    agent = QLambdaTrainingAgent(play_q_table, follow_q_table, 0.5, 1., lambda_=1., epsilon=0.)
+    play_state = [0] * 12
+    follow_state = [1, 0, 0, 0, 0, 0]
+    agent.exec(play_state, actions_to_mask([2]))
+    agent.exec(follow_state, actions_to_mask([0]))
+    agent.exec(play_state, actions_to_mask([3]))
+    agent.update_game_over(40)
+
+    # gamma = lambda = 1且全是贪心动作时，每一步都得到后面所有TD误差之和
+    state = PlayQLHelper.state_to_int(play_state)
+    assert play_q_table[state, 3] == 0.5 * 40
+    r0 = step_reward(play_state, 2, actions_to_mask([2]))
+    r1 = step_reward(follow_state, 0, actions_to_mask([0]))
+    assert follow_q_table[FollowQLHelper.state_to_int(follow_state), 0] == 0.5 * (r1 + 40)
+    assert play_q_table[state, 2] == 0.5 * (r0 + r1 + 40)
+    assert np.count_nonzero(play_q_table) == 2 and np.count_nonzero(follow_q_table) == 1
+
+
+def test_play_state_index(tmp_path):
+    deals = DealGenerator(0)
+    hands = [next(deals)[i % 3] for i in range(30)]
+    counts = np.array([np.bincount(hand, minlength=16)[1:] for hand in hands])
+    play_index = PlayStateIndex(PlayStateIndex.hand_keys_of(counts))
+    assert play_index.state_len == (play_index.hand_keys.size + 1) * PlayStateIndex.LOW_LEN
+
+    # 可达行压缩后再还原不变，未出现过的手牌特征都落在0号块
+    play_q_table = np.zeros((PlayQLHelper.STATE_LEN, PlayQLHelper.ACTION_LEN))
+    rows = (play_index.hand_keys[:, None] * PlayStateIndex.LOW_LEN + np.arange(PlayStateIndex.LOW_LEN)).ravel()
+    play_q_table[rows] = np.random.rand(rows.size, PlayQLHelper.ACTION_LEN)
+    compact = play_index.compress(play_q_table)
+    assert np.array_equal(play_index.expand(compact), play_q_table)
+    assert np.array_equal(PlayStateIndex.visited_keys(play_q_table), play_index.hand_keys)
+    assert np.array_equal(compact[play_index.compact_many(rows)], play_q_table[rows])
+    unseen = np.setdiff1d(np.arange(PlayStateIndex.HAND_LEN), play_index.hand_keys)[0]
+    assert play_index.compact(unseen * PlayStateIndex.LOW_LEN + 5) == 5
+    play_index.compact(rows[0])
+    assert play_index.misses == 1 and play_index.lookups == 2 and play_index.miss_rate == 0.5
+
+    save_compact_q_table(str(tmp_path / 'play.npz'), compact, play_index)
+    loaded, loaded_index = load_compact_q_table(str(tmp_path / 'play.npz'))
+    assert np.array_equal(loaded, compact) and np.array_equal(loaded_index.hand_keys, play_index.hand_keys)
+
+
+def test_compact_agent(make_game):
+    # 所有手牌特征都可达时，紧凑Q表与完整Q表只差0号块，两者查到的Q值完全相同
+    play_index = PlayStateIndex(np.arange(PlayStateIndex.HAND_LEN))
+    play_q_table = np.random.rand(PlayQLHelper.STATE_LEN, PlayQLHelper.ACTION_LEN)
+    follow_q_table = np.random.rand(FollowQLHelper.STATE_LEN, FollowQLHelper.ACTION_LEN)
+    compact = play_index.compress(play_q_table)
+    dense_agent = QLExecuteAgent(play_q_table, follow_q_table)
+    compact_agent = QLExecuteAgent(compact, follow_q_table, play_index)
+
+    checked = 0
+    original_exec = dense_agent.exec
+
+    def exec_both(state_vector, action_mask):
+        nonlocal checked
+        assert np.array_equal(compact_agent.q_values(state_vector), dense_agent.q_values(state_vector))
+        checked += 1
+        return original_exec(state_vector, action_mask)
+
+    dense_agent.exec = exec_both
+    make_game(dense_agent, games=1)
+    assert checked > 0
+
+    with pytest.raises(ValueError):
+        QLExecuteAgent(play_q_table, follow_q_table, play_index)
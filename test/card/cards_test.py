@@ -7,3 +7,12 @@ def test_combo_type():
     combo = Combo()
     combo.cards = [CARD_A, CARD_A, CARD_A, CARD_2, CARD_G0]
     assert not combo.is_valid()
+
+
+def test_lazy_cards_view():
+    combo = Combo()
+    combo.cards = [CARD_A, CARD_A]
+    assert combo._cards_view is None
+    assert combo.cards_view == 'A A '
+    combo.pass_()
+    assert combo.cards_view == ''
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+from duguai.card import CARD_2, CARD_G0, CARD_G1
+from duguai.card.combo import Combo, PASS, ROCKET_BIT
+from duguai.card.moves import to_counts, to_cards, bit_info_of, lead_moves, follow_moves, PASS_MOVE
+from duguai.game.deal import DealGenerator
+
+
+def _bit_info(cards) -> int:
+    combo = Combo()
+    combo.cards = list(cards)
+    return combo.bit_info
+
+
+def test_counts():
+    hand = [1, 1, 5, CARD_2, CARD_G0]
+    assert to_cards(to_counts(hand)) == hand
+    assert bit_info_of(to_counts([CARD_G0, CARD_G1])) == ROCKET_BIT
+    assert bit_info_of([0] * 15) == PASS
+
+
+def test_moves_match_combo():
+    for row in DealGenerator(0).batch(20):
+        counts = to_counts(row[:20])
+        for bit, cards in lead_moves(counts):
+            assert _bit_info(cards) == bit
+            assert all(c <= n for c, n in zip(to_counts(cards), counts))
+            for move in follow_moves(counts, bit)[1:]:
+                combo = Combo()
+                combo.cards = list(move[1])
+                assert combo.bit_info == move[0]
+                last = Combo()
+                last.cards = list(cards)
+                assert combo > last
+
+
+def test_follow_pass_first():
+    counts = to_counts([1, 2, 3])
+    assert follow_moves(counts, ROCKET_BIT) == [PASS_MOVE]
+    assert follow_moves(counts, _bit_info([CARD_2]))[0] == PASS_MOVE
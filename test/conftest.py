@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+from typing import Callable, Optional, Union
+
+import pytest
+
+from duguai.ai.q_learning import RandomAgent
+from duguai.game.deal import DealGenerator
+from duguai.game.game_env import GameEnv
+from duguai.game.robot import Robot
+
+# 座位：智能体（由Robot包装），或由game_env创建玩家的函数
+Seat = Union[Robot.Agent, Callable[[GameEnv], GameEnv.AbstractPlayer]]
+
+
+def _make_game(*seats: Seat, seed: Optional[int] = 0, deals: Optional[DealGenerator] = None,
+               games: int = 0) -> GameEnv:
+    """
+    创建无界面的三人对局
+    @param seats: 不指定时三家共用一个RandomAgent，指定一个时三家共用，否则依次为三个座位
+    @param seed: 发牌的随机种子，为None时不设置发牌（GameEnv自己洗牌）
+    @param deals: 发牌迭代器，指定时忽略seed
+    @param games: 返回前进行的对局数
+    """
+    if not seats:
+        seats = (RandomAgent(),)
+    if len(seats) == 1:
+        seats *= 3
+    game_env = GameEnv(headless=True)
+    if deals is None and seed is not None:
+        deals = DealGenerator(seed)
+    if deals is not None:
+        game_env.set_deals(deals)
+    game_env.add_players(*(Robot(game_env, s, 'r%d' % i) if isinstance(s, Robot.Agent) else s(game_env)
+                           for i, s in enumerate(seats)))
+    for _ in range(games):
+        game_env.start()
+    return game_env
+
+
+@pytest.fixture
+def make_game() -> Callable[..., GameEnv]:
+    """创建无界面的三人对局，见_make_game"""
+    return _make_game
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+from duguai.ai.call_train import read_call_data, CallTrainer
+from duguai.game.call_sim import rollout_deals, simulate_batch, generate_call_data
+from duguai.game.deal import DECK
+from duguai.game.tournament import random_agent
+
+
+def test_rollout_deals():
+    hand = np.array([1, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 13, 13, 15])
+    deals = list(rollout_deals(hand, 5, np.random.default_rng(0)))
+    assert len(deals) == 5
+    for deal in deals:
+        assert deal[0] is hand
+        assert [len(c) for c in deal] == [17, 17, 17, 3]
+        assert (np.sort(np.concatenate(deal)) == np.sort(DECK)).all()
+        assert all((np.diff(c) >= 0).all() for c in deal)
+
+
+def test_simulate_batch():
+    records = simulate_batch(random_agent, 1, 3, 4)
+    assert len(records) == 3
+    assert (records['games'] == 4).all()
+    assert set(records['label'] * 4) <= {0, 1, 2, 3, 4}
+    assert (simulate_batch(random_agent, 1, 3, 4) == records).all()
+
+
+def test_generate_call_data(tmp_path):
+    file_name = str(tmp_path / 'call_sim.bin')
+    assert generate_call_data(file_name, 5, rollouts=2, batch_size=2, workers=1) == 5
+    records = read_call_data(file_name)
+    assert len(records) == 5
+    assert CallTrainer().fit(file_name, epochs=1).score(file_name) >= 0
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+from duguai.game.deal import DealGenerator, DECK
+
+
+def test_deal_batch():
+    cards = DealGenerator(0).batch(100)
+    assert cards.shape == (100, 54)
+    assert (np.sort(cards, axis=1) == np.sort(DECK)).all()
+    for start, end in ((0, 17), (17, 34), (34, 51), (51, 54)):
+        assert (np.diff(cards[:, start:end], axis=1) >= 0).all()
+
+
+def test_seed():
+    deals0, deals1 = DealGenerator(7, batch_size=3), DealGenerator(7, batch_size=3)
+    for _ in range(5):
+        for a, b in zip(next(deals0), next(deals1)):
+            assert (a == b).all()
+    assert not all((a == b).all() for a, b in zip(next(DealGenerator(8)), next(DealGenerator(7))))
+
+
+def test_game_env(make_game):
+    game_env = make_game(deals=DealGenerator(1, batch_size=2))
+    for _ in range(3):
+        game_env.start()
+        assert sum(c.size for c in game_env.cards[:3]) < 54
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+from duguai.ai.q_learning import RandomAgent
+from duguai.game.game_env import GameEnv
+from duguai.game.human import Human
+from duguai.game.robot import Robot
+
+
+def _fail(*args, **kwargs):
+    raise AssertionError('无界面模式下不应分发消息')
+
+
+def test_headless(make_game):
+    agent = RandomAgent()
+    robots = []
+
+    def seat(env):
+        robots.append(Robot(env, agent, 'r%d' % len(robots)))
+        return robots[-1]
+
+    game_env = make_game(seat, seat, seat, seed=None)
+    game_env.notify = _fail
+    assert game_env.headless
+
+    for _ in range(3):
+        game_env.start()
+        for r in robots:
+            assert r.last_combo._cards_view is None or r.last_combo._cards_view == ''
+
+
+def test_headless_ignores_observers(make_game):
+    agent = RandomAgent()
+    game_env = make_game(lambda env: Human(env, 'h'), agent, agent, seed=None)
+    assert game_env.headless
+
+    game_env = GameEnv()
+    game_env.add_players(Human(game_env, 'h'), Robot(game_env, agent, 'r1'), Robot(game_env, agent, 'r2'))
+    assert not game_env.headless
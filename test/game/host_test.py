@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+import asyncio
+
+from duguai.ai.q_learning import RandomAgent
+from duguai.game.host import GameHost
+
+
+def test_robot_tables():
+    host = GameHost(RandomAgent)
+    asyncio.run(host.run_robot_tables(20, 2))
+    assert host.game_count == 40
+    assert host.table_count == 0
+
+
+async def _human_client(path: str) -> bool:
+    """连接主机玩一局：不叫地主，出牌时出最小的单牌，跟牌时空过"""
+    reader, writer = await asyncio.open_unix_connection(path)
+    hand, is_play = [], False
+    while True:
+        line = (await reader.readline()).decode()
+        if not line:
+            return False
+        line = line.strip()
+        if line.startswith('你的手牌: '):
+            hand = line[len('你的手牌: '):].split()
+        elif line.endswith('出牌'):
+            is_play = True
+        elif '跟牌(' in line:
+            is_play = False
+        elif line.startswith('>>> (输入1叫地主'):
+            writer.write(b'0\n')
+        elif line.startswith('>>> (输入要出的牌'):
+            writer.write((hand[0] if is_play else '').encode() + b'\n')
+        elif line.endswith('获胜'):
+            writer.close()
+            return True
+
+
+def test_remote_human(tmp_path):
+    path = str(tmp_path / 'host.sock')
+
+    async def run():
+        host = GameHost(RandomAgent)
+        await host.serve_unix(path)
+        finished = await asyncio.wait_for(_human_client(path), 30)
+        await asyncio.sleep(0.1)
+        await host.close()
+        return host, finished
+
+    host, finished = asyncio.run(run())
+    assert finished
+    assert host.game_count == 1
+    assert host.table_count == 0
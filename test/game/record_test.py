@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+from duguai.game.record import GameRecorder, GameRecordReader, CALL, LANDLORD, PLAY, FOLLOW, GAME_OVER
+
+
+def _play(make_game, file_name, games):
+    game_env = make_game(seed=None)
+    with GameRecorder(file_name, buffer_size=16) as recorder:
+        game_env.set_recorder(recorder)
+        for _ in range(games):
+            game_env.start()
+
+
+def test_record(tmp_path, make_game):
+    file_name = str(tmp_path / 'games.rec')
+    _play(make_game, file_name, 3)
+    _play(make_game, file_name, 2)
+
+    reader = GameRecordReader(file_name)
+    assert reader.game_count == 5
+    assert list(np.unique(reader.records['game_id'])) == [0, 1, 2, 3, 4]
+
+    for game in reader.iter_games():
+        decisions = game['decision']
+        assert decisions[-1] == GAME_OVER
+        assert (decisions == LANDLORD).sum() == 1
+        assert game[decisions == LANDLORD][0]['cards'].sum() == 3
+        assert (game[decisions == CALL]['cards'].sum(axis=1) == 17).all()
+
+        moves = game[(decisions == PLAY) | (decisions == FOLLOW)]
+        assert (moves['state'] >= 0).all() and (moves['action'] >= 0).all()
+
+        # 获胜者打出的牌数等于其手牌总数
+        winner = game[-1]['seat']
+        played = moves[moves['seat'] == winner]['cards'].sum()
+        assert played == (20 if game[-1]['action'] == 1 else 17)
+
+    assert len(reader.game(3)) == len(list(reader.iter_games())[3])
+
+
+def test_partial_record(tmp_path, make_game):
+    # 写入中途崩溃留下半条记录，追加前应当截掉
+    file_name = str(tmp_path / 'games.rec')
+    _play(make_game, file_name, 2)
+    with open(file_name, 'ab') as f:
+        f.write(b'\1' * 7)
+    _play(make_game, file_name, 1)
+
+    reader = GameRecordReader(file_name)
+    assert list(np.unique(reader.records['game_id'])) == [0, 1, 2]
+    assert all(game['decision'][-1] == GAME_OVER for game in reader.iter_games())
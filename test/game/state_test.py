@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+import random
+
+import numpy as np
+
+from duguai.card.moves import to_counts
+from duguai.game.deal import DealGenerator
+from duguai.game.state import GameState, play_out
+
+
+def _state(seed: int) -> GameState:
+    hand0, hand1, hand2, landlord_cards = next(DealGenerator(seed))
+    return GameState.from_cards([np.concatenate([hand0, landlord_cards]), hand1, hand2], 0)
+
+
+def test_apply_undo():
+    rng = random.Random(0)
+    state = _state(0)
+    snapshots = [state.clone()]
+    while not state.apply(rng.choice(state.legal_moves())):
+        snapshots.append(state.clone())
+    assert state.is_over and state.victors
+    assert state.depth == len(snapshots)
+    while state.depth:
+        state.undo()
+        assert state == snapshots[state.depth]
+
+
+def test_clone():
+    state = _state(1)
+    clone = state.clone()
+    clone.apply(clone.legal_moves()[0])
+    assert clone != state
+    assert sum(state.hands[0]) == state.sizes[0] == 20
+    assert play_out(clone, lambda s: s.legal_moves()[-1]) in (0, 1, 2)
+
+
+def test_game_env(make_game):
+    game_env = make_game(seed=2)
+    for _ in range(5):
+        game_env.start()
+        state = game_env.state
+        assert state.is_over
+        assert state.victors == game_env.victors
+        assert state.hands == [to_counts(list(c)) for c in game_env.cards[:3]]
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+from duguai.game.game_env import GameEnv
+from duguai.game.tournament import play_batch, play_duplicate_batch, random_agent, wilson_interval, board_deals, \
+    TournamentResult, WIN, BASE_WIN, DUPLICATE_ROTATIONS
+
+
+def test_play_batch():
+    result = play_batch(random_agent, random_agent, 0, 0, 6)
+    assert result.shape == (6, 3)
+    assert ((result[:, WIN] == 0) | (result[:, WIN] == 1)).all()
+    assert (play_batch(random_agent, random_agent, 0, 0, 6) == result).all()
+
+
+def test_wilson_interval():
+    low, high = wilson_interval(50, 100)
+    assert low < 0.5 < high
+    assert 0 <= wilson_interval(0, 10)[0] < wilson_interval(0, 10)[1] <= 1
+
+
+def test_decided():
+    games = np.zeros((200, 3))
+    games[:, WIN] = 1
+    games[::2, BASE_WIN] = 0.5
+    assert TournamentResult(games, 2.576).decided
+    games[:, WIN] = games[:, BASE_WIN]
+    assert not TournamentResult(games, 2.576).decided
+
+
+def test_duplicate():
+    result = play_duplicate_batch(random_agent, random_agent, 0, 0, 2)
+    assert result.shape == (2 * DUPLICATE_ROTATIONS, 3)
+    assert TournamentResult(result, 2.576, DUPLICATE_ROTATIONS).diff.shape == (2,)
+
+
+def test_board_deals():
+    game_env = GameEnv()
+    hands = []
+    for _ in range(2):
+        game_env.set_deals(board_deals(7))
+        game_env.shuffle()
+        hands.append(game_env.cards)
+    for h1, h2 in zip(*hands):
+        assert (h1 == h2).all()
+    assert sorted(np.concatenate(hands[0])) == sorted([i for i in range(1, 14)] * 4 + [14, 15])
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+import random
+
+import numpy as np
+
+from duguai.card.combo import PASS
+from duguai.card.moves import FULL_COUNTS, to_counts
+from duguai.game.deal import DealGenerator
+from duguai.game.tracker import CardTracker, can_beat
+
+
+def _tracker() -> CardTracker:
+    hands = [np.array([1, 1, 2, 9, 9, 14]), np.array([3, 4, 5, 6]), np.array([7, 8, 10, 10])]
+    tracker = CardTracker()
+    tracker.start(hands, np.array([2, 9, 14]), 0)
+    return tracker
+
+
+def test_update():
+    tracker = _tracker()
+    assert tracker.known(0) == to_counts([2, 9, 14])
+    assert tracker.unseen(1) == [f - c for f, c in zip(FULL_COUNTS, to_counts([3, 4, 5, 6]))]
+
+    tracker.update(0, 1209, [9, 9])
+    tracker.update(1, PASS, [])
+    tracker.update(2, 1210, [10, 10])
+    tracker.update(0, PASS, [])
+    assert tracker.sizes == (4, 4, 2)
+    assert tracker.known(0) == to_counts([2, 14])
+    assert tracker.played(0) == to_counts([9, 9])
+    assert tracker.unseen(1)[9 - 1] == 2 and tracker.unseen(0)[9 - 1] == 2
+    assert tracker.passes(1) == [1209]
+    assert tracker.passes(0) == [1210]
+    assert tracker.history(2) == [(1210, (10, 10))]
+
+
+def test_sample_hands():
+    hand0, hand1, hand2, landlord_cards = next(DealGenerator(8))
+    tracker = CardTracker()
+    tracker.start([np.sort(np.concatenate([hand0, landlord_cards])), hand1, hand2], landlord_cards, 0)
+    tracker.update(0, 1113, [13])
+    tracker.update(1, PASS, [])
+    for seed in range(20):
+        hands = tracker.sample_hands(2, random.Random(seed))
+        assert hands[2] == to_counts(hand2)
+        assert sum(hands[0]) == 19 and sum(hands[1]) == 17
+        assert all(h >= k for h, k in zip(hands[0], tracker.known(0)))
+        assert not can_beat(hands[1], 1113)
+        assert [a + b for a, b in zip(hands[0], hands[1])] == tracker.unseen(2)
+
+
+def test_game_env(make_game):
+    game_env = make_game()
+    for _ in range(5):
+        game_env.start()
+        tracker = game_env.tracker
+        assert tracker.sizes == tuple(len(c) for c in game_env.cards[:3])
+        for i in range(3):
+            others = to_counts(list(game_env.cards[(i + 1) % 3]) + list(game_env.cards[(i + 2) % 3]))
+            assert tracker.unseen(i) == others
+        played = np.sum([tracker.played(i) for i in range(3)], axis=0)
+        assert (played + np.sum([to_counts(c) for c in game_env.cards[:3]], axis=0) == FULL_COUNTS).all()
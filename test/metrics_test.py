@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+from urllib.request import urlopen
+
+from duguai import metrics
+from duguai.metrics import Registry
+
+
+def test_render():
+    registry = Registry()
+    counter = registry.counter('c_total', 'counter', ('kind',))
+    counter.inc('play')
+    counter.inc('play', amount=2)
+    gauge = registry.gauge('g', 'gauge')
+    gauge.set_function(lambda: 1.5)
+    histogram = registry.histogram('h_seconds', 'histogram', buckets=(0.1, 1.))
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+    histogram.observe(5)
+
+    text = registry.render()
+    assert '# TYPE c_total counter\nc_total{kind="play"} 3\n' in text
+    assert 'g 1.5\n' in text
+    assert 'h_seconds_bucket{le="0.1"} 1\nh_seconds_bucket{le="1.0"} 2\nh_seconds_bucket{le="+Inf"} 3\n' in text
+    assert 'h_seconds_sum 5.55\nh_seconds_count 3\n' in text
+
+
+def test_server(make_game):
+    server = metrics.start_server(0)
+    try:
+        games = metrics.GAMES.get()
+        make_game(games=3)
+        assert metrics.GAMES.get() == games + 3
+        assert metrics.STAGE_SECONDS.count('exec') == metrics.DECISIONS.get('play') + metrics.DECISIONS.get('follow')
+
+        with urlopen('http://127.0.0.1:%d/metrics' % server.server_address[1]) as response:
+            text = response.read().decode('utf-8')
+        assert 'duguai_games_total ' in text
+        assert 'duguai_stage_seconds_bucket{stage="decompose",le="+Inf"}' in text
+        assert 'duguai_landlord_calls_total{called="1"}' in text
+    finally:
+        server.shutdown()
+        server.server_close()
+        metrics.enabled = False
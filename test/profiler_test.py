@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+import os
+import pstats
+
+from duguai.profiler import Profiler, module_of
+
+
+def test_module_of():
+    assert module_of(os.path.join('root', 'duguai', 'card', 'combo.py')) == 'duguai.card.combo'
+    assert module_of(os.path.join('root', 'duguai', 'game', '__init__.py')) == 'duguai.game'
+    assert module_of(os.path.join('usr', 'lib', 'random.py')) == ''
+
+
+def test_profiler(tmp_path, make_game):
+    game_env = make_game()
+
+    prefix = str(tmp_path / 'profile')
+    with Profiler(prefix, memory=True) as profiler:
+        game_env.start()
+    assert [m for m, _ in profiler.memory_stats()] == ['duguai.ai.decompose', 'duguai.card', 'duguai.game']
+
+    report = open(prefix + '.txt', encoding='utf-8').read()
+    assert 'CPU' in report and 'duguai.ai.decompose' in report
+    assert pstats.Stats(prefix + '.pstats').total_calls > 0
+
+
+def test_disabled(tmp_path):
+    prefix = str(tmp_path / 'profile')
+    with Profiler(prefix, cpu=False) as profiler:
+        pass
+    assert not profiler.enabled
+    assert not os.path.exists(prefix + '.txt')
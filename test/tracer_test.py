@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+import logging
+
+import numpy as np
+
+from duguai import tracer
+from duguai.ai.q_learning import QLExecuteAgent, PlayQLHelper, FollowQLHelper, QLTrainingAgent
+from duguai.logger import log_locals
+from duguai.tracer import DecisionTracer
+
+
+def test_ring_buffer():
+    decision_tracer = DecisionTracer(every=2, capacity=3)
+    recorded = 0
+    for i in range(10):
+        if decision_tracer.due():
+            decision_tracer.record(tracer.PLAY, i, 0b110, 2, np.arange(17, dtype=float), 0.001)
+            recorded += 1
+    assert recorded == 5 and decision_tracer.recorded == 5
+
+    # 只保留最近3条，按时间先后排列
+    entries = decision_tracer.entries()
+    assert entries['seq'].tolist() == [6, 8, 10]
+    assert entries['state'].tolist() == [5, 7, 9]
+    assert entries['q'][0, 2] == 2.
+
+    lines = decision_tracer.format()
+    assert len(lines) == 3
+    assert lines[0].startswith('#6 play state=5 mask=0x6 action=2') and lines[0].endswith('q=[1:1.00 2:2.00]')
+
+
+def test_trace_games(tmp_path, caplog, make_game):
+    play_q_table = np.random.rand(PlayQLHelper.STATE_LEN, PlayQLHelper.ACTION_LEN)
+    follow_q_table = np.random.rand(FollowQLHelper.STATE_LEN, FollowQLHelper.ACTION_LEN)
+    decision_tracer = tracer.install(every=5, capacity=64)
+    try:
+        make_game(QLExecuteAgent(play_q_table, follow_q_table), games=2)
+        assert decision_tracer.recorded == decision_tracer.decisions // 5 > 0
+
+        entries = decision_tracer.entries()
+        for e in entries:
+            q_table = play_q_table if e['kind'] == tracer.PLAY else follow_q_table
+            assert np.allclose(e['q'][:q_table.shape[1]], q_table[e['state']])
+            assert e['mask'] >> e['action'] & 1
+
+        decision_tracer.dump(str(tmp_path / 'trace.npy'))
+        loaded = np.load(str(tmp_path / 'trace.npy'))
+        assert np.array_equal(loaded['state'], entries['state']) and np.array_equal(loaded['q'], entries['q'], True)
+
+        # 发生异常时由log_locals写入日志
+        with caplog.at_level(logging.ERROR):
+            try:
+                raise ValueError()
+            except ValueError as e:
+                log_locals(e)
+        assert decision_tracer.format()[-1] in caplog.text
+    finally:
+        tracer.uninstall()
+
+
+def test_trace_before_update(make_game):
+    # 训练智能体的exec会更新Q表，追踪记录的应当是挑选动作时的Q值
+    play_q_table = np.random.rand(PlayQLHelper.STATE_LEN, PlayQLHelper.ACTION_LEN)
+    follow_q_table = np.random.rand(FollowQLHelper.STATE_LEN, FollowQLHelper.ACTION_LEN)
+    seen = []
+
+    class Agent(QLTrainingAgent):
+        def exec(self, state_vector, action_mask):
+            seen.append(np.array(self.q_values(state_vector)))
+            return super().exec(state_vector, action_mask)
+
+    decision_tracer = tracer.install(every=1, capacity=100000)
+    try:
+        make_game(Agent(play_q_table, follow_q_table, 0.5, 0.8), games=5)
+        entries = decision_tracer.entries()
+        assert len(entries) == len(seen) > 0
+        for e, q in zip(entries, seen):
+            assert np.allclose(e['q'][:q.size], q)
+    finally:
+        tracer.uninstall()